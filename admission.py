@@ -0,0 +1,156 @@
+"""
+Admission Control: จำกัดงานหนัก (LLM Generation / Embedding) ไม่ให้ยิงพร้อมกันไม่จำกัดตอน Traffic พุ่ง
+
+- แต่ละ Stage มีจำนวนงานที่รันพร้อมกันได้ (max_concurrency) + คิวรอแบบจำกัดขนาด (max_queue)
+- คิวแยกตาม Client แล้วปล่อยแบบ Round-robin (Client ที่ยิงถี่ๆ ไม่แย่งคิวคนอื่นหมด)
+- คิวเต็ม -> ปฏิเสธทันที (AdmissionRejected -> API ตอบ 503 + Retry-After) / รอนานเกิน queue_timeout -> ปฏิเสธ
+- ความยาวคิว / จำนวนงานที่รันอยู่ / เวลารอ ดูได้ที่ /metrics
+"""
+import os
+import time
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+from concurrency import run_cpu_bound
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_IN_FLIGHT, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+
+load_dotenv()
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))        # วินาที
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "16"))
+EMBED_MAX_QUEUE = int(os.getenv("EMBED_MAX_QUEUE", "64"))
+EMBED_QUEUE_TIMEOUT = float(os.getenv("EMBED_QUEUE_TIMEOUT", "5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))   # วินาทีที่บอก Client ให้ลองใหม่
+
+# Client ของ Request ปัจจุบัน (ตั้งใน Dependency ของ API) ใช้แยกคิวตอน Embedding
+current_client = contextvars.ContextVar("current_client", default="anonymous")
+
+
+class AdmissionRejected(Exception):
+    """รับงานเพิ่มไม่ได้ (คิวเต็ม / รอนานเกิน) ให้ Client ลองใหม่ภายหลัง"""
+
+    def __init__(self, stage: str, reason: str, retry_after: int = ADMISSION_RETRY_AFTER):
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """จำกัดงานที่รันพร้อมกันของ Stage หนึ่ง พร้อมคิวรอแยกตาม Client (ใช้ภายใน Event Loop เดียว)"""
+
+    def __init__(self, stage: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.stage = stage
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._waiting = OrderedDict()  # client_id -> deque ของ Future ที่รอ Slot (ลำดับ = รอบ Round-robin)
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.set(self.active, stage=self.stage)
+        ADMISSION_QUEUE_DEPTH.set(self.queued, stage=self.stage)
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.inc(stage=self.stage, reason=reason)
+        raise AdmissionRejected(self.stage, reason)
+
+    def check_capacity(self):
+        """เช็คเร็วๆ ก่อนเริ่มงาน: ถ้าทั้ง Slot และคิวเต็มแล้วปฏิเสธเลย ไม่ต้องรอ"""
+        if self.active >= self.max_concurrency and self.queued >= self.max_queue:
+            self._reject("queue_full")
+
+    async def acquire(self, client_id: str):
+        if self.active < self.max_concurrency and self.queued == 0:
+            self.active += 1
+            self._update_gauges()
+            ADMISSION_WAIT_SECONDS.observe(0.0, stage=self.stage)
+            return
+        self.check_capacity()
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client_id, deque()).append(future)
+        self.queued += 1
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release()  # ได้ Slot พอดีตอนถูกยกเลิก -> ส่งต่อให้คนถัดไป
+            else:
+                self._remove_waiter(client_id, future)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout")
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, stage=self.stage)
+
+    def _remove_waiter(self, client_id: str, future):
+        waiters = self._waiting.get(client_id)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._waiting[client_id]
+            self._update_gauges()
+
+    def release(self):
+        """คืน Slot: ส่งต่อให้ Client ถัดไปในรอบ Round-robin (Slot ไม่ว่างระหว่างส่งต่อ)"""
+        while self._waiting:
+            client_id, waiters = next(iter(self._waiting.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiting.move_to_end(client_id)  # Client นี้ได้แล้ว ไปต่อท้ายรอบ
+            else:
+                del self._waiting[client_id]
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, client_id: str = None):
+        await self.acquire(client_id or current_client.get())
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "clients_waiting": len(self._waiting),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+class AdmittedEmbeddings:
+    """ครอบ Embedding Engine ให้ aembed_query ต้องผ่าน StageLimiter ก่อน (ใส่ไว้ใต้ Cache: Cache Hit ไม่ต้องเข้าคิว)"""
+
+    def __init__(self, base, limiter: StageLimiter):
+        self.base = base
+        self.limiter = limiter
+
+    def embed_query(self, text: str):
+        return self.base.embed_query(text)
+
+    async def aembed_query(self, text: str):
+        async with self.limiter.slot():
+            if hasattr(self.base, "aembed_query"):
+                return await self.base.aembed_query(text)
+            return await run_cpu_bound(self.base.embed_query, text)
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
@@ -0,0 +1,144 @@
+"""
+Answer Cache: จำคำตอบของคำถามที่เคยตอบไปแล้ว (Key = คำถามหลัง Query Rewriting)
+
+- ชั้น Exact: คำถามเหมือนกันเป๊ะ (หลัง Normalize)
+- ชั้น Semantic (ปิดไว้เป็นค่าเริ่มต้น): คำถามที่ Vector ใกล้กันมาก (Cosine Distance <= ANSWER_CACHE_MAX_DISTANCE)
+  คำถามกฎหมายที่ต่างกันแค่คำเดียว (ลาป่วย / ลากิจ, อายุงาน 1 ปี / 5 ปี) Vector ใกล้กันมากแต่คำตอบคนละเรื่อง
+  จะเปิดต้องเลือกค่าจาก python -m benchmarks.bench_answer_cache (ต้องไม่มีคู่ที่ห้ามชนชนกัน)
+- ทุกคำตอบผูกกับ corpus_version ถ้าข้อมูลกฎหมายเปลี่ยน คำตอบเก่าจะถูกล้างทิ้ง
+"""
+import os
+import time
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+from embedding_cache import normalize_query
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger("answer_cache")
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0"))     # 0 = ปิดชั้น Semantic
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "0"))                        # วินาที, 0 = ไม่หมดอายุ
+
+
+def corpus_fingerprint(rows) -> str:
+    """สร้างเลขเวอร์ชันของข้อมูลกฎหมายจากเนื้อหาทุกมาตรา (เนื้อหาเปลี่ยน = เวอร์ชันเปลี่ยน)"""
+    digest = hashlib.sha1()
+    for row in sorted(rows, key=lambda row: str(row.get('section_number'))):
+        digest.update(str(row.get('section_number')).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update((row.get('text_original') or "").encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    """Cache คำตอบ 2 ชั้น (Exact / Semantic) แบบ LRU จำกัดจำนวน"""
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, max_distance: float = ANSWER_CACHE_MAX_DISTANCE,
+                 ttl: float = ANSWER_CACHE_TTL):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.corpus_version = None
+        self._entries = OrderedDict()  # key -> {"answer", "sources", "vector", "created_at"}
+        self._matrix = None            # Vector ของทุก Entry (สร้างใหม่เมื่อมีการเปลี่ยนแปลง)
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.max_distance > 0
+
+    def set_corpus_version(self, version):
+        """เรียกเมื่อโหลดข้อมูลกฎหมายชุดใหม่ ถ้าเวอร์ชันเปลี่ยนจะล้าง Cache ทั้งหมด"""
+        if version != self.corpus_version:
+            if self._entries:
+                log.info(f"♻️ ข้อมูลกฎหมายเปลี่ยน ({self.corpus_version} -> {version}) ล้าง Answer Cache")
+            self.clear()
+            self.corpus_version = version
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+        self._matrix_keys = []
+
+    def _expired(self, entry) -> bool:
+        return self.ttl > 0 and time.time() - entry["created_at"] > self.ttl
+
+    def _semantic_lookup(self, query_vector):
+        if self._matrix is None:
+            keys = [key for key, entry in self._entries.items() if entry["vector"] is not None]
+            if not keys:
+                return None
+            matrix = np.asarray([self._entries[key]["vector"] for key in keys], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            self._matrix, self._matrix_keys = matrix, keys
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        similarities = self._matrix @ query
+        best = int(np.argmax(similarities))
+        if 1.0 - float(similarities[best]) <= self.max_distance:
+            return self._matrix_keys[best]
+        return None
+
+    def _pop_if_expired(self, key) -> bool:
+        if self._expired(self._entries[key]):
+            del self._entries[key]
+            self._matrix = None
+            return True
+        return False
+
+    def get_exact(self, query: str):
+        """ชั้น Exact: คืน {"answer", "sources"} ถ้าเคยตอบคำถามนี้แล้ว (ไม่นับ Miss เพราะยังมีชั้น Semantic)"""
+        key = normalize_query(query)
+        if key in self._entries and not self._pop_if_expired(key):
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return self._entries[key]
+        return None
+
+    def get_semantic(self, query_vector):
+        """ชั้น Semantic: หาคำถามเก่าที่ Vector ใกล้เคียงพอ (เรียกหลัง get_exact ไม่เจอ)"""
+        if query_vector is not None and self.semantic_enabled and self._entries:
+            match_key = self._semantic_lookup(query_vector)
+            if match_key is not None and not self._pop_if_expired(match_key):
+                self._entries.move_to_end(match_key)
+                self.semantic_hits += 1
+                return self._entries[match_key]
+
+        self.misses += 1
+        return None
+
+    def put(self, query: str, answer: str, sources, query_vector=None):
+        key = normalize_query(query)
+        self._entries[key] = {
+            "answer": answer,
+            "sources": list(sources),
+            "vector": list(query_vector) if query_vector is not None else None,
+            "created_at": time.time(),
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None  # มี Entry เปลี่ยน ต้องสร้าง Matrix ใหม่ตอนค้นครั้งถัดไป
+
+    def stats(self) -> dict:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "corpus_version": self.corpus_version,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / total if total else 0.0,
+        }
@@ -1,298 +1,1084 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # ไว้วัดเวลา Import ตอน Startup
+
 import os
-from typing import List, Dict
-from fastapi import FastAPI, HTTPException
+from typing import List, Dict, Optional
+from contextlib import asynccontextmanager, aclosing
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from fastapi.responses import StreamingResponse
-import json
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 import asyncio
 
-# LangChain Imports
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from concurrency import run_cpu_bound, shutdown_cpu_pool
+from embedding_cache import CachedQueryEmbeddings
+from embedding_service import get_embeddings
+from local_index import LocalVectorIndex
+from chunk_index import ChunkIndex
+from lexical_search import BM25Index, tokenize, reciprocal_rank_fusion, extract_section_numbers
+from answer_cache import AnswerCache, corpus_fingerprint
+from corpus_sync import aread_state, CORPUS_WATCH_SECONDS
+import thai_text
+from batch_qa import parse_questions, answer_batch, BATCH_CONCURRENCY, BATCH_MAX_QUESTIONS
+from reranker import (load_reranker, RERANK_ENABLED, RERANK_POOL, RERANK_POOL_THRESHOLD, RERANK_TOP_K,
+                      RERANK_TIMEOUT_MS, RERANK_SECONDS, RERANK_FALLBACK)
+from session_store import create_session_store, generate_session_id, new_session, record_turn
+from timing import StageTimer
+from metrics import (registry, observe_request, LLM_TOKENS, CACHE_HITS, CACHE_MISSES, CACHE_SIZE,
+                     STARTUP_PHASE_SECONDS, CONTEXT_TOKENS_SAVED, CORPUS_VERSION, CORPUS_RELOADS,
+                     CORPUS_RELOAD_SECONDS, CANCELLED_REQUESTS, CANCELLED_TOKENS_SAVED)
+from token_counter import count_tokens
+from context_builder import build_context
+from app_logging import get_logger, start_logging, stop_logging
+from http_clients import create_async_client
+from stream_protocol import encode_event, coalesce, MEDIA_TYPES, STREAM_HEADERS
+from cancellation import RequestCancelled, CompletionEstimate, guarded, request_deadline, wait_for_disconnect
+from admission import (StageLimiter, AdmittedEmbeddings, AdmissionRejected, current_client,
+                       LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT,
+                       EMBED_MAX_CONCURRENCY, EMBED_MAX_QUEUE, EMBED_QUEUE_TIMEOUT)
 
-#pythainlp
-from pythainlp.util import normalize          # สำหรับจัดระเบียบสระ/วรรณยุกต์
-from pythainlp.tokenize import word_tokenize  # สำหรับตัดคำ
+# LangChain Imports
+# (langchain_openai / supabase / HuggingFace ใช้เวลา Import นาน เลยไป Import ตอนโหลดใน lifespan แทน)
+from rag_pipeline import (RagPipeline, LocalRetriever, SupabaseRetriever, create_llm, NO_DOCS_ANSWER,
+                          RETRIEVAL_BACKEND)
 
 # 1. โหลดตัวแปรจาก .env (กุญแจต่างๆ)
 load_dotenv()
+log = get_logger("api")
 
 # 2. ตั้งค่า Supabase (ฐานข้อมูล)
+# ใช้ Async Client เพื่อไม่ให้การรอ Database ไปบล็อก Event Loop
+# (Async Client ต้องสร้างภายใน Event Loop เลยไปสร้างใน lifespan ด้านล่าง)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# 3. ตั้งค่า AI (Typhoon API)
-# ใช้ ChatOpenAI แต่ชี้ไปที่ Server ของ Typhoon
-llm = ChatOpenAI(
-    base_url=os.getenv("TYPHOON_BASE_URL"), # https://api.opentyphoon.ai/v1
-    api_key=os.getenv("TYPHOON_API_KEY"),
-    model="typhoon-v2.5-30b-a3b-instruct",      # โมเดลตัวเก่งสุด
-    temperature=0.3,                         # ความคิดสร้างสรรค์ต่ำหน่อย เพื่อความแม่นยำทางกฎหมาย
-    max_tokens=4096                          # เพิ่มพื้นที่ให้ AI ตอบยาวๆ ได้ ไม่ error
-)
+supabase = None
+
+# HTTP Client กลาง (Connection Pool + Keep-alive + HTTP/2 + Retry) ใช้ร่วมกันทั้ง Supabase และ Typhoon
+http_client = None
 
-# 4. ตั้งค่า Embedding (ตัวแปลงข้อความเป็นตัวเลข)
+# 3. ตั้งค่า AI (Typhoon API) -> สร้างใน load_resources()
+llm = None
+# RAG Pipeline กลาง (Prompt + Chain สร้างครั้งเดียว, Retriever ตาม RETRIEVAL_BACKEND) -> สร้างใน load_resources()
+pipeline: RagPipeline = None
+
+# 4. ตั้งค่า Embedding (ตัวแปลงข้อความเป็นตัวเลข) -> โหลดใน load_resources()
 # ใช้ BGE-M3 เหมือนเดิม เพราะเก่งภาษาไทย
-embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
+# ครอบด้วย Cache: คำถามซ้ำๆ (ลา/ค่าชดเชย/OT) ไม่ต้องรัน Model ใหม่
+# ใช้ Engine กลาง (Micro-batching) คำถามที่เข้ามาพร้อมกันจะถูกรวมรันเป็น Batch เดียว
+embeddings: CachedQueryEmbeddings = None
+
+# Startup Mode: "background" = เปิดรับ Connection ทันที แล้วโหลด Model เบื้องหลัง (/ready จะเป็น 503 จนกว่าจะพร้อม)
+#               "blocking"   = โหลดทุกอย่างให้เสร็จก่อนค่อยเปิดรับ Connection
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+startup_state = {"ready": False, "error": None, "phases": {}}
+
+# Backend สำหรับค้นหา (RETRIEVAL_BACKEND ใน rag_pipeline): "supabase" (RPC match_sections_v2),
+# "local" (Snapshot ในเครื่อง) หรือ "chunks" (Chunk Index หลาย Vector ต่อมาตรา)
+# ถ้าใช้ local ต้องรัน `python local_index.py refresh` ก่อน / chunks ต้องรัน `python ingest.py --chunks` ก่อน
+local_index: LocalVectorIndex = None  # หรือ ChunkIndex (Interface เดียวกัน)
+
+# Hybrid Search: รวม Dense (BGE-M3) กับ Lexical (BM25 จากการตัดคำ newmm)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+lexical_index: BM25Index = None
+
+# Rerank ด้วย Cross-encoder (RERANK_ENABLED=true): ดึงผู้สมัคร RERANK_POOL มาตราแล้วคัดเหลือ RERANK_TOP_K
+reranker = None
+
+# Answer Cache: คำถามที่เคยตอบแล้ว (หรือใกล้เคียงมาก) ไม่ต้องให้ Typhoon ตอบใหม่
+answer_cache = AnswerCache()
+# เวอร์ชันของข้อมูลกฎหมายที่โหลดอยู่ (corpus_state ใน Supabase) -> เช็คทุก CORPUS_WATCH_SECONDS วินาที
+# ถ้าเวอร์ชันเปลี่ยน (ingest.py --sync) จะสร้าง Index ชุดใหม่เบื้องหลังแล้วสลับเข้าไปโดยไม่ต้อง Restart
+corpus_state = {"version": None, "loaded_at": None, "reloads": 0, "pending": None}
+# Session ของบทสนทนา (ประวัติ + ผลค้นหารอบก่อน) Client ส่งแค่ session_id ไม่ต้องส่ง history ทุกครั้ง
+session_store = create_session_store()
+
+# Admission Control: จำกัดจำนวนงานที่ยิงไป Typhoon / รัน Embedding พร้อมกัน (เกินจะเข้าคิว คิวเต็มตอบ 503)
+generation_limiter = StageLimiter("generation", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
+embedding_limiter = StageLimiter("embedding", EMBED_MAX_CONCURRENCY, EMBED_MAX_QUEUE, EMBED_QUEUE_TIMEOUT)
+REPLAY_CHUNK_CHARS = 80  # ขนาดชิ้นตอนส่งคำตอบจาก Cache แบบ Stream
+# /chat_stream: Client ปิดการเชื่อมต่อ -> ยกเลิกงานที่ค้างทันที, เกิน STREAM_DEADLINE_SECONDS -> ตัดคำตอบแล้วจบ Stream
+# ความยาวคำตอบเฉลี่ยไว้ประมาณ Token ที่ประหยัดได้ตอนหยุดกลางทาง
+completion_estimate = CompletionEstimate()
+DEADLINE_MESSAGE = "ขออภัยครับ ระบบใช้เวลาค้นหานานเกินไป กรุณาลองใหม่อีกครั้ง"
+
+# Pipelined Rewrite: ระหว่างรอ LLM เขียนคำถามใหม่ ให้ค้นด้วยคำถามเดิมไปพร้อมกันเลย
+# ถ้าคำถามใหม่ความหมายใกล้เคียงคำถามเดิม -> ใช้ผลค้นหาเดิมได้ (ไม่ต้องรอค้นใหม่)
+PIPELINED_REWRITE = os.getenv("PIPELINED_REWRITE", "true").lower() == "true"
+SPECULATIVE_REUSE_SIMILARITY = float(os.getenv("SPECULATIVE_REUSE_SIMILARITY", "0.95"))  # ใช้ผลเดิมทั้งหมด
+SPECULATIVE_MERGE_SIMILARITY = float(os.getenv("SPECULATIVE_MERGE_SIMILARITY", "0.80"))  # รวมผลเดิม + ผลใหม่
+SELF_CONTAINED_MIN_CHARS = 20
+# คำที่บ่งบอกว่าเป็นคำถามต่อเนื่อง (ต้องอาศัยบริบทเดิม -> ต้อง Rewrite)
+FOLLOW_UP_MARKERS = ("แล้ว", "และ", "ถ้า", "กรณีนี้", "อันนี้", "นั้น", "นี้", "ดังกล่าว", "เขา", "มัน", "ล่ะ", "เหมือนกัน")
+
+async def fetch_all_sections():
+    """ดึงข้อความทุกมาตรามาสร้าง BM25 Index (ทีละหน้า เพราะ PostgREST จำกัดจำนวนแถว)"""
+    rows = []
+    cursor = 0
+    while True:
+        response = await supabase.table('act_sections') \
+            .select('id, section_number, text_original') \
+            .gt('id', cursor) \
+            .order('id') \
+            .limit(500) \
+            .execute()
+        if not response.data:
+            return rows
+        rows.extend(response.data)
+        cursor = response.data[-1]['id']
+
+async def load_section_rows(index=None):
+    # ถ้ามี Local Index อยู่แล้วใช้ข้อความจาก Snapshot ได้เลย ไม่ต้องดึงใหม่
+    if index is not None:
+        return [
+            {"id": i, "section_number": s, "text_original": t}
+            for i, s, t in zip(index.ids, index.section_numbers, index.texts)
+        ]
+    return await fetch_all_sections()
+
+async def build_lexical_index(rows, processor: thai_text.ThaiTextProcessor, index=None):
+    # Snapshot ตัดคำไว้แล้วด้วย Dictionary เดียวกัน -> ใช้ต่อได้เลย ไม่ต้องตัดคำทุกมาตราใหม่ตอนเริ่ม
+    tokenized_docs = None
+    if getattr(index, "dictionary_version", None) == processor.version:
+        tokenized_docs = index.lexical_tokens
+    return await run_cpu_bound(BM25Index, rows, tokenized_docs)
+
+async def build_corpus(timer: StageTimer, index=None):
+    """
+    ของที่สร้างจากข้อความมาตรา (Dictionary ตัดคำ + BM25) ใช้ทั้งตอนเริ่มระบบและตอนข้อมูลกฎหมายเปลี่ยน
+    คืน (rows, BM25Index หรือ None ถ้าไม่ได้เปิด Hybrid / สร้างไม่สำเร็จ)
+    """
+    rows = None
+    if HYBRID_SEARCH or index is not None:
+        try:
+            rows = await load_section_rows(index)
+        except Exception as e:
+            log.warning(f"⚠️ ดึงข้อความมาตราไม่สำเร็จ ใช้ Dictionary พื้นฐาน: {e}")
+    with timer.stage("thai_dictionary"):
+        # สร้าง Trie ของ newmm (คำมาตรฐาน + ศัพท์แรงงาน + คำนิยามใน act_sections) แล้วอุ่นเครื่องตัดคำ
+        if rows:
+            processor = await run_cpu_bound(thai_text.load_corpus_vocabulary, [r['text_original'] for r in rows])
+        else:
+            processor = await run_cpu_bound(thai_text.get_processor)
+        await run_cpu_bound(processor.tokenize, "อุ่นเครื่องตัดคำภาษาไทย", False)
+    lexical = None
+    if HYBRID_SEARCH and rows:
+        try:
+            with timer.stage("lexical_index"):
+                lexical = await build_lexical_index(rows, processor, index)
+            log.info(f"📖 สร้าง BM25 Index แล้ว ({len(lexical)} มาตรา, {len(lexical.vocabulary)} คำ)")
+        except Exception as e:
+            log.warning(f"⚠️ สร้าง BM25 Index ไม่สำเร็จ ใช้ Dense Search อย่างเดียว: {e}")
+    return rows, lexical
+
+def answer_cache_version(corpus_version, rows, index=None):
+    """
+    เวอร์ชันที่ผูกกับ Answer Cache: เลขเวอร์ชันใน corpus_state + Hash ของเนื้อหาทุกมาตรา
+    (ไม่มีข้อความใช้เวลาที่สร้าง Snapshot แทน) เลขเวอร์ชันทำให้ล้าง Cache ได้แม้ไม่ได้ดึงข้อความมาเลย
+    (ค้นผ่าน Supabase + ปิด Hybrid)
+    """
+    content = None
+    if rows:
+        content = corpus_fingerprint(rows)
+    elif index is not None:
+        content = str(index.built_at)
+    parts = [str(part) for part in (corpus_version, content) if part is not None]
+    return ":".join(parts) or None
+
+def set_corpus_version(version):
+    corpus_state["version"] = version
+    corpus_state["loaded_at"] = time.time()
+    if version is not None:
+        CORPUS_VERSION.set(version)
+
+async def load_resources(import_ms: float):
+    """สร้างของหนักทั้งหมด + Warm-up แล้วค่อยบอกว่าพร้อมรับ Traffic (/ready = 200)"""
+    global supabase, llm, pipeline, embeddings, local_index, lexical_index, reranker, http_client
+    timer = StageTimer()
+    timer.record("module_import", import_ms)
+    try:
+        http_client = create_async_client()
+        with timer.stage("supabase_client"):
+            from supabase import acreate_client
+            from supabase.lib.client_options import AsyncClientOptions
+            supabase = await acreate_client(
+                SUPABASE_URL, SUPABASE_KEY, options=AsyncClientOptions(httpx_client=http_client))
+        corpus_version = None
+        if CORPUS_WATCH_SECONDS > 0:
+            # อ่านเวอร์ชันก่อนดึงข้อความ: ถ้ามี Sync แทรกระหว่างโหลด รอบเช็คถัดไปจะเห็นว่าเปลี่ยนแล้วโหลดใหม่เอง
+            try:
+                with timer.stage("corpus_version"):
+                    state = await aread_state(supabase)
+                corpus_version = state["version"] if state else 0
+            except Exception as e:
+                log.warning(f"⚠️ อ่านตาราง corpus_state ไม่ได้ ปิดการโหลดข้อมูลกฎหมายใหม่อัตโนมัติ: {e}")
+        with timer.stage("llm_client"):
+            llm = await run_cpu_bound(create_llm, "typhoon", http_client)
+        with timer.stage("embedding_model"):
+            embeddings = CachedQueryEmbeddings(AdmittedEmbeddings(await run_cpu_bound(get_embeddings), embedding_limiter))
+        with timer.stage("warmup_embedding"):
+            # รัน Model ครั้งแรก (ไม่ผ่าน Cache) ให้ torch จัดสรร Memory ไว้ก่อน Request จริงจะมา
+            await embeddings.base.aembed_query("อุ่นเครื่อง")
+        if RETRIEVAL_BACKEND == "local":
+            with timer.stage("local_index"):
+                local_index = await run_cpu_bound(LocalVectorIndex)
+            log.info(f"📂 ใช้ Local Index ({len(local_index)} มาตรา)")
+        elif RETRIEVAL_BACKEND == "chunks":
+            with timer.stage("chunk_index"):
+                local_index = await run_cpu_bound(ChunkIndex)
+            log.info(f"📂 ใช้ Chunk Index ({len(local_index)} มาตรา, {len(local_index.chunk_texts)} Chunk)")
+        # Prompt / Chain สร้างครั้งเดียวตรงนี้ ทุก Request ใช้ตัวเดียวกัน
+        pipeline = RagPipeline(llm, LocalRetriever(local_index) if local_index is not None else SupabaseRetriever(supabase))
+        rows, lexical_index = await build_corpus(timer, local_index)
+        if RERANK_ENABLED:
+            try:
+                with timer.stage("reranker"):
+                    reranker = await run_cpu_bound(load_reranker)
+                log.info(f"🏅 ใช้ Reranker {reranker.model_name} (คัด {RERANK_POOL} -> {RERANK_TOP_K} มาตรา)")
+            except Exception as e:
+                log.warning(f"⚠️ โหลด Reranker ไม่สำเร็จ ใช้ลำดับจาก Index แทน: {e}")
+        if corpus_version is not None and local_index is not None:
+            # Snapshot อาจสร้างก่อน Sync รอบล่าสุด -> ถือว่าโหลดเวอร์ชันของ Snapshot (ตัวเฝ้าจะรอจน Snapshot ตามทัน)
+            corpus_version = local_index.corpus_version or 0
+        # ผูก Answer Cache กับเวอร์ชันของข้อมูลกฎหมายที่โหลดอยู่
+        answer_cache.set_corpus_version(answer_cache_version(corpus_version, rows, local_index))
+        set_corpus_version(corpus_version)
+        startup_state["ready"] = True
+    except Exception as e:
+        log.exception(f"❌ เตรียมระบบไม่สำเร็จ: {e}")
+        startup_state["error"] = str(e)
+    finally:
+        startup_state["phases"] = {name: round(ms, 1) for name, ms in timer.stages.items()}
+        for name, ms in timer.stages.items():
+            STARTUP_PHASE_SECONDS.set(ms / 1000, phase=name)
+        log.info(f"🚀 Startup ({'พร้อมใช้งาน' if startup_state['ready'] else 'ล้มเหลว'}): {timer.summary()}")
+
+async def reload_corpus(version: int) -> bool:
+    """
+    ข้อมูลกฎหมายเปลี่ยนเป็นเวอร์ชัน version: สร้าง Index ชุดใหม่เบื้องหลัง แล้วสลับเข้าไปทีเดียว
+    Request ที่ค้างอยู่ใช้ Index ชุดเดิมจนจบ (ยังถือ Reference ไว้) ไม่มี Request ไหนโดนตัด
+    คืน False ถ้า Snapshot ในเครื่องยังไม่ตามทัน (รอ ingest.py --sync --refresh-index แล้วลองใหม่รอบหน้า)
+    """
+    global local_index, lexical_index
+    timer = StageTimer()
+    index = local_index
+    if index is not None:
+        with timer.stage("snapshot"):
+            index = await run_cpu_bound(LocalVectorIndex if RETRIEVAL_BACKEND == "local" else ChunkIndex)
+        if (index.corpus_version or 0) < version:
+            if corpus_state["pending"] != version:
+                log.warning(f"⏳ ข้อมูลกฎหมายเวอร์ชัน {version} แต่ Snapshot ยังเป็นเวอร์ชัน {index.corpus_version} "
+                            f"(รัน ingest.py --sync --refresh-index) รอ Snapshot ใหม่ก่อน")
+            corpus_state["pending"] = version
+            return False
+        version = index.corpus_version
+    rows, lexical = await build_corpus(timer, index)
+
+    # สลับทุกอย่างในจังหวะเดียว (ไม่มี await คั่น) Request ถัดไปเห็นชุดใหม่ทั้งชุด
+    if index is not local_index:
+        local_index = index
+        pipeline.retriever = LocalRetriever(index)
+    if lexical is not None:
+        lexical_index = lexical  # สร้างไม่สำเร็จ -> ใช้ BM25 ชุดเดิมต่อ ดีกว่าปิด Hybrid กลางทาง
+    answer_cache.set_corpus_version(answer_cache_version(version, rows, index))
+    set_corpus_version(version)
+    corpus_state["pending"] = None
+    corpus_state["reloads"] += 1
+    log.info(f"♻️ โหลดข้อมูลกฎหมายเวอร์ชัน {version} แล้ว ({len(rows or [])} มาตรา): {timer.summary()}")
+    return True
+
+async def watch_corpus():
+    """เช็คเลขเวอร์ชันใน corpus_state ทุก CORPUS_WATCH_SECONDS วินาที เปลี่ยนเมื่อไหร่โหลดใหม่ (ทีละรอบ)"""
+    while True:
+        await asyncio.sleep(CORPUS_WATCH_SECONDS)
+        if not startup_state["ready"] or corpus_state["version"] is None:
+            continue  # ยังโหลดไม่เสร็จ / ไม่มีตาราง corpus_state
+        try:
+            state = await aread_state(supabase)
+        except Exception as e:
+            log.warning(f"⚠️ เช็คเวอร์ชันข้อมูลกฎหมายไม่สำเร็จ: {e}")
+            continue
+        if state is None or state["version"] == corpus_state["version"]:
+            continue
+        started = time.perf_counter()
+        try:
+            reloaded = await reload_corpus(state["version"])
+        except Exception as e:
+            CORPUS_RELOADS.inc(result="error")
+            log.exception(f"❌ โหลดข้อมูลกฎหมายเวอร์ชัน {state['version']} ไม่สำเร็จ ใช้ชุดเดิมต่อ: {e}")
+            continue
+        if reloaded:
+            CORPUS_RELOADS.inc(result="ok")
+            CORPUS_RELOAD_SECONDS.observe(time.perf_counter() - started)
+        else:
+            CORPUS_RELOADS.inc(result="waiting")
 
 # 5. เริ่มต้นแอป FastAPI
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_logging()
+    import_ms = (time.perf_counter() - IMPORT_STARTED) * 1000
+    loader = None
+    if STARTUP_MODE == "blocking":
+        await load_resources(import_ms)
+    else:
+        loader = asyncio.create_task(load_resources(import_ms))
+    watcher = asyncio.create_task(watch_corpus()) if CORPUS_WATCH_SECONDS > 0 else None
+    yield
+    if loader is not None and not loader.done():
+        loader.cancel()
+    if watcher is not None:
+        watcher.cancel()
+    if http_client is not None:
+        await http_client.aclose()
+    shutdown_cpu_pool()
+    stop_logging()
+
+def require_ready():
+    """ยังโหลด Model ไม่เสร็จ -> ตอบ 503 ให้ Load Balancer / Client ลองใหม่ทีหลัง"""
+    if not startup_state["ready"]:
+        raise HTTPException(
+            status_code=503,
+            detail="ระบบกำลังเตรียมความพร้อม กรุณาลองใหม่อีกครั้ง",
+            headers={"Retry-After": "5"},
+        )
+
+async def identify_client(http_request: Request) -> str:
+    """ระบุ Client สำหรับคิวแบบ Fair Queuing (Header X-Client-Id ถ้ามี ไม่งั้นใช้ IP)"""
+    client_id = http_request.headers.get("X-Client-Id") or (
+        http_request.client.host if http_request.client else "anonymous")
+    current_client.set(client_id)
+    return client_id
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(http_request: Request, exc: AdmissionRejected):
+    """คิวเต็ม -> ตอบ 503 ทันที ให้ Client ถอยแล้วลองใหม่ (ดีกว่าปล่อยให้ Typhoon ตอบ 429 / RAM พุ่ง)"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "ระบบมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้ง", "stage": exc.stage, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # อนุญาตทุกเว็บ (เพื่อให้เพื่อนเทสง่ายๆ)
     allow_credentials=True,
     allow_methods=["*"],  # อนุญาตทุกท่า (GET, POST, etc.)
     allow_headers=["*"],  # อนุญาตทุก Header
+    expose_headers=["X-Session-Id"],  # ให้ JavaScript อ่าน Session ใหม่ได้ (ตอน Session เดิมหมดอายุ)
 )
 # --- Data Models (รูปแบบข้อมูลที่รับ-ส่ง) ---
 
 class ChatRequest(BaseModel):
     question: str
-    history: List[Dict[str, str]] = []  # รับประวัติการคุยมาด้วย (Context Awareness)
+    history: List[Dict[str, str]] = []  # รับประวัติการคุยมาด้วย (Context Awareness) ถ้าไม่ได้ใช้ Session
+    session_id: Optional[str] = None    # ได้จาก POST /sessions (Server จำประวัติให้ ไม่ต้องส่ง history)
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]                  # ส่งรายการมาตราที่อ้างอิงกลับไป (Citation)
+    session_id: Optional[str] = None    # Session ที่ใช้จริง (ถ้า Session เดิมหมดอายุจะได้ id ใหม่)
 
 # --- Helper Functions (ฟังก์ชันช่วยทำงาน) ---
 
-def preprocess_thai_text(text: str) -> str:
+def candidate_pool():
+    """(จำนวนผู้สมัคร, match_threshold) ที่ดึงจาก Index: มี Reranker ดึงกว้างกว่าแล้วให้ Cross-encoder คัด"""
+    if reranker is not None:
+        return RERANK_POOL, RERANK_POOL_THRESHOLD
+    return 5, 0.5
+
+async def rerank_candidates(questions: List[str], candidate_lists):
     """
-    ฟังก์ชันทำความสะอาดภาษาไทย (Text Preprocessing) ตาม Proposal
-    1. Normalize: แก้ปัญหาสระลอย วรรณยุกต์ซ้อน
-    2. Tokenize: ตัดคำและคั่นด้วยช่องว่าง เพื่อให้ Embedding Model จับใจความได้แม่นขึ้น
+    คัดผู้สมัครของหลายคำถามด้วย Cross-encoder (Forward Pass เดียว) เหลือคำถามละ RERANK_TOP_K มาตรา
+    ไม่มี Reranker / งาน Rerank ค้างเต็ม / เกินงบเวลา / Error -> ใช้ลำดับเดิมจาก Index
     """
-    # 1. จัดระเบียบตัวอักษร (เช่น สระอำ หรือวรรณยุกต์ที่พิมพ์ผิดลำดับ)
-    clean_text = normalize(text)
-    
-    # 2. ตัดคำแล้วเชื่อมด้วยช่องว่าง (เช่น "ลากิจได้กี่วัน" -> "ลากิจ ได้ กี่ วัน")
-    # การทำแบบนี้ช่วยให้โมเดล BGE-M3 เข้าใจขอบเขตคำได้ชัดเจนขึ้น
-    words = word_tokenize(clean_text, engine="newmm", keep_whitespace=False)
-    
-    return " ".join(words)
+    if reranker is None:
+        return [candidates[:5] for candidates in candidate_lists]
+    started = time.perf_counter()
+    future = reranker.submit_many(questions, candidate_lists)
+    if future is None:
+        RERANK_FALLBACK.inc(reason="busy")
+        log.warning("⚠️ งาน Rerank ค้างเต็ม ใช้ลำดับจาก Index แทน")
+        return [candidates[:RERANK_TOP_K] for candidates in candidate_lists]
+    try:
+        # งบเวลาคิดต่อคำถาม (/chat_batch ส่งมาทีละหลายคำถาม) เลิกรอแล้วงานที่ยังไม่ได้รันถูกยกเลิกด้วย
+        results = await asyncio.wait_for(
+            asyncio.wrap_future(future),
+            timeout=RERANK_TIMEOUT_MS * len(questions) / 1000,
+        )
+    except asyncio.TimeoutError:
+        RERANK_FALLBACK.inc(reason="timeout")
+        log.warning(f"⚠️ Rerank เกิน {RERANK_TIMEOUT_MS:.0f} ms ใช้ลำดับจาก Index แทน")
+        return [candidates[:RERANK_TOP_K] for candidates in candidate_lists]
+    except Exception as e:
+        RERANK_FALLBACK.inc(reason="error")
+        log.warning(f"⚠️ Rerank ไม่สำเร็จ ใช้ลำดับจาก Index แทน: {e}")
+        return [candidates[:RERANK_TOP_K] for candidates in candidate_lists]
+    RERANK_SECONDS.observe(time.perf_counter() - started)
+    for docs, report in results:
+        log.debug(f"🏅 Rerank {report['candidates']} -> {report['kept']} มาตรา: {report['before']} -> {report['after']}")
+    return [docs for docs, _ in results]
 
-def retrieve_data(question: str):
-    """ฟังก์ชันค้นหากฎหมายจาก Supabase"""
-    print(f"   🔍 กำลังค้นหาข้อมูลสำหรับ: {question}")
+async def retrieve_data(question: str, query_tokens: List[str] = None, query_vector: List[float] = None):
+    """ฟังก์ชันค้นหากฎหมาย (Dense + BM25 ถ้าเปิด Hybrid Search แล้ว Rerank ถ้าเปิดไว้)"""
+    log.debug(f"🔍 กำลังค้นหาข้อมูลสำหรับ: {question}")
+    
+    # 0. ถามเลขมาตราตรงๆ (เช่น "มาตรา 118") -> ดึงจาก Dictionary เลย ไม่ต้อง Embed
+    if lexical_index is not None:
+        direct_hits = lexical_index.lookup_sections(question)
+        if direct_hits:
+            return direct_hits[:5]
     
-    # 1. แปลงคำถามเป็น Vector
-    query_vector = embeddings.embed_query(question)
+    # 1. แปลงคำถามเป็น Vector (งานหนัก CPU -> ส่งไป Worker Pool)
+    if query_vector is None:
+        query_vector = await embeddings.aembed_query(question)
     
-    # 2. ยิงไปถาม Supabase (ใช้ฟังก์ชัน match_sections_v2 ที่เราสร้างใน SQL)
-    response = supabase.rpc(
-        "match_sections_v2",
-        {
-            "query_embedding": query_vector,
-            "match_threshold": 0.5, # ความเหมือนขั้นต่ำ 50%
-            "match_count": 5        # เอามา 5 อันดับแรก
-        }
-    ).execute()
+    # 2. ค้นแบบ Dense (ถ้าไม่มี BM25 ใช้ผลนี้เลย)
+    pool, threshold = candidate_pool()
+    if lexical_index is None:
+        candidates = await pipeline.retriever.asearch(query_vector, pool, threshold)
+    else:
+        dense_docs = await pipeline.retriever.asearch(query_vector, max(pool, 10), threshold)
+        
+        # 3. ค้นแบบ Lexical แล้วรวมผลด้วย RRF (ใช้ผลตัดคำที่มีอยู่แล้วถ้าส่งมา)
+        if query_tokens is None:
+            query_tokens = await run_cpu_bound(tokenize, question)
+        lexical_docs = lexical_index.search(query_tokens, match_count=max(pool, 10))
+        candidates = reciprocal_rank_fusion([dense_docs, lexical_docs], match_count=pool)
     
-    return response.data
+    # 4. Rerank (ถ้าเปิดไว้) คัดเหลือมาตราที่เกี่ยวจริงๆ
+    return (await rerank_candidates([question], [candidates]))[0]
 
-def rewrite_question(question: str, history: List[Dict[str, str]]) -> str:
+async def rewrite_question(question: str, history: List[Dict[str, str]]) -> str:
     """ฟังก์ชัน Context Awareness: แปลงคำถามกว้างๆ ให้ชัดเจนขึ้นโดยดูประวัติ"""
     
     # ถ้าไม่มีประวัติเก่า ก็ใช้คำถามเดิมเลย
     if not history:
         return question
     
-    print("   🔄 กำลังเรียบเรียงคำถามใหม่ (Query Rewriting)...")
-    
-    # แปลง History List ให้เป็นข้อความ String
-    history_text = ""
-    for msg in history[-4:]: # ดูย้อนหลังแค่ 2-3 คู่ล่าสุดพอ (ประหยัด Token)
-        role = "User" if msg['role'] == 'user' else "AI"
-        history_text += f"{role}: {msg['content']}\n"
-    
-    # Prompt สั่งให้ AI เขียนคำถามใหม่ (Standalone Question)
-    rewrite_template = """
-    จากบทสนทนาต่อไปนี้:
-    {chat_history}
-    
-    และคำถามล่าสุด: "{question}"
-    
-    จงเขียน "คำถามใหม่" ให้เป็นประโยคที่สมบูรณ์และเข้าใจได้ด้วยตัวเอง (Standalone Question) 
-    โดยรวมบริบทจากประวัติการสนทนาเข้าไปด้วย เพื่อให้สามารถนำไปค้นหาในฐานข้อมูลกฎหมายได้แม่นยำ
-    (ตอบเฉพาะประโยคคำถามใหม่เท่านั้น ไม่ต้องเกริ่นนำ ไม่ต้องใส่เครื่องหมายคำพูด)
-    
-    คำถามใหม่:
-    """
-    
+    log.debug("🔄 กำลังเรียบเรียงคำถามใหม่ (Query Rewriting)...")
     try:
-        prompt = PromptTemplate(template=rewrite_template, input_variables=["chat_history", "question"])
-        chain = prompt | llm | StrOutputParser()
-        
-        # สั่ง AI ทำงาน
-        new_question = chain.invoke({"chat_history": history_text, "question": question})
-        
-        print(f"   ✨ คำถามใหม่ที่ได้: {new_question}")
-        return new_question.strip()
+        # Rewrite Chain สร้างไว้ครั้งเดียวใน Pipeline (ainvoke = รอแบบไม่บล็อก Request อื่น)
+        new_question = await pipeline.arewrite(question, history)
+        log.debug(f"✨ คำถามใหม่ที่ได้: {new_question}")
+        return new_question
         
     except Exception as e:
-        print(f"   ❌ Error rewriting: {e}")
+        log.warning(f"❌ Error rewriting: {e}")
         return question # ถ้า error ให้ใช้คำถามเดิมไปก่อน
 
+def is_self_contained(question: str) -> bool:
+    """Heuristic ราคาถูก: คำถามนี้เข้าใจได้เองโดยไม่ต้องดูประวัติหรือไม่ (ถ้าใช่ ข้าม Rewrite ได้)"""
+    text = question.replace(" ", "")
+    if extract_section_numbers(text):
+        return True
+    if len(text) < SELF_CONTAINED_MIN_CHARS:
+        return False
+    return not any(marker in text for marker in FOLLOW_UP_MARKERS)
+
+def cosine_similarity(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5)
+    return dot / norm if norm else 0.0
+
+async def speculative_retrieve(question: str, query_tokens: List[str] = None):
+    """ค้นด้วยคำถามเดิม (ยังไม่ Rewrite) คืน (query_vector, retrieved_docs, เวลาที่ใช้ ms)"""
+    timer = StageTimer()
+    # shield: ถูกยกเลิก (Cache Hit / Client ปิดการเชื่อมต่อ) ก็ปล่อย Embedding ที่อยู่ใน Batch ให้จบแล้วเก็บลง Cache
+    # ไม่ยกเลิกงานที่ Model รับไปแล้วกลางทาง
+    query_vector = await asyncio.shield(embeddings.aembed_query(question))
+    retrieved_docs = await retrieve_data(question, query_tokens, query_vector)
+    return query_vector, retrieved_docs, timer.total_ms()
+
+async def prepare_search(question: str, history: List[Dict[str, str]], query_tokens: List[str], timer: StageTimer,
+                         previous: dict = None):
+    """
+    Step 1-2 ที่ใช้ร่วมกันทั้ง /chat และ /chat_stream:
+    Rewrite -> Answer Cache -> Retrieval (พร้อมค้นล่วงหน้าระหว่างรอ Rewrite)
+    previous: Session ที่มีผลค้นหาของรอบก่อน (ถ้ามี ใช้แทนการค้นล่วงหน้า)
+    คืน (search_query, คำตอบใน Cache หรือ None, retrieved_docs, query_vector ถ้ามี)
+    """
+    speculative = None
+    try:
+        reusable = previous is not None and previous.get("last_docs") and previous.get("last_vector") is not None
+        # มาตราที่จำไว้ใน Session มาจากข้อมูลกฎหมายชุดก่อน (โหลดเวอร์ชันใหม่ไปแล้ว) -> ค้นใหม่
+        reusable = reusable and previous.get("corpus_version") == corpus_state["version"]
+        if history and PIPELINED_REWRITE and is_self_contained(question):
+            # คำถามสมบูรณ์ในตัวอยู่แล้ว ไม่ต้องเสียเวลารอ LLM
+            log.debug("⏭️ คำถามสมบูรณ์ในตัว ข้าม Query Rewriting")
+            search_query = question
+            timer.record("rewrite_skipped", 0.0)
+        else:
+            if history and PIPELINED_REWRITE and not reusable:
+                speculative = asyncio.create_task(speculative_retrieve(question, query_tokens))
+            with timer.stage("rewrite"):
+                search_query = await rewrite_question(question, history)
+
+        with timer.stage("answer_cache"):
+            cached, query_vector = await lookup_cached_answer(search_query)
+        if cached is not None:
+            if speculative is not None:
+                speculative.cancel()
+            return search_query, cached, None, query_vector
+
+        retrieved_docs = None
+        if speculative is not None or reusable:
+            try:
+                # ผลค้นหาที่มีอยู่แล้ว: ค้นล่วงหน้าด้วยคำถามเดิม หรือมาตราที่ค้นเจอในรอบก่อนของ Session
+                if speculative is not None:
+                    known_vector, known_docs, known_ms = await speculative
+                    timer.record("speculative_retrieval", known_ms)
+                    label = "speculative"
+                else:
+                    known_vector, known_docs, known_ms = previous["last_vector"], previous["last_docs"], 0.0
+                    label = "session"
+                if label == "speculative" and search_query == question:
+                    similarity = 1.0
+                else:
+                    if query_vector is None:
+                        with timer.stage("embed"):
+                            query_vector = await embeddings.aembed_query(search_query)
+                    similarity = cosine_similarity(known_vector, query_vector)
+                if similarity >= SPECULATIVE_REUSE_SIMILARITY:
+                    log.debug(f"🎯 ใช้ผลค้นหาเดิม ({label}, similarity {similarity:.2f})")
+                    retrieved_docs = known_docs
+                    timer.record(f"{label}_saved", known_ms)
+                elif similarity >= SPECULATIVE_MERGE_SIMILARITY:
+                    with timer.stage("retrieval"):
+                        fresh_docs = await retrieve_data(search_query, None, query_vector)
+                    retrieved_docs = reciprocal_rank_fusion([fresh_docs, known_docs], match_count=5)
+            except Exception as e:
+                log.warning(f"⚠️ ใช้ผลค้นหาเดิมไม่สำเร็จ: {e}")
+
+        if retrieved_docs is None:
+            # ถ้าไม่ได้เขียนคำถามใหม่ ใช้ผลตัดคำที่มีอยู่ต่อได้เลย (ไม่ต้องตัดซ้ำ)
+            tokens = query_tokens if search_query == question else None
+            with timer.stage("retrieval"):
+                retrieved_docs = await retrieve_data(search_query, tokens, query_vector)
+        return search_query, None, retrieved_docs, query_vector
+    finally:
+        # ถูกยกเลิกกลางทาง (Client ปิดการเชื่อมต่อ / เกิน Deadline) -> ไม่ต้องค้นล่วงหน้าต่อ
+        if speculative is not None and not speculative.done():
+            speculative.cancel()
+
+def open_session(request: ChatRequest):
+    """คืน (session_id, session, history) ถ้าไม่ได้ส่ง session_id มาใช้ history จาก Request แบบเดิม"""
+    if request.session_id is None:
+        return None, None, request.history
+    session = session_store.get(request.session_id)
+    if session is None:
+        # หมดอายุ / ไม่รู้จัก -> เริ่ม Session ใหม่ (Client อัปเดต id จากผลลัพธ์ / Header X-Session-Id)
+        return generate_session_id(), new_session(), []
+    return request.session_id, session, session["history"]
+
+def close_turn(session_id, session, question: str, answer: str, search_query: str = None,
+               query_vector=None, retrieved_docs=None):
+    """บันทึกรอบนี้ลง Session (ไม่ได้ใช้ Session ก็ไม่ต้องทำอะไร)"""
+    if session_id is None:
+        return
+    record_turn(session, question, answer, search_query, query_vector, retrieved_docs)
+    if retrieved_docs:
+        session["corpus_version"] = corpus_state["version"]
+    session_store.save(session_id, session)
+
+async def prepare_context(endpoint: str, search_query: str, retrieved_docs, timer: StageTimer) -> dict:
+    """Step 3: ประกอบ Context ให้อยู่ในงบ Token (ตัดประโยคที่ไม่เกี่ยว / มาตราซ้ำ) แล้วนับ Token ที่ประหยัดได้"""
+    with timer.stage("context"):
+        built = await run_cpu_bound(build_context, search_query, retrieved_docs)
+    CONTEXT_TOKENS_SAVED.inc(built["tokens_saved"], endpoint=endpoint)
+    log.debug(f"📦 Context {built['tokens']} tokens (ประหยัด {built['tokens_saved']}, "
+              f"ตัดประโยค {built['trimmed']} มาตรา, ตัดซ้ำ {built['dropped']} มาตรา)")
+    return built
+
+def record_tokens(endpoint: str, prompt_text: str, answer: str, complete: bool = True) -> dict:
+    """
+    นับ Token ที่ส่งไป/ได้กลับจาก LLM (ประมาณด้วย tiktoken) ลง Metrics แล้วคืนเป็น usage
+    complete=False: คำตอบถูกตัดกลางทาง (ไม่เอาไปคิดความยาวคำตอบเฉลี่ย)
+    """
+    usage = {"prompt_tokens": count_tokens(prompt_text), "completion_tokens": count_tokens(answer)}
+    LLM_TOKENS.inc(usage["prompt_tokens"], endpoint=endpoint, kind="prompt")
+    LLM_TOKENS.inc(usage["completion_tokens"], endpoint=endpoint, kind="completion")
+    if complete:
+        completion_estimate.record(usage["completion_tokens"])
+    return usage
+
+def record_cancelled(endpoint: str, reason: str, stage: str, timer: StageTimer, prompt_text: str = None,
+                     answer: str = ""):
+    """
+    นับ Request ที่หยุดกลางทาง + Token ที่ไม่ต้องจ่าย (ประมาณ):
+    ยังไม่ได้ส่ง Prompt -> Prompt ทั้งหมด (ถ้าประกอบเสร็จแล้ว) + คำตอบเฉลี่ย, กำลังตอบ -> คำตอบส่วนที่เหลือ
+    """
+    CANCELLED_REQUESTS.inc(endpoint=endpoint, reason=reason, stage=stage)
+    if stage != "generation" and prompt_text is not None:
+        CANCELLED_TOKENS_SAVED.inc(count_tokens(prompt_text), endpoint=endpoint, kind="prompt")
+    generated = count_tokens(answer) if answer else 0
+    CANCELLED_TOKENS_SAVED.inc(completion_estimate.remaining(generated), endpoint=endpoint, kind="completion")
+    observe_request(endpoint, timer, "disconnected" if reason == "disconnect" else "deadline")
+    log.info(f"✂️ /{endpoint} หยุดที่ {stage} ({reason}) หลัง {timer.total_ms():.0f} ms")
+
+@registry.add_collector
+def collect_cache_stats():
+    """อัปเดตสถิติ Cache ลง Metrics ทุกครั้งที่มีคนมาอ่าน /metrics"""
+    if embeddings is None:
+        return  # ยังโหลดไม่เสร็จ
+    embedding_stats = embeddings.stats()
+    CACHE_HITS.set(embedding_stats["hits"], cache="query_embedding")
+    CACHE_MISSES.set(embedding_stats["misses"], cache="query_embedding")
+    CACHE_SIZE.set(embedding_stats["size"], cache="query_embedding")
+    answer_stats = answer_cache.stats()
+    CACHE_HITS.set(answer_stats["exact_hits"], cache="answer_exact")
+    CACHE_HITS.set(answer_stats["semantic_hits"], cache="answer_semantic")
+    CACHE_MISSES.set(answer_stats["misses"], cache="answer")
+    CACHE_SIZE.set(answer_stats["size"], cache="answer")
+    if reranker is not None:
+        rerank_stats = reranker.stats()
+        CACHE_HITS.set(rerank_stats["hits"], cache="rerank")
+        CACHE_MISSES.set(rerank_stats["misses"], cache="rerank")
+        CACHE_SIZE.set(rerank_stats["size"], cache="rerank")
+
+async def lookup_cached_answer(search_query: str):
+    """เช็ค Answer Cache (Exact ก่อน แล้วค่อย Semantic) คืน (คำตอบเดิมหรือ None, query_vector)"""
+    cached = answer_cache.get_exact(search_query)
+    if cached is not None:
+        return cached, None
+    
+    query_vector = None
+    if answer_cache.semantic_enabled:
+        query_vector = await embeddings.aembed_query(search_query)
+    return answer_cache.get_semantic(query_vector), query_vector
+
 # --- Main API Endpoint ---
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_ready)])
+async def chat_endpoint(request: ChatRequest, response: Response, client_id: str = Depends(identify_client)):
+    timer = StageTimer()
     try:
         # --- [NEW] Step 0: Text Preprocessing (PyThaiNLP) ---
         # ตรงตาม Proposal เรื่องการทำความสะอาดและจัดการภาษาธรรมชาติ [cite: 45, 201]
-        processed_question = preprocess_thai_text(request.question)
-        print(f"   🧹 Cleaned Input: {processed_question}") # เช็ค Log ดูว่ามันตัดคำให้ไหม
+        # ตัดคำครั้งเดียว (ผลถูกจำไว้ใน thai_text) -> BM25 ใช้ต่อ และ Key ของ Cache ไม่ต้องตัดซ้ำ
+        with timer.stage("preprocess"):
+            query_tokens = await run_cpu_bound(tokenize, request.question)
+        log.debug(f"🧹 Cleaned Input: {' '.join(query_tokens)}") # เช็ค Log ดูว่ามันตัดคำให้ไหม (LOG_LEVEL=DEBUG)
 
-        # Step 1: Context Awareness (Query Rewriting)
-        # เช็คประวัติ แล้วเขียนคำถามใหม่ให้ชัดเจน
-        search_query = rewrite_question(request.question, request.history)
+        # Step 1-2: Context Awareness (Query Rewriting) + Answer Cache + Retrieval
+        # เช็คประวัติ แล้วเขียนคำถามใหม่ให้ชัดเจน (ระหว่างรอก็ค้นด้วยคำถามเดิมไปก่อน)
+        session_id, session, history = open_session(request)
+        if session_id is not None:
+            response.headers["X-Session-Id"] = session_id
+        search_query, cached, retrieved_docs, query_vector = await prepare_search(
+            request.question, history, query_tokens, timer, session
+        )
         
-        # Step 2: Retrieval (ค้นหาข้อมูลจากคำถามใหม่)
-        retrieved_docs = retrieve_data(search_query)
+        # เคยตอบคำถามนี้แล้ว -> ส่งคำตอบเดิมเลย ไม่ต้องเรียก LLM
+        if cached is not None:
+            log.debug("⚡ ใช้คำตอบจาก Answer Cache")
+            close_turn(session_id, session, request.question, cached["answer"])
+            response.headers["Server-Timing"] = timer.server_timing_header()
+            observe_request("chat", timer, "cache_hit")
+            return ChatResponse(answer=cached["answer"], sources=cached["sources"], session_id=session_id)
         
         # ถ้าหาไม่เจอเลย
         if not retrieved_docs:
-            return ChatResponse(answer="ขออภัยครับ ไม่พบข้อมูลกฎหมายที่เกี่ยวข้องกับเรื่องนี้ในฐานข้อมูล", sources=[])
+            # จำรอบนี้ไว้ด้วย คำถามต่อเนื่อง ("แล้วถ้า...") จะได้ Rewrite จากคำถามที่เพิ่งถามไป
+            close_turn(session_id, session, request.question, NO_DOCS_ANSWER)
+            observe_request("chat", timer, "no_docs")
+            return ChatResponse(answer=NO_DOCS_ANSWER, sources=[], session_id=session_id)
 
-        # Step 3: Prepare Context (เตรียมข้อมูลใส่ Prompt)
         # --- Step 3: Prepare Context (เตรียมข้อมูลใส่ Prompt) ---
-        context_text = ""
-        sources_set = set() # ใช้ set เพื่อกันซ้ำ
-        
-        for doc in retrieved_docs:
-            sec_num = doc.get('section_number', '?')
-            text = doc.get('text_original', '')
-            # เก็บเนื้อหาไว้ตอบ (ยังคงเอามาทั้งหมดเพื่อให้ AI อ่าน)
-            context_text += f"- มาตรา {sec_num}: {text}\n\n"
-            # เก็บเลขมาตราลง set (ถ้ามีอยู่แล้ว มันจะไม่เพิ่มซ้ำ)
-            sources_set.add(f"มาตรา {sec_num}")
-        # แปลงกลับเป็น list และเรียงลำดับให้สวยงาม (เช่น มาตรา 9, 76, 118)
-        # ใช้ lambda เพื่อดึงเลขมาเรียง (ป้องกันการเรียงแบบ string เช่น 1, 10, 2)
+        # ใส่มาตราเรียงตามความเกี่ยวข้องจนเต็มงบ Token, sources เรียงเลขมาตราให้แล้ว (เช่น มาตรา 9, 76, 118)
+        built = await prepare_context("chat", search_query, retrieved_docs, timer)
+        context_text = built["context"]
+        sources_list = built["sources"]
+
+        # Step 4: Generation (ให้ AI ตอบ ด้วย Chain ที่สร้างไว้แล้วใน Pipeline)
+        # ส่ง search_query (ที่แก้แล้ว) + context ไปให้ AI (ต้องได้ Slot ก่อน ถ้าเต็มจะรอในคิว)
+        with timer.stage("generation_queue"):
+            await generation_limiter.acquire(client_id)
         try:
-            sources_list = sorted(list(sources_set), key=lambda x: int(x.split()[-1]) if x.split()[-1].isdigit() else 9999)
-        except:
-            sources_list = sorted(list(sources_set)) # ถ้าเรียงไม่ได้ก็เรียงตามตัวอักษรปกติ
-
-        # Step 4: Generation (ให้ AI ตอบ)
-        template = """
-        คุณคือทนายความผู้เชี่ยวชาญกฎหมายแรงงานไทย (Thai Labour Law Expert)
-        หน้าที่ของคุณคือให้คำปรึกษาแก่ลูกจ้างอย่างถูกต้อง สุภาพ และเข้าใจง่าย
-        
-        ข้อมูลกฎหมายที่อ้างอิง:
-        {context}
-        
-        คำถาม: {question}
-        
-        คำแนะนำในการตอบ:
-        1. ตอบคำถามโดยอ้างอิงจาก "ข้อมูลกฎหมาย" ที่ให้ไปเท่านั้น
-        2. ถ้าข้อมูลไม่เพียงพอ ให้บอกตรงๆ ว่าไม่ทราบ
-        3. อ้างอิงเลขมาตราเสมอเมื่อกล่าวถึงข้อกฎหมาย
-        4. สรุปใจความสำคัญให้เข้าใจง่ายสำหรับคนทั่วไป
-        
-        คำตอบ:
-        """
-        
-        prompt = PromptTemplate(template=template, input_variables=["context", "question"])
-        chain = prompt | llm | StrOutputParser()
-        
-        # ส่ง search_query (ที่แก้แล้ว) + context ไปให้ AI
-        ai_answer = chain.invoke({"context": context_text, "question": search_query})
+            with timer.stage("generation"):
+                ai_answer = await pipeline.agenerate(context_text, search_query)
+        finally:
+            generation_limiter.release()
+        answer_cache.put(search_query, ai_answer, sources_list, query_vector)
+        close_turn(session_id, session, request.question, ai_answer, search_query, query_vector, retrieved_docs)
+        record_tokens("chat", pipeline.prompt_text(context_text, search_query), ai_answer)
         
         # Step 5: Return Result (ส่งคำตอบ + แหล่งอ้างอิงกลับไป)
-        return ChatResponse(answer=ai_answer, sources=sources_list)
+        log.info(f"⏱️ /chat {timer.summary()} | context {built['tokens']} tokens (saved {built['tokens_saved']})")
+        response.headers["Server-Timing"] = timer.server_timing_header()
+        response.headers["X-Context-Tokens-Saved"] = str(built["tokens_saved"])
+        observe_request("chat", timer)
+        return ChatResponse(answer=ai_answer, sources=sources_list, session_id=session_id)
 
+    except AdmissionRejected:
+        observe_request("chat", timer, "rejected")
+        raise
     except Exception as e:
-        print(f"Server Error: {e}")
+        log.exception(f"Server Error: {e}")
+        observe_request("chat", timer, "error")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat_stream")
-async def chat_stream_endpoint(request: ChatRequest):
+@app.post("/chat_stream", dependencies=[Depends(require_ready)])
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    client_id: str = Depends(identify_client),
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$"),
+):
+    """
+    ตอบแบบ Stream: ?format=ndjson (ค่าเริ่มต้น) หรือ ?format=sse (Server-Sent Events)
+    Client ปิดการเชื่อมต่อเมื่อไหร่ หยุดทุกอย่างที่ค้างอยู่ (ค้นหา / คิว / Typhoon) ทันที
+    เกิน STREAM_DEADLINE_SECONDS -> ตัดคำตอบตรงนั้นแล้วส่ง done (truncated=true)
+    """
+    timer = StageTimer()
+    media_type = MEDIA_TYPES[stream_format]
+    deadline = request_deadline()
+
+    def encode(event: dict) -> bytes:
+        return encode_event(event, stream_format)
+
+    def done_event(usage: dict, cached: bool = False, truncated: bool = False) -> bytes:
+        return encode({
+            "type": "done",
+            "session_id": session_id,
+            "cached": cached,
+            "truncated": truncated,
+            "usage": usage,
+            "timing_ms": {name: round(ms, 1) for name, ms in timer.stages.items()},
+        })
+
     try:
-        # Step 1: Preprocessing & Rewriting (เหมือนเดิม)
-        processed_question = preprocess_thai_text(request.question)
-        search_query = rewrite_question(processed_question, request.history)
+        # Step 1: Preprocessing & Rewriting (เหมือนเดิม) + Retrieval (ค้นหาข้อมูล)
+        with timer.stage("preprocess"):
+            query_tokens = await run_cpu_bound(tokenize, request.question)
+        session_id, session, history = open_session(request)
+        # Client ปิดการเชื่อมต่อ / เกิน Deadline ระหว่างค้น -> ยกเลิก Rewrite / Embedding / ค้นหาที่ค้างอยู่ทันที
+        search_query, cached, retrieved_docs, query_vector = await guarded(
+            prepare_search(request.question, history, query_tokens, timer, session), http_request, deadline
+        )
+        # Header ต้องส่งก่อนเริ่ม Stream เลยมีแค่เวลาช่วงก่อน Generation
+        stream_headers = {**STREAM_HEADERS, "Server-Timing": timer.server_timing_header()}
+        if session_id is not None:
+            stream_headers["X-Session-Id"] = session_id
         
-        # Step 2: Retrieval (ค้นหาข้อมูล)
-        retrieved_docs = retrieve_data(search_query)
+        # Answer Cache -> ส่ง sources แล้วตามด้วยคำตอบเดิมเป็นชิ้นๆ (รูปแบบเดียวกับ LLM Stream)
+        if cached is not None:
+            log.debug("⚡ ใช้คำตอบจาก Answer Cache")
+            async def cached_generator():
+                yield encode({"type": "sources", "data": cached["sources"]})
+                answer = cached["answer"]
+                for start in range(0, len(answer), REPLAY_CHUNK_CHARS):
+                    yield encode({"type": "content", "data": answer[start:start + REPLAY_CHUNK_CHARS]})
+                close_turn(session_id, session, request.question, answer)
+                yield done_event({"prompt_tokens": 0, "completion_tokens": 0}, cached=True)
+                observe_request("chat_stream", timer, "cache_hit")
+            return StreamingResponse(cached_generator(), media_type=media_type, headers=stream_headers)
 
-        # เตรียม Context และ Sources
-        context_text = ""
-        sources_set = set()
-        
         # ถ้าหาข้อมูลไม่เจอเลย
         if not retrieved_docs:
+            close_turn(session_id, session, request.question, NO_DOCS_ANSWER)
+            observe_request("chat_stream", timer, "no_docs")
             async def empty_generator():
-                yield json.dumps({
+                yield encode({
                     "type": "error", 
                     "message": "ขออภัยครับ ไม่พบข้อมูลกฎหมายที่เกี่ยวข้องกับเรื่องนี้"
-                }) + "\n"
-            return StreamingResponse(empty_generator(), media_type="application/x-ndjson")
-
-        # จัดการข้อมูลที่เจอ (Context Building)
-        for doc in retrieved_docs:
-            sec_num = doc.get('section_number', '?')
-            text = doc.get('text_original', '')
-            context_text += f"- มาตรา {sec_num}: {text}\n\n"
-            sources_set.add(f"มาตรา {sec_num}")
-        
-        # เรียงลำดับ Sources ให้สวยงาม
-        try:
-            sources_list = sorted(list(sources_set), key=lambda x: int(x.split()[-1]) if x.split()[-1].isdigit() else 9999)
-        except:
-            sources_list = sorted(list(sources_set))
+                })
+            return StreamingResponse(empty_generator(), media_type=media_type,
+                                     headers={**STREAM_HEADERS, **({"X-Session-Id": session_id} if session_id else {})})
+
+        # คิว Generation เต็มแล้ว -> ตอบ 503 ตอนนี้เลย (เริ่ม Stream ไปแล้วจะเปลี่ยน Status ไม่ได้)
+        generation_limiter.check_capacity()
+
+        # จัดการข้อมูลที่เจอ (Context Building ภายในงบ Token)
+        built = await guarded(prepare_context("chat_stream", search_query, retrieved_docs, timer), http_request, deadline)
+        context_text = built["context"]
+        prompt_text = pipeline.prompt_text(context_text, search_query)
+        sources_list = built["sources"]
+        stream_headers["Server-Timing"] = timer.server_timing_header()
+        stream_headers["X-Context-Tokens-Saved"] = str(built["tokens_saved"])
 
         # --- Step 3: Generator Function (หัวใจของ Streaming) ---
         async def event_generator():
             # 3.1 ส่ง "รายการมาตรา" (Sources) ไปให้ Frontend ก่อนเลย (เร็วมาก)
-            yield json.dumps({
-                "type": "sources", 
-                "data": sources_list
-            }) + "\n"
-
-            # 3.2 เตรียม Prompt (เหมือนเดิม)
-            template = """
-            คุณคือทนายความผู้เชี่ยวชาญกฎหมายแรงงานไทย (Thai Labour Law Expert)
-            หน้าที่ของคุณคือให้คำปรึกษาแก่ลูกจ้างอย่างถูกต้อง สุภาพ และเข้าใจง่าย
-            
-            ข้อมูลกฎหมายที่อ้างอิง:
-            {context}
-            
-            คำถาม: {question}
-            
-            คำแนะนำในการตอบ:
-            1. ตอบคำถามโดยอ้างอิงจาก "ข้อมูลกฎหมาย" ที่ให้ไปเท่านั้น
-            2. ถ้าข้อมูลไม่เพียงพอ ให้บอกตรงๆ ว่าไม่ทราบ
-            3. อ้างอิงเลขมาตราเสมอเมื่อกล่าวถึงข้อกฎหมาย
-            4. สรุปใจความสำคัญให้เข้าใจง่ายสำหรับคนทั่วไป
-            
-            คำตอบ:
-            """
-            prompt = PromptTemplate(template=template, input_variables=["context", "question"])
-            chain = prompt | llm | StrOutputParser()
-
-            # 3.3 สั่ง AI ตอบแบบ Stream (ทีละคำ)
-            # ใช้ .astream แทน .invoke เพื่อรับข้อมูลทีละชิ้น
-            async for chunk in chain.astream({"context": context_text, "question": search_query}):
-                # ส่งเนื้อหาทีละนิดไปให้ Frontend
-                yield json.dumps({
-                    "type": "content", 
-                    "data": chunk
-                }) + "\n"
+            yield encode({"type": "sources", "data": sources_list})
+
+            # 3.2 สั่ง AI ตอบแบบ Stream (Chain สร้างไว้แล้วใน Pipeline)
+            # Token ที่มาทีละนิดจะถูกรวมเป็นก้อน (ทุก STREAM_FLUSH_MS หรือ STREAM_FLUSH_CHARS ตัวอักษร)
+            answer_parts = []
+            try:
+                with timer.stage("generation_queue"):
+                    await guarded(generation_limiter.acquire(client_id), http_request, deadline)
+            except AdmissionRejected:
+                observe_request("chat_stream", timer, "rejected")
+                yield encode({"type": "error", "message": "ระบบมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้ง"})
+                return
+            except RequestCancelled as e:
+                # ยังไม่ได้ส่ง Prompt ไป Typhoon เลย
+                record_cancelled("chat_stream", e.reason, "generation_queue", timer, prompt_text)
+                if e.reason == "deadline":
+                    yield encode({"type": "error", "message": DEADLINE_MESSAGE})
+                return
+            generation_started = timer.total_ms()
+            stopped = None
+            try:
+                # aclosing: หยุดกลางทาง (break / Client หลุด) -> ยกเลิก Stream จาก Typhoon ทันที ไม่ต้องรอ GC
+                events = coalesce(pipeline.astream(context_text, search_query),
+                                  deadline=deadline, stop=wait_for_disconnect(http_request))
+                async with aclosing(events):
+                    async for kind, text in events:
+                        if kind == "heartbeat":
+                            yield encode({"type": "heartbeat"})
+                            continue
+                        if kind in ("deadline", "stopped"):
+                            stopped = "deadline" if kind == "deadline" else "disconnect"
+                            break
+                        if not answer_parts:
+                            timer.record("first_token", timer.total_ms() - generation_started)
+                        answer_parts.append(text)
+                        yield encode({"type": "content", "data": text})
+            except asyncio.CancelledError:
+                # Server ยกเลิก Generator เองตอน Client ปิดการเชื่อมต่อ (Starlette) -> นับแล้วปล่อยให้ยกเลิกต่อ
+                record_cancelled("chat_stream", "disconnect", "generation", timer, answer="".join(answer_parts))
+                raise
+            except Exception as e:
+                log.exception(f"Stream Error: {e}")
+                observe_request("chat_stream", timer, "error")
+                yield encode({"type": "error", "message": str(e)})
+                return
+            finally:
+                # คืน Slot ทุกกรณี (ตอบจบ / Error / Client ปิดการเชื่อมต่อกลางทาง)
+                generation_limiter.release()
+
+            answer = "".join(answer_parts)
+            timer.record("generation", timer.total_ms() - generation_started)
+            usage = record_tokens("chat_stream", prompt_text, answer, complete=stopped is None)
+            usage["context_tokens_saved"] = built["tokens_saved"]
+            if stopped is not None:
+                record_cancelled("chat_stream", stopped, "generation", timer, answer=answer)
+                if stopped == "deadline":
+                    # คำตอบบางส่วนที่ Client ได้ไปแล้ว: จำไว้ใน Session แต่ไม่เก็บลง Answer Cache
+                    close_turn(session_id, session, request.question, answer, search_query, query_vector,
+                               retrieved_docs)
+                    yield done_event(usage, truncated=True)
+                return
+
+            # 3.3 ตอบครบแล้วค่อยเก็บลง Cache (ถ้าหลุดกลางทางจะไม่เก็บคำตอบครึ่งๆ)
+            answer_cache.put(search_query, answer, sources_list, query_vector)
+            close_turn(session_id, session, request.question, answer, search_query, query_vector, retrieved_docs)
+            yield done_event(usage)
+            log.info(f"⏱️ /chat_stream {timer.summary()} | "
+                     f"context {built['tokens']} tokens (saved {built['tokens_saved']})")
+            observe_request("chat_stream", timer)
 
         # ส่งคืนเป็น StreamingResponse
-        return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+        return StreamingResponse(event_generator(), media_type=media_type, headers=stream_headers)
 
+    except AdmissionRejected:
+        observe_request("chat_stream", timer, "rejected")
+        raise
+    except RequestCancelled as e:
+        # หยุดก่อนส่ง Prompt (Client ไปแล้วก็ไม่มีใครอ่าน Event นี้ / เกิน Deadline บอกให้ลองใหม่)
+        record_cancelled("chat_stream", e.reason, "retrieval", timer)
+        return StreamingResponse(iter([encode({"type": "error", "message": DEADLINE_MESSAGE})]), media_type=media_type)
     except Exception as e:
-        print(f"Server Error: {e}")
+        log.exception(f"Server Error: {e}")
+        observe_request("chat_stream", timer, "error")
         # กรณี Error หนักๆ ส่ง JSON Error กลับไป
         return StreamingResponse(
-            iter([json.dumps({"type": "error", "message": str(e)}) + "\n"]),
-            media_type="application/x-ndjson"
+            iter([encode({"type": "error", "message": str(e)})]),
+            media_type=media_type
         )
+
+# --- Batch: ถามทีละหลายคำถาม (JSONL เข้า / JSONL ออก) ---
+
+BATCH_ADMISSION_RETRIES = 3  # คิว Generation เต็ม -> รอตาม Retry-After แล้วลองใหม่กี่ครั้ง
+
+def rank_lexical_many(questions: List[str], match_count: int = 10):
+    """ตัดคำ + BM25 ของหลายคำถามในรอบเดียว (เรียกผ่าน run_cpu_bound)"""
+    return [lexical_index.search(tokenize(question), match_count=match_count) for question in questions]
+
+async def retrieve_many(questions: List[str], client_id: str = None):
+    """
+    ค้นหาทั้ง Batch: Embed คำถามที่ยังไม่อยู่ใน Cache เป็น Batch เดียว แล้วหา Top-k ของทุกคำถาม
+    ด้วยการคูณ Matrix ครั้งเดียว (Local/Chunk Index) หรือยิง RPC พร้อมกัน (Supabase)
+    คืน [(retrieved_docs, query_vector)] ตามลำดับคำถาม (คำถามที่ค้นไม่สำเร็จได้ Exception แทน)
+    """
+    results = [None] * len(questions)
+    pending = []
+    for i, question in enumerate(questions):
+        # ถามเลขมาตราตรงๆ -> ดึงจาก Dictionary เลยเหมือน retrieve_data
+        direct_hits = lexical_index.lookup_sections(question) if lexical_index is not None else None
+        if direct_hits:
+            results[i] = (direct_hits[:5], None)
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    pending_questions = [questions[i] for i in pending]
+    async with embedding_limiter.slot(client_id):
+        query_vectors = await embeddings.aembed_queries(pending_questions)
+
+    pool, threshold = candidate_pool()
+    dense_count = pool if lexical_index is None else max(pool, 10)
+    # Local / Chunk Index: คูณ Matrix ครั้งเดียวทุกคำถาม, Supabase: ยิง RPC พร้อมกัน
+    dense_results = await pipeline.retriever.asearch_batch(query_vectors, dense_count, threshold)
+
+    # คำถามที่ RPC ล้ม: ได้ Error เฉพาะข้อนั้น ข้อที่เหลือไปต่อ
+    searched = []
+    for n, dense_docs in enumerate(dense_results):
+        if isinstance(dense_docs, Exception):
+            log.warning(f"⚠️ ค้นหาคำถามที่ {pending[n] + 1} ใน Batch ไม่สำเร็จ: {dense_docs}")
+            results[pending[n]] = dense_docs
+        else:
+            searched.append(n)
+    searched_questions = [pending_questions[n] for n in searched]
+
+    candidate_lists = [dense_results[n] for n in searched]
+    if lexical_index is not None:
+        lexical_results = await run_cpu_bound(rank_lexical_many, searched_questions, max(pool, 10))
+        candidate_lists = [reciprocal_rank_fusion([dense_docs, lexical_docs], match_count=pool)
+                           for dense_docs, lexical_docs in zip(candidate_lists, lexical_results)]
+
+    # Rerank ผู้สมัครของทุกคำถามรวมกันรอบเดียว
+    reranked = await rerank_candidates(searched_questions, candidate_lists)
+    for docs, n in zip(reranked, searched):
+        results[pending[n]] = (docs, query_vectors[n])
+    return results
+
+async def generate_answer(endpoint: str, question: str, retrieved_docs, query_vector, client_id: str):
+    """Context + Generation ของคำถามเดียว (ไม่ Stream) คืน (answer, sources)"""
+    if not retrieved_docs:
+        return NO_DOCS_ANSWER, []
+    timer = StageTimer()
+    built = await prepare_context(endpoint, question, retrieved_docs, timer)
+    for attempt in range(BATCH_ADMISSION_RETRIES + 1):
+        try:
+            with timer.stage("generation_queue"):
+                await generation_limiter.acquire(client_id)
+            break
+        except AdmissionRejected as e:
+            if attempt == BATCH_ADMISSION_RETRIES:
+                observe_request(endpoint, timer, "rejected")
+                raise
+            await asyncio.sleep(e.retry_after)
+    try:
+        with timer.stage("generation"):
+            answer = await pipeline.agenerate(built["context"], question)
+    finally:
+        generation_limiter.release()
+    answer_cache.put(question, answer, built["sources"], query_vector)
+    record_tokens(endpoint, pipeline.prompt_text(built["context"], question), answer)
+    observe_request(endpoint, timer)
+    return answer, built["sources"]
+
+async def answer_questions(items, client_id: str, concurrency: int = BATCH_CONCURRENCY):
+    """
+    ตอบทั้ง Batch (ใช้ทั้ง /chat_batch และ batch_ask.py): คำถามที่อยู่ใน Answer Cache ส่งกลับก่อนเลย
+    ที่เหลือค้นรวมรอบเดียวแล้วทยอยส่งผลทีละคำถามตามที่ตอบเสร็จ
+    """
+    remaining = []
+    for item in items:
+        cached = answer_cache.get_exact(item["question"])
+        if cached is None:
+            remaining.append(item)
+            continue
+        observe_request("chat_batch", StageTimer(), "cache_hit")
+        yield {"id": item["id"], "question": item["question"], "answer": cached["answer"],
+               "sources": cached["sources"], "cached": True, "latency_ms": 0.0}
+    if not remaining:
+        return
+
+    async def generate(question, retrieved_docs, query_vector):
+        return await generate_answer("chat_batch", question, retrieved_docs, query_vector, client_id)
+
+    async def retrieve(questions):
+        return await retrieve_many(questions, client_id)
+
+    async for result in answer_batch(remaining, retrieve, generate, concurrency):
+        result["cached"] = False
+        yield result
+
+@app.post("/chat_batch", dependencies=[Depends(require_ready)])
+async def chat_batch_endpoint(http_request: Request, client_id: str = Depends(identify_client)):
+    """
+    ถามทีละหลายคำถาม: Body เป็น JSONL (หนึ่งบรรทัดต่อคำถาม {"id": ..., "question": ...})
+    ตอบกลับเป็น NDJSON ทีละบรรทัดทันทีที่แต่ละคำถามตอบเสร็จ (ลำดับอาจไม่ตรงกับที่ส่งมา ใช้ id จับคู่)
+    """
+    body = (await http_request.body()).decode("utf-8")
+    try:
+        items = parse_questions(body.splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="ไม่มีคำถาม")
+    if len(items) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"ส่งได้ไม่เกิน {BATCH_MAX_QUESTIONS} คำถามต่อครั้ง")
+
+    async def result_generator():
+        async for result in answer_questions(items, client_id):
+            yield encode_event(result, "ndjson")
+
+    return StreamingResponse(result_generator(), media_type=MEDIA_TYPES["ndjson"], headers=STREAM_HEADERS)
+
+@app.post("/sessions")
+async def create_session_endpoint():
+    """เริ่มบทสนทนาใหม่: ส่ง session_id ที่ได้มากับ /chat หรือ /chat_stream (ไม่ต้องส่ง history)"""
+    session_id = generate_session_id()
+    session_store.save(session_id, new_session())
+    return {"session_id": session_id}
+
+@app.get("/sessions/{session_id}")
+async def get_session_endpoint(session_id: str):
+    """ดูประวัติที่ Server จำไว้ (เฉพาะข้อความล่าสุดที่ใช้ Rewrite คำถาม)"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="ไม่พบ Session หรือหมดอายุแล้ว")
+    return {"session_id": session_id, "history": session["history"],
+            "last_sources": [f"มาตรา {doc.get('section_number')}" for doc in session["last_docs"] or []]}
+
+@app.delete("/sessions/{session_id}")
+async def delete_session_endpoint(session_id: str):
+    """จบบทสนทนา (ลบประวัติฝั่ง Server ทันที ไม่ต้องรอหมดอายุ)"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="ไม่พบ Session หรือหมดอายุแล้ว")
+    return {"deleted": session_id}
+
+@app.get("/health")
+async def health_endpoint():
+    """Liveness: Process ยังทำงานอยู่ (ตอบได้ทันทีแม้ Model ยังโหลดไม่เสร็จ)"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def ready_endpoint():
+    """Readiness: โหลด Model + Warm-up เสร็จแล้ว พร้อมรับ Traffic"""
+    if startup_state["ready"]:
+        return {"status": "ready", "startup_phases_ms": startup_state["phases"], "corpus_version": corpus_state["version"]}
+    status = "failed" if startup_state["error"] else "starting"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "error": startup_state["error"], "startup_phases_ms": startup_state["phases"]},
+        headers={"Retry-After": "5"},
+    )
+
+@app.get("/cache_stats", dependencies=[Depends(require_ready)])
+async def cache_stats_endpoint():
+    """ดูสถิติ Cache ของ Query Embedding และ Answer Cache (hit / miss)"""
+    stats = {
+        "query_embedding": embeddings.stats(),
+        "answer": answer_cache.stats(),
+        "tokenizer": thai_text.get_processor().stats(),
+        "sessions": {"active": len(session_store), "expired": session_store.expired},
+        "corpus": dict(corpus_state),
+    }
+    if reranker is not None:
+        stats["reranker"] = reranker.stats()
+    return stats
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Metrics รูปแบบ Prometheus (เวลาแต่ละ Stage / จำนวน Token / สถิติ Cache)"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # วิธีรัน: python -m uvicorn api:app --reload
\ No newline at end of file
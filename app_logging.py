@@ -0,0 +1,46 @@
+"""
+Logger กลางของ API แบบไม่บล็อก Event Loop
+Request แค่โยน Log ลงคิว (QueueHandler) แล้วมี Thread แยกเป็นคนเขียนออกจอ (QueueListener)
+ปรับระดับ Log ได้ด้วย LOG_LEVEL (DEBUG / INFO / WARNING / ERROR)
+"""
+import os
+import queue
+import logging
+import logging.handlers
+
+from dotenv import load_dotenv
+
+load_dotenv()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+_log_queue = queue.SimpleQueue()
+_console = logging.StreamHandler()
+_console.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(name)s] %(message)s"))
+_listener = logging.handlers.QueueListener(_log_queue, _console, respect_handler_level=True)
+
+_root = logging.getLogger("labour_law")
+_root.setLevel(LOG_LEVEL)
+_root.addHandler(logging.handlers.QueueHandler(_log_queue))
+_root.propagate = False
+_listener_running = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """ได้ Logger ลูกของ labour_law (เช่น labour_law.api)"""
+    return _root.getChild(name)
+
+
+def start_logging():
+    """เริ่ม Thread ที่เขียน Log (เรียกตอน Server เริ่ม)"""
+    global _listener_running
+    if not _listener_running:
+        _listener.start()
+        _listener_running = True
+
+
+def stop_logging():
+    """เขียน Log ที่ค้างในคิวให้หมดแล้วหยุด Thread (เรียกตอน Server ดับ)"""
+    global _listener_running
+    if _listener_running:
+        _listener.stop()
+        _listener_running = False
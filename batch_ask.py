@@ -0,0 +1,70 @@
+"""
+ถามทีละหลายคำถามแบบ Offline (ไม่ต้องเปิด Server) ใช้ Pipeline เดียวกับ /chat_batch
+
+    python batch_ask.py questions.jsonl -o answers.jsonl --concurrency 8
+
+questions.jsonl: หนึ่งบรรทัดต่อคำถาม {"id": "q1", "question": "ลาป่วยได้กี่วัน"}
+answers.jsonl: เขียนทีละบรรทัดทันทีที่ตอบเสร็จ (ลำดับตามที่ตอบเสร็จ ใช้ id จับคู่)
+"""
+import sys
+import time
+import json
+import asyncio
+import argparse
+
+import api
+from app_logging import start_logging, stop_logging
+from batch_qa import parse_questions, BATCH_CONCURRENCY
+from concurrency import shutdown_cpu_pool
+
+
+async def run(input_path: str, output_path: str, concurrency: int):
+    with open(input_path, encoding="utf-8") as f:
+        items = parse_questions(f)
+    print(f"📄 อ่านคำถาม {len(items)} ข้อจาก {input_path}")
+    if not items:
+        return
+
+    print("⏳ กำลังเตรียมระบบ... (โหลด Embedding Model / Index)")
+    await api.load_resources(0.0)
+    if not api.startup_state["ready"]:
+        raise SystemExit(f"❌ เตรียมระบบไม่สำเร็จ: {api.startup_state['error']}")
+
+    start = time.perf_counter()
+    done = errors = cached = 0
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            async for result in api.answer_questions(items, "batch-cli", concurrency):
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                done += 1
+                errors += "error" in result
+                cached += result.get("cached", False)
+                print(f"   ✅ [{done}/{len(items)}] {result['id']} ({result['latency_ms']:.0f} ms)"
+                      + (f" ❌ {result['error']}" if "error" in result else ""))
+    finally:
+        if api.http_client is not None:
+            await api.http_client.aclose()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 ตอบ {done} ข้อ (จาก Cache {cached}, Error {errors}) ใน {elapsed:.1f} วินาที "
+          f"({done / elapsed:.2f} ข้อ/วินาที) -> {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ตอบคำถามกฎหมายแรงงานทีละหลายข้อจากไฟล์ JSONL")
+    parser.add_argument("input", help="ไฟล์คำถาม (JSONL)")
+    parser.add_argument("-o", "--output", default="answers.jsonl", help="ไฟล์คำตอบ (JSONL)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="จำนวนคำถามที่ส่งไป LLM พร้อมกัน")
+    args = parser.parse_args()
+
+    start_logging()
+    try:
+        asyncio.run(run(args.input, args.output, args.concurrency))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        shutdown_cpu_pool()
+        stop_logging()
@@ -0,0 +1,76 @@
+"""
+ถาม-ตอบทีละหลายคำถาม (/chat_batch และ batch_ask.py)
+
+- รับคำถามเป็น JSONL: หนึ่งบรรทัดต่อหนึ่งคำถาม {"id": ..., "question": ...} หรือเป็น String เฉยๆ
+- ค้นหาทุกคำถามพร้อมกันรอบเดียว (Embed เป็น Batch เดียว + คูณ Matrix ครั้งเดียวหา Top-k ของทุกคำถาม)
+- ส่งไป LLM พร้อมกันไม่เกิน BATCH_CONCURRENCY คำถาม (ยังต้องผ่าน generation_limiter เหมือน Request ปกติ)
+- คืนผลทีละคำถามทันทีที่ตอบเสร็จ (ไม่ได้เรียงตามลำดับที่ส่งมา ใช้ id จับคู่)
+"""
+import os
+import json
+import time
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))        # คำถามที่ส่งไป LLM พร้อมกันต่อ 1 Batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))  # คำถามสูงสุดต่อ 1 Request
+
+
+def parse_questions(lines):
+    """แปลง JSONL เป็น [{"id", "question"}] (ไม่มี id ใช้เลขบรรทัดแทน) บรรทัดว่างข้ามไป"""
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"บรรทัด {line_number}: JSON ไม่ถูกต้อง ({e.msg})")
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict) or not str(record.get("question") or "").strip():
+            raise ValueError(f"บรรทัด {line_number}: ต้องมี question")
+        items.append({"id": record.get("id", line_number), "question": str(record["question"]).strip()})
+    return items
+
+
+async def answer_batch(items, retrieve_many, generate, concurrency: int = BATCH_CONCURRENCY):
+    """
+    retrieve_many(questions) -> [(retrieved_docs, query_vector) หรือ Exception ถ้าค้นข้อนั้นไม่สำเร็จ] ตามลำดับคำถาม
+    (ค้นรอบเดียวทั้ง Batch)
+    generate(question, retrieved_docs, query_vector) -> (answer, sources)
+    yield ผลของแต่ละคำถามตามลำดับที่ตอบเสร็จ (คำถามที่ Error จะมี "error" แทน answer)
+    """
+    started = time.perf_counter()
+    try:
+        retrieved = await retrieve_many([item["question"] for item in items])
+    except Exception as e:
+        # ค้นทั้ง Batch ไม่สำเร็จ (เช่น Embedding ล้ม) -> ทุกคำถามได้ Error ของตัวเอง ไม่ตัดผลลัพธ์กลางทาง
+        retrieved = [e] * len(items)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer_one(item, found):
+        async with semaphore:
+            result = {"id": item["id"], "question": item["question"]}
+            if isinstance(found, Exception):
+                result["error"] = str(found)
+            else:
+                try:
+                    result["answer"], result["sources"] = await generate(item["question"], *found)
+                except Exception as e:
+                    result["error"] = str(e)
+            # เวลาตั้งแต่เริ่ม Batch จนคำถามนี้ตอบเสร็จ (รวมค้นหา + รอคิว)
+            result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            return result
+
+    tasks = [asyncio.create_task(answer_one(item, found)) for item, found in zip(items, retrieved)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Client ปิดการเชื่อมต่อกลางทาง -> ไม่ต้องตอบคำถามที่เหลือ
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1 @@
+# Benchmarks ของระบบ (รันแยกจาก Server: python -m benchmarks.<ชื่อไฟล์>)
@@ -0,0 +1,85 @@
+"""
+Benchmark: ชั้น Semantic ของ Answer Cache ตั้ง ANSWER_CACHE_MAX_DISTANCE เท่าไหร่ถึงไม่ส่งคำตอบผิดข้อ
+
+- ทุกคำถามใน benchmarks/questions_th.json ถือว่าคำตอบต่างกัน ห้ามใช้คำตอบร่วมกัน (ห้ามชน)
+  รวมคู่ที่เกือบเหมือนกันแต่คำตอบต่างกันทางกฎหมาย (ลาป่วย / ลากิจ / ลาพักร้อน, อายุงาน 1 / 5 / 20 ปี)
+  ยกเว้นคู่ที่มี paraphrase_of ชี้หากัน (ถามเรื่องเดียวกันคนละแบบ ใช้คำตอบร่วมกันได้)
+- รายงาน Cosine Distance ของคู่ที่ห้ามชนที่ใกล้กันที่สุด (ค่าที่ตั้งได้ต้องต่ำกว่าค่านี้)
+  และจำนวนคู่ที่ชน / คู่ Paraphrase ที่ Hit ของแต่ละ --max-distance
+
+วิธีรัน (ใช้ Embedding Model เดียวกับ Server):
+    python -m benchmarks.bench_answer_cache --max-distance 0.02 0.05 0.1
+"""
+import os
+import sys
+import argparse
+import itertools
+
+import numpy as np
+
+from benchmarks.bench_retrieval import load_questions, embed_questions, QUESTIONS_FILE, RESULTS_DIR
+
+
+def may_share_answer(a: dict, b: dict) -> bool:
+    """คู่ Paraphrase (ชี้หากันด้วย paraphrase_of หรือชี้ไปคำถามเดียวกัน) ใช้คำตอบร่วมกันได้"""
+    root_a = a.get("paraphrase_of") or a["question"]
+    root_b = b.get("paraphrase_of") or b["question"]
+    return root_a == root_b
+
+
+def pair_distances(questions, vectors):
+    """คืน [(distance, a, b, ใช้คำตอบร่วมกันได้ไหม)] ของทุกคู่ เรียงจากใกล้สุด"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    similarities = matrix @ matrix.T
+    pairs = [
+        (1.0 - float(similarities[i, j]), questions[i], questions[j], may_share_answer(questions[i], questions[j]))
+        for i, j in itertools.combinations(range(len(questions)), 2)
+    ]
+    return sorted(pairs, key=lambda pair: pair[0])
+
+
+def summarize(pairs, max_distance: float) -> dict:
+    """ผลของ max_distance หนึ่งค่า: collisions = คู่ที่ห้ามชนแต่ชน, paraphrase_hits = คู่ Paraphrase ที่ได้ใช้ Cache"""
+    collisions = [pair for pair in pairs if not pair[3] and pair[0] <= max_distance]
+    paraphrases = [pair for pair in pairs if pair[3]]
+    return {
+        "max_distance": max_distance,
+        "collisions": collisions,
+        "paraphrase_hits": sum(1 for pair in paraphrases if pair[0] <= max_distance),
+        "paraphrases": len(paraphrases),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer cache semantic threshold benchmark")
+    parser.add_argument("--max-distance", nargs="+", type=float, default=[0.02, 0.05, 0.1])
+    parser.add_argument("--questions", default=QUESTIONS_FILE)
+    parser.add_argument("--vector-cache", default=os.path.join(RESULTS_DIR, "question_vectors.json"),
+                        help="ไฟล์เก็บ Vector ของคำถาม (ใช้ร่วมกับ bench_retrieval)")
+    parser.add_argument("--closest", type=int, default=10, help="แสดงคู่ที่ห้ามชนที่ใกล้กันที่สุดกี่คู่")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    questions = load_questions(args.questions)
+    vectors, _ = embed_questions(questions, args.vector_cache)
+    pairs = pair_distances(questions, vectors)
+
+    distinct = [pair for pair in pairs if not pair[3]]
+    print(f"\n📏 คู่ที่ห้ามชนที่ใกล้กันที่สุด ({len(distinct)} คู่จาก {len(questions)} คำถาม)")
+    for distance, a, b, _ in distinct[:args.closest]:
+        print(f"  {distance:.4f}  {a['question']}  <->  {b['question']}")
+    print(f"👉 ANSWER_CACHE_MAX_DISTANCE ต้องต่ำกว่า {distinct[0][0]:.4f} (0 = ปิดชั้น Semantic)")
+
+    unsafe = False
+    print(f"\n{'max_distance':>12} {'ชน':>6} {'Paraphrase Hit':>16}")
+    for max_distance in args.max_distance:
+        result = summarize(pairs, max_distance)
+        unsafe = unsafe or bool(result["collisions"])
+        print(f"{max_distance:>12.3f} {len(result['collisions']):>6} "
+              f"{result['paraphrase_hits']:>9}/{result['paraphrases']}")
+    sys.exit(1 if unsafe else 0)
+
+
+if __name__ == "__main__":
+    main()
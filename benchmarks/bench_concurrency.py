@@ -0,0 +1,84 @@
+"""
+Benchmark: เทียบ Throughput ระหว่างแบบเดิม (เรียก Sync ใน async def = บล็อก Event Loop)
+กับแบบใหม่ (Embedding ไป Worker Pool + Supabase/LLM แบบ await)
+
+ใช้ Backend จำลอง (Stub) ทั้งหมด ไม่ต้องมี Model / Supabase / Typhoon จริง
+วิธีรัน: python -m benchmarks.bench_concurrency
+"""
+import argparse
+import asyncio
+import time
+
+from concurrency import run_cpu_bound, CPU_WORKERS
+
+# เวลาจำลองของแต่ละขั้น (วินาที)
+EMBED_SEC = 0.02     # BGE-M3 forward pass (torch ปล่อย GIL -> จำลองด้วย time.sleep)
+RPC_SEC = 0.03       # Supabase match_sections_v2
+LLM_SEC = 0.20       # Typhoon generation
+
+
+# --- Stub Backends ---
+
+def stub_embed_query(text):
+    time.sleep(EMBED_SEC)
+    return [0.0] * 1024
+
+def stub_rpc_blocking(vector):
+    time.sleep(RPC_SEC)
+    return [{"section_number": "118", "text_original": "..."}]
+
+async def stub_rpc_async(vector):
+    await asyncio.sleep(RPC_SEC)
+    return [{"section_number": "118", "text_original": "..."}]
+
+def stub_llm_invoke(prompt):
+    time.sleep(LLM_SEC)
+    return "คำตอบ"
+
+async def stub_llm_ainvoke(prompt):
+    await asyncio.sleep(LLM_SEC)
+    return "คำตอบ"
+
+
+# --- Handler สองแบบ (โครงเดียวกับ chat_endpoint) ---
+
+async def blocking_handler(question):
+    vector = stub_embed_query(question)
+    docs = stub_rpc_blocking(vector)
+    return stub_llm_invoke(docs)
+
+async def async_handler(question):
+    vector = await run_cpu_bound(stub_embed_query, question)
+    docs = await stub_rpc_async(vector)
+    return await stub_llm_ainvoke(docs)
+
+
+async def run_load(handler, total, inflight):
+    """ยิง total requests โดยให้มีงานค้างพร้อมกันไม่เกิน inflight"""
+    sem = asyncio.Semaphore(inflight)
+
+    async def one(i):
+        async with sem:
+            await handler(f"คำถามที่ {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main(total, levels):
+    print(f"CPU_WORKERS={CPU_WORKERS}  requests/level={total}")
+    print(f"{'in-flight':>10} | {'blocking req/s':>15} | {'async req/s':>12}")
+    print("-" * 45)
+    for inflight in levels:
+        blocking_rps = await run_load(blocking_handler, total, inflight)
+        async_rps = await run_load(async_handler, total, inflight)
+        print(f"{inflight:>10} | {blocking_rps:>15.1f} | {async_rps:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency benchmark (stub backends)")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.levels))
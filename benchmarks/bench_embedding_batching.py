@@ -0,0 +1,74 @@
+"""
+Benchmark: Embedding แบบทีละคำถาม (Batch Size 1) เทียบกับ Micro-batching บน CPU
+ใช้ Model จริง (ค่าเริ่มต้น BAAI/bge-m3 หรือเลือกเองด้วย --model)
+
+วิธีรัน: python -m benchmarks.bench_embedding_batching --queries 64 --concurrency 16
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedding_service import MicroBatchingEmbeddings, load_model, EMBEDDING_MODEL
+
+# คำถามตัวอย่างเรื่องที่คนถามบ่อย (ลา / ค่าชดเชย / OT)
+SAMPLE_QUESTIONS = [
+    "ลากิจได้กี่วันต่อปี",
+    "ลาป่วยได้กี่วันโดยได้รับค่าจ้าง",
+    "ถูกเลิกจ้างได้ค่าชดเชยเท่าไหร่",
+    "ทำงานล่วงเวลาในวันหยุดได้ค่าจ้างกี่เท่า",
+    "นายจ้างต้องบอกกล่าวล่วงหน้าก่อนเลิกจ้างกี่วัน",
+    "ลาคลอดได้กี่วัน",
+    "วันหยุดพักผ่อนประจำปีมีกี่วัน",
+    "นายจ้างหักค่าจ้างได้ในกรณีใดบ้าง",
+]
+
+
+def make_queries(n):
+    # ใส่เลขต่อท้ายกันไม่ให้ Batch ตัดคำถามซ้ำทิ้ง (อยากวัด Model จริงๆ)
+    return [f"{SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]} ({i})" for i in range(n)]
+
+
+def run_unbatched(model, queries):
+    start = time.perf_counter()
+    for query in queries:
+        model.embed_query(query)
+    return len(queries) / (time.perf_counter() - start)
+
+
+def run_batched(batcher, queries, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(batcher.embed_query, queries))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding micro-batching benchmark (CPU)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16, help="จำนวน Request ที่เข้ามาพร้อมกัน")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"⏳ กำลังโหลด Model ({args.model})...")
+    model = load_model(args.model)
+    queries = make_queries(args.queries)
+    model.embed_documents(queries[:4])  # Warm-up ไม่นับเวลา
+
+    unbatched_qps = run_unbatched(model, queries)
+    batcher = MicroBatchingEmbeddings(model, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+    batched_qps = run_batched(batcher, queries, args.concurrency)
+
+    stats = batcher.stats()
+    print(f"\nqueries={args.queries} concurrency={args.concurrency} "
+          f"max_batch={args.max_batch} max_wait={args.max_wait_ms}ms")
+    print(f"{'mode':>12} | {'queries/sec':>11}")
+    print("-" * 28)
+    print(f"{'unbatched':>12} | {unbatched_qps:>11.1f}")
+    print(f"{'batched':>12} | {batched_qps:>11.1f}")
+    print(f"\nเร็วขึ้น {batched_qps / unbatched_qps:.2f} เท่า (Batch เฉลี่ย {stats['avg_batch_size']:.1f} คำถาม)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Load Test: เปิด Connection ใหม่ทุก Request เทียบกับ Connection Pool กลาง (http_clients.create_async_client)
+ยิงไปที่ Stub Server ในเครื่อง 2 ตัว (จำลอง Supabase RPC และ Typhoon Chat Completions)
+
+- --tls          : เปิด HTTPS ด้วย Certificate ชั่วคราว (เห็นผลของ TLS Handshake ชัดขึ้น)
+- --error-rate   : ให้ Stub ตอบ 503 แบบสุ่ม เพื่อดูผลของ Retry + Backoff
+
+วิธีรัน: python -m benchmarks.bench_http_pooling --requests 1000 --rate 100 --tls
+"""
+import os
+import ssl
+import time
+import random
+import ipaddress
+import asyncio
+import argparse
+import socket
+import tempfile
+import datetime
+import multiprocessing
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Response
+
+from http_clients import create_async_client
+
+
+def create_stub_app(latency_ms: float, error_rate: float):
+    app = FastAPI()
+
+    @app.post("/rest/v1/rpc/match_sections_v2")
+    async def rpc():
+        await asyncio.sleep(latency_ms / 1000)
+        if random.random() < error_rate:
+            return Response(status_code=503)
+        return [{"id": 1, "section_number": "118", "text_original": "...", "similarity": 0.8}]
+
+    @app.post("/v1/chat/completions")
+    async def chat():
+        await asyncio.sleep(latency_ms / 1000)
+        if random.random() < error_rate:
+            return Response(status_code=503)
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": "ตอบ"}}]}
+
+    return app
+
+
+def write_self_signed_cert(directory: str):
+    """สร้าง Certificate ชั่วคราวสำหรับ 127.0.0.1 (ใช้ cryptography ที่ติดมากับ supabase อยู่แล้ว)"""
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder() \
+        .subject_name(name).issuer_name(name) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False) \
+        .sign(key, hashes.SHA256())
+
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def _serve(port: int, latency_ms: float, error_rate: float, cert):
+    uvicorn.run(
+        create_stub_app(latency_ms, error_rate),
+        host="127.0.0.1", port=port, log_level="error",
+        ssl_certfile=cert[0] if cert else None, ssl_keyfile=cert[1] if cert else None,
+    )
+
+
+def start_stub_server(port: int, args, cert=None):
+    """รัน Stub แยก Process (ไม่แย่ง GIL / Event Loop กับฝั่ง Client ที่กำลังวัด)"""
+    process = multiprocessing.Process(
+        target=_serve, args=(port, args.latency_ms, args.error_rate, cert), daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Stub Server ที่ port {port} ไม่ขึ้น")
+
+
+def make_requests(n, supabase_url, typhoon_url):
+    """สลับ RPC กับ Chat Completions เหมือน Request จริงของ /chat"""
+    requests = []
+    for i in range(n):
+        if i % 2 == 0:
+            requests.append((f"{supabase_url}/rest/v1/rpc/match_sections_v2", {"match_count": 5}))
+        else:
+            requests.append((f"{typhoon_url}/v1/chat/completions", {"messages": [{"role": "user", "content": "x"}]}))
+    return requests
+
+
+async def run_mode(mode, requests, concurrency, rate, verify):
+    """ยิงแบบ Open-loop ที่ rate คงที่ (ทั้ง 2 โหมดเจอโหลดเท่ากัน) และมี Request ค้างพร้อมกันไม่เกิน concurrency"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    shared = create_async_client(verify=verify) if mode == "pooled" else None
+
+    async def one(i, url, payload):
+        nonlocal errors
+        await asyncio.sleep(i / rate)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if shared is not None:
+                    response = await shared.post(url, json=payload)
+                else:
+                    # แบบที่ไม่มี Pool: เปิด Connection (+ TLS Handshake) ใหม่ทุกครั้ง ไม่มี Retry
+                    async with httpx.AsyncClient(verify=verify) as client:
+                        response = await client.post(url, json=payload)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, url, payload) for i, (url, payload) in enumerate(requests)))
+    elapsed = time.perf_counter() - start
+    retried = shared._transport.retried if shared is not None else 0
+    if shared is not None:
+        await shared.aclose()
+    return latencies, errors, retried, len(requests) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP connection pooling load test (local stub servers)")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Request ค้างพร้อมกันสูงสุด")
+    parser.add_argument("--rate", type=float, default=100.0, help="Request ต่อวินาทีที่ยิงเข้าไป")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="เวลาตอบของ Stub Server")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="สัดส่วนที่ Stub ตอบ 503 (0-1)")
+    parser.add_argument("--tls", action="store_true", help="ใช้ HTTPS (Certificate ชั่วคราว)")
+    parser.add_argument("--port", type=int, default=18001)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert = write_self_signed_cert(tmp) if args.tls else None
+        servers = [start_stub_server(args.port, args, cert), start_stub_server(args.port + 1, args, cert)]
+        scheme = "https" if args.tls else "http"
+        requests = make_requests(
+            args.requests, f"{scheme}://127.0.0.1:{args.port}", f"{scheme}://127.0.0.1:{args.port + 1}")
+        # Certificate ทำเอง -> ตรวจด้วยไฟล์นั้นแทน CA ของระบบ
+        verify = ssl.create_default_context(cafile=cert[0]) if cert else True
+
+        print(f"requests={args.requests} rate={args.rate}/s concurrency={args.concurrency} latency={args.latency_ms}ms "
+              f"error_rate={args.error_rate} tls={args.tls}")
+        print(f"{'mode':>12} | {'p50 ms':>7} | {'p95 ms':>7} | {'p99 ms':>7} | {'errors':>6} | {'retries':>7} | {'req/sec':>8}")
+        print("-" * 72)
+        for mode in ("per-request", "pooled"):
+            latencies, errors, retried, qps = asyncio.run(run_mode(mode, requests, args.concurrency, args.rate, verify))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"{mode:>12} | {p50:>7.1f} | {p95:>7.1f} | {p99:>7.1f} | {errors:>6} | {retried:>7} | {qps:>8.1f}")
+
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
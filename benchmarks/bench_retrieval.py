@@ -0,0 +1,356 @@
+"""
+Benchmark คุณภาพการค้น + เวลาแบบ End-to-end (ไม่ต้องต่อ Supabase / Typhoon)
+
+- ใช้ชุดคำถามภาษาไทยพร้อมเลขมาตราที่ถูกต้อง (benchmarks/questions_th.json)
+- ค้นบน Snapshot ในเครื่อง (Local Index / Chunk Index) + BM25 แล้วส่งต่อให้ LLM ปลอม (หน่วงเวลาตาม --llm-latency-ms)
+- รายงานต่อ Backend x match_threshold: recall@k, MRR, เวลาแต่ละขั้น (p50 / p95 / p99) และ Query ต่อวินาที
+- เขียนผลเป็น JSON (ค่าเริ่มต้น benchmarks/results/<commit>.json) เอาไว้เทียบระหว่าง Commit ด้วย --compare
+
+Backend:
+- local   : Dense บน Local Index (เหมือน RETRIEVAL_BACKEND=local)
+- chunks  : Dense บน Chunk Index (เหมือน RETRIEVAL_BACKEND=chunks)
+- bm25    : Lexical อย่างเดียว (+ ค้นเลขมาตราตรงๆ)
+- hybrid  : Local Index + BM25 รวมด้วย RRF (เหมือน HYBRID_SEARCH=true)
+- --rerank: รันทุก Backend ซ้ำอีกรอบแบบดึงผู้สมัคร RERANK_POOL มาตราแล้วคัดด้วย Cross-encoder (ชื่อ <backend>+rerank)
+            รายงานเพิ่มว่า Rerank ดันมาตราจากนอก Top-k เดิมขึ้นมากี่มาตรา / อันดับ 1 เปลี่ยนกี่ข้อ
+
+วิธีรัน (ต้องมี Snapshot ก่อน: python local_index.py refresh / python ingest.py --chunks):
+    python -m benchmarks.bench_retrieval --backends local hybrid bm25 --thresholds 0.4 0.5
+    python -m benchmarks.bench_retrieval --backends hybrid --thresholds 0.3 --rerank
+    python -m benchmarks.bench_retrieval --compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+from langchain_core.output_parsers import StrOutputParser
+
+import thai_text
+from timing import StageTimer
+from context_builder import build_context
+from local_index import LocalVectorIndex, LOCAL_INDEX_DIR
+from chunk_index import ChunkIndex, CHUNK_INDEX_DIR
+from lexical_search import BM25Index, clean_tokens, tokenize_documents, reciprocal_rank_fusion
+from reranker import RERANK_POOL
+from rag_pipeline import ANSWER_PROMPT
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_FILE = os.path.join(BENCH_DIR, "questions_th.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BACKENDS = ("local", "chunks", "bm25", "hybrid")
+DENSE_BACKENDS = ("local", "chunks", "hybrid")
+STAGES = ("preprocess", "embed", "retrieval", "rerank", "context", "generation", "total")
+
+STUB_ANSWER = "ตามข้อมูลกฎหมายที่ให้มา ..."
+
+
+def load_questions(path=QUESTIONS_FILE):
+    with open(path, encoding="utf-8") as f:
+        questions = json.load(f)
+    for item in questions:
+        item["gold"] = [str(number) for number in item["gold"]]
+    return questions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def create_stub_chain(latency_ms: float):
+    """LLM ปลอม: รอตามเวลาที่กำหนดแล้วตอบข้อความเดิม (วัด Pipeline โดยไม่เสียเงิน / ไม่ขึ้นกับเน็ต)"""
+    def generate(prompt_value):
+        time.sleep(latency_ms / 1000)
+        return STUB_ANSWER
+    return ANSWER_PROMPT | RunnableLambda(generate) | StrOutputParser()
+
+
+def embed_questions(questions, vector_cache_path=None):
+    """Embed คำถามทุกข้อครั้งเดียวใช้ร่วมทุก Backend คืน (vectors, เวลาต่อคำถาม ms หรือ None ถ้ามาจากไฟล์)"""
+    cached = {}
+    if vector_cache_path and os.path.exists(vector_cache_path):
+        with open(vector_cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+
+    missing = [item["question"] for item in questions if item["question"] not in cached]
+    latencies = {}
+    if missing:
+        from embedding_service import get_embeddings
+
+        print(f"⏳ กำลังโหลด Embedding Model เพื่อ Embed {len(missing)} คำถาม...")
+        model = get_embeddings()
+        model.embed_query(missing[0])  # Warm-up ไม่นับเวลา
+        for question in missing:
+            start = time.perf_counter()
+            cached[question] = model.embed_query(question)
+            latencies[question] = (time.perf_counter() - start) * 1000
+        if vector_cache_path:
+            with open(vector_cache_path, "w", encoding="utf-8") as f:
+                json.dump(cached, f)
+
+    vectors = [cached[item["question"]] for item in questions]
+    return vectors, [latencies.get(item["question"]) for item in questions]
+
+
+class Retriever:
+    """ค้นแบบเดียวกับ api.retrieve_data แต่ใช้ Snapshot ในเครื่องทั้งหมด"""
+
+    def __init__(self, backend, dense_index, lexical_index, match_threshold, match_count, reranker=None):
+        self.backend = backend
+        self.dense_index = dense_index
+        self.lexical_index = lexical_index
+        self.match_threshold = match_threshold
+        self.match_count = match_count
+        self.reranker = reranker
+        self.name = f"{backend}+rerank" if reranker is not None else backend
+
+    def search(self, question, query_tokens, query_vector):
+        """คืน (docs, ค้นเจอจากเลขมาตราตรงๆ ไหม) ถ้ามี Reranker จะได้ผู้สมัคร RERANK_POOL มาตรา"""
+        if self.lexical_index is not None:
+            direct_hits = self.lexical_index.lookup_sections(question)
+            if direct_hits:
+                return direct_hits[:self.match_count], True
+        count = max(RERANK_POOL, self.match_count) if self.reranker is not None else self.match_count
+        if self.backend == "bm25":
+            return self.lexical_index.search(query_tokens, match_count=count), False
+        if self.lexical_index is None:
+            return self.dense_index.search(query_vector, self.match_threshold, count), False
+        dense_docs = self.dense_index.search(query_vector, self.match_threshold, max(count, self.match_count * 2))
+        lexical_docs = self.lexical_index.search(query_tokens, match_count=max(count, self.match_count * 2))
+        return reciprocal_rank_fusion([dense_docs, lexical_docs], match_count=count), False
+
+
+def score_ranking(found, gold, ks):
+    """recall@k ของแต่ละ k และ Reciprocal Rank (0 ถ้าไม่เจอมาตราที่ถูกเลย)"""
+    gold = set(gold)
+    recalls = {k: len(gold.intersection(found[:k])) / len(gold) for k in ks}
+    reciprocal_rank = 0.0
+    for rank, number in enumerate(found, start=1):
+        if number in gold:
+            reciprocal_rank = 1.0 / rank
+            break
+    return recalls, reciprocal_rank
+
+
+def run_backend(retriever, questions, vectors, embed_ms, chain, ks):
+    processor = thai_text.get_processor()
+    stage_samples = {name: [] for name in STAGES}
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    context_tokens = []
+    per_question = []
+    displaced = []
+    top1_changed = 0
+
+    for item, vector, embed_latency in zip(questions, vectors, embed_ms):
+        timer = StageTimer()
+        question = item["question"]
+        with timer.stage("preprocess"):
+            # ไม่ใช้ Cache ของผลตัดคำ (วัดเวลาตัดคำจริงทุกข้อ)
+            query_tokens = clean_tokens(processor.tokenize(question, use_cache=False))
+        if retriever.backend in DENSE_BACKENDS and embed_latency is not None:
+            timer.record("embed", embed_latency)
+        with timer.stage("retrieval"):
+            docs, direct = retriever.search(question, query_tokens, vector)
+        if retriever.reranker is not None and not direct:
+            with timer.stage("rerank"):
+                docs, report = retriever.reranker.rerank(question, docs, retriever.match_count)
+            displaced.append(report["displaced"])
+            top1_changed += report["top1_changed"]
+        with timer.stage("context"):
+            built = build_context(question, docs)
+        with timer.stage("generation"):
+            chain.invoke({"context": built["context"], "question": question})
+        timer.record("total", sum(timer.stages.values()))
+
+        found = [str(doc.get("section_number")) for doc in docs]
+        question_recalls, reciprocal_rank = score_ranking(found, item["gold"], ks)
+        for k in ks:
+            recalls[k].append(question_recalls[k])
+        reciprocal_ranks.append(reciprocal_rank)
+        context_tokens.append(built["tokens"])
+        for name in STAGES:
+            if name in timer.stages:
+                stage_samples[name].append(timer.stages[name])
+        per_question.append({"question": question, "gold": item["gold"], "found": found,
+                             "reciprocal_rank": reciprocal_rank})
+
+    total_seconds = sum(stage_samples["total"]) / 1000
+    rerank = None
+    if retriever.reranker is not None:
+        rerank = {"model": retriever.reranker.model_name, "pool": RERANK_POOL,
+                  "displaced_mean": float(np.mean(displaced)) if displaced else 0.0,
+                  "top1_changed": top1_changed}
+    return {
+        "backend": retriever.name,
+        "match_threshold": retriever.match_threshold if retriever.backend in DENSE_BACKENDS else None,
+        "match_count": retriever.match_count,
+        "recall": {f"@{k}": float(np.mean(recalls[k])) for k in ks},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "no_result": sum(1 for row in per_question if not row["found"]),
+        "qps": len(questions) / total_seconds if total_seconds else None,
+        "context_tokens_mean": float(np.mean(context_tokens)),
+        "stages_ms": {
+            name: dict(zip(("p50", "p95", "p99"), (float(v) for v in np.percentile(samples, [50, 95, 99]))))
+            for name, samples in stage_samples.items() if samples
+        },
+        "rerank": rerank,
+        "questions": per_question,
+    }
+
+
+def load_indexes(backends, args):
+    """โหลดเฉพาะ Snapshot ที่ Backend ที่เลือกต้องใช้ (ไม่มี Snapshot -> ข้าม Backend นั้น)"""
+    indexes = {}
+    if {"local", "bm25", "hybrid"} & set(backends):
+        try:
+            indexes["local"] = LocalVectorIndex(args.index_dir)
+        except FileNotFoundError:
+            print(f"⚠️ ไม่พบ Local Index ที่ '{args.index_dir}' (python local_index.py refresh)")
+    if "chunks" in backends:
+        try:
+            indexes["chunks"] = ChunkIndex(args.chunk_dir)
+        except FileNotFoundError:
+            print(f"⚠️ ไม่พบ Chunk Index ที่ '{args.chunk_dir}' (python ingest.py --chunks)")
+
+    local = indexes.get("local")
+    if local is not None:
+        # Dictionary ของตัวตัดคำต้องมาจาก Snapshot เดียวกับตอน Server เริ่มทำงาน
+        processor = thai_text.load_corpus_vocabulary(local.texts)
+        rows = [{"id": i, "section_number": s, "text_original": t}
+                for i, s, t in zip(local.ids, local.section_numbers, local.texts)]
+        tokenized = local.lexical_tokens if local.dictionary_version == processor.version else None
+        indexes["bm25"] = BM25Index(rows, tokenized or tokenize_documents(local.texts))
+    return indexes
+
+
+def print_table(report):
+    ks = list(report["results"][0]["recall"]) if report["results"] else []
+    header = f"{'backend':>13} | {'thr':>4} | " + " | ".join(f"{'R' + k:>6}" for k in ks) + \
+             f" | {'MRR':>5} | {'retr p50':>8} | {'retr p95':>8} | {'e2e p95':>8} | {'QPS':>7}"
+    print(header)
+    print("-" * len(header))
+    for result in report["results"]:
+        stages = result["stages_ms"]
+        threshold = f"{result['match_threshold']:.2f}" if result["match_threshold"] is not None else "-"
+        qps = f"{result['qps']:.1f}" if result["qps"] else "-"
+        print(f"{result['backend']:>13} | {threshold:>4} | " +
+              " | ".join(f"{result['recall'][k]:>6.1%}" for k in ks) +
+              f" | {result['mrr']:>5.3f} | {stages['retrieval']['p50']:>8.2f} | {stages['retrieval']['p95']:>8.2f}"
+              f" | {stages['total']['p95']:>8.1f} | {qps:>7}")
+
+
+def compare(old_path, new_path):
+    """เทียบผล 2 ไฟล์ (เช่น ก่อน / หลังแก้โค้ด) แสดงเฉพาะตัวเลขที่เปลี่ยน"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    key = lambda result: (result["backend"], result["match_threshold"])
+    old_results = {key(result): result for result in old["results"]}
+
+    print(f"{old['commit']} -> {new['commit']}")
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None:
+            print(f"  {result['backend']} (thr={result['match_threshold']}): ไม่มีในผลเดิม")
+            continue
+        changes = [f"{name} {before['recall'][name]:.1%} -> {value:.1%}"
+                   for name, value in result["recall"].items()
+                   if name in before["recall"] and abs(value - before["recall"][name]) > 1e-9]
+        if abs(result["mrr"] - before["mrr"]) > 1e-9:
+            changes.append(f"MRR {before['mrr']:.3f} -> {result['mrr']:.3f}")
+        old_p95 = before["stages_ms"]["total"]["p95"]
+        new_p95 = result["stages_ms"]["total"]["p95"]
+        changes.append(f"e2e p95 {old_p95:.1f} -> {new_p95:.1f} ms ({(new_p95 - old_p95) / max(old_p95, 1e-9):+.0%})")
+        print(f"  {result['backend']} (thr={result['match_threshold']}): " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality + end-to-end latency benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.5], help="match_threshold ที่จะลอง")
+    parser.add_argument("--match-count", type=int, default=5)
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 5], help="k ของ recall@k")
+    parser.add_argument("--questions", default=QUESTIONS_FILE)
+    parser.add_argument("--index-dir", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--chunk-dir", default=CHUNK_INDEX_DIR)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="เวลาตอบของ LLM ปลอม")
+    parser.add_argument("--vector-cache", default=os.path.join(RESULTS_DIR, "question_vectors.json"),
+                        help="เก็บ Vector ของคำถามไว้ใช้ซ้ำ (ว่าง = Embed ใหม่ทุกครั้ง)")
+    parser.add_argument("--output", default=None, help="ไฟล์ผล JSON (ค่าเริ่มต้น benchmarks/results/<commit>.json)")
+    parser.add_argument("--rerank", action="store_true", help="รันซ้ำแบบ Rerank ด้วย Cross-encoder (RERANK_MODEL)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="เทียบผล 2 ไฟล์แล้วจบ")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    questions = load_questions(args.questions)
+    indexes = load_indexes(args.backends, args)
+    backends = [backend for backend in args.backends
+                if (backend if backend != "hybrid" else "local") in indexes]
+    if not backends:
+        print("❌ ไม่มี Snapshot ให้ทดสอบเลย")
+        sys.exit(1)
+
+    needs_vectors = any(backend in DENSE_BACKENDS for backend in backends)
+    if needs_vectors:
+        vectors, embed_ms = embed_questions(questions, args.vector_cache or None)
+    else:
+        vectors, embed_ms = [None] * len(questions), [None] * len(questions)
+    chain = create_stub_chain(args.llm_latency_ms)
+    rerankers = [None]
+    if args.rerank:
+        from reranker import load_reranker
+        print("⏳ โหลด Reranker...")
+        rerankers.append(load_reranker())
+
+    results = []
+    for backend in backends:
+        thresholds = args.thresholds if backend in DENSE_BACKENDS else [None]
+        for threshold in thresholds:
+            dense_index = indexes.get("local" if backend == "hybrid" else backend) if backend != "bm25" else None
+            lexical_index = indexes.get("bm25") if backend in ("bm25", "hybrid") else None
+            for reranker in rerankers:
+                retriever = Retriever(backend, dense_index, lexical_index, threshold, args.match_count, reranker)
+                results.append(run_backend(retriever, questions, vectors, embed_ms, chain, args.k))
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "questions": len(questions),
+        "config": {
+            "match_count": args.match_count,
+            "k": args.k,
+            "llm_latency_ms": args.llm_latency_ms,
+            "embedding_timed": needs_vectors and any(ms is not None for ms in embed_ms),
+            "dictionary_version": thai_text.get_processor().version,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\ncommit={report['commit']} questions={len(questions)} match_count={args.match_count}")
+    print_table(report)
+    for result in results:
+        if result["rerank"] is not None:
+            print(f"🏅 {result['backend']}: ดันมาตราจากนอก Top-{args.match_count} เดิมขึ้นมาเฉลี่ย "
+                  f"{result['rerank']['displaced_mean']:.2f} มาตรา/ข้อ, อันดับ 1 เปลี่ยน {result['rerank']['top1_changed']} ข้อ")
+    print(f"\n💾 บันทึกผลที่ {output}")
+
+
+if __name__ == "__main__":
+    main()
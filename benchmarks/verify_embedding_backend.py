@@ -0,0 +1,135 @@
+"""
+ตรวจว่า Embedding Backend แบบเร็ว (int8 / onnx) ใช้แทน fp32 ได้โดยไม่เสียคุณภาพการค้น
+เทียบบน Vector ของมาตราที่เก็บไว้แล้ว (Local Index Snapshot) โดยไม่ต้อง Embed มาตราใหม่
+
+วัด 3 อย่างต่อ Backend:
+- recall@k  : Top-k ที่ได้ ตรงกับ Top-k ของ fp32 กี่ % (ใช้คำถามชุดเดียวกัน)
+- self@1    : เอาข้อความของมาตรามา Embed แล้วค้นเจอมาตราตัวเองเป็นอันดับ 1 กี่ % (เช็คว่าเข้ากับ Vector ที่เก็บไว้)
+- latency / RSS : เวลา embed_query ต่อคำถาม และ RAM สูงสุดของ Process (แต่ละ Backend รันแยก Process)
+
+วิธีรัน (ต้องมี Snapshot ก่อน: python local_index.py refresh):
+    python -m benchmarks.verify_embedding_backend --backends fp32 int8 onnx --k 5
+"""
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+
+from local_index import LocalVectorIndex, LOCAL_INDEX_DIR
+from embedding_service import EMBEDDING_MODEL
+from benchmarks.bench_embedding_batching import SAMPLE_QUESTIONS
+
+SNIPPET_CHARS = 200  # ใช้ข้อความต้นมาตรากี่ตัวอักษรเป็นคำถามทดสอบ
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows ไม่มีโมดูล resource
+        return None
+    # Linux รายงานเป็น KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sample_sections(index, n):
+    """เลือกมาตรากระจายทั่วทั้ง Index (ผลซ้ำได้ทุกครั้ง)"""
+    if n >= len(index):
+        return list(range(len(index)))
+    return [int(i) for i in np.linspace(0, len(index) - 1, n)]
+
+
+def run_worker(backend, model_name, index_dir, sections):
+    """รันใน Process ลูก: โหลด Model ตาม Backend แล้ว Embed คำถามทั้งหมด ส่งผลกลับเป็น JSON ทาง stdout"""
+    from embedding_service import load_model
+
+    index = LocalVectorIndex(index_dir)
+    snippets = [index.texts[i][:SNIPPET_CHARS] for i in sample_sections(index, sections)]
+
+    start = time.perf_counter()
+    model = load_model(model_name, backend=backend)
+    load_seconds = time.perf_counter() - start
+    model.embed_query(SAMPLE_QUESTIONS[0])  # Warm-up ไม่นับเวลา
+
+    latencies = []
+    question_vectors = []
+    for question in SAMPLE_QUESTIONS:
+        start = time.perf_counter()
+        question_vectors.append(model.embed_query(question))
+        latencies.append((time.perf_counter() - start) * 1000)
+    snippet_vectors = model.embed_documents(snippets)
+
+    json.dump({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "latencies_ms": latencies,
+        "peak_rss_mb": peak_rss_mb(),
+        "question_vectors": question_vectors,
+        "snippet_vectors": snippet_vectors,
+    }, sys.stdout)
+
+
+def embed_in_subprocess(backend, args):
+    command = [
+        sys.executable, "-m", "benchmarks.verify_embedding_backend",
+        "--worker", backend, "--model", args.model, "--index-dir", args.index_dir,
+        "--sections", str(args.sections),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        raise RuntimeError(f"Backend {backend} รันไม่สำเร็จ")
+    return json.loads(completed.stdout)
+
+
+def top_k(matrix, vectors, k):
+    queries = np.asarray(vectors, dtype=np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    scores = queries @ matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify quantized / ONNX embedding backends against fp32")
+    parser.add_argument("--backends", nargs="+", default=["fp32", "int8"], help="fp32 / int8 / onnx")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--index-dir", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=100, help="จำนวนมาตราที่ใช้ทดสอบ self@1")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.model, args.index_dir, args.sections)
+        return
+
+    index = LocalVectorIndex(args.index_dir)
+    matrix = np.asarray(index.matrix)
+    expected_self = np.array(sample_sections(index, args.sections))
+    backends = ["fp32"] + [backend for backend in args.backends if backend != "fp32"]
+
+    results = {}
+    for backend in backends:
+        print(f"⏳ กำลังทดสอบ Backend {backend}...")
+        results[backend] = embed_in_subprocess(backend, args)
+
+    reference = top_k(matrix, results["fp32"]["question_vectors"], args.k)
+
+    print(f"\nmodel={args.model} sections={len(index)} k={args.k}")
+    print(f"{'backend':>8} | {'recall@k':>8} | {'self@1':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'load s':>6} | {'RSS MB':>7}")
+    print("-" * 70)
+    for backend in backends:
+        result = results[backend]
+        found = top_k(matrix, result["question_vectors"], args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, reference)])
+        self_top1 = np.mean(top_k(matrix, result["snippet_vectors"], 1)[:, 0] == expected_self)
+        p50, p95 = np.percentile(result["latencies_ms"], [50, 95])
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+        print(f"{backend:>8} | {recall:>8.1%} | {self_top1:>6.1%} | {p50:>7.1f} | {p95:>7.1f} | "
+              f"{result['load_seconds']:>6.1f} | {rss:>7}")
+
+
+if __name__ == "__main__":
+    main()
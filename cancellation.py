@@ -0,0 +1,89 @@
+"""
+หยุดงานของ Request ที่ไม่มีใครรอคำตอบแล้ว (/chat_stream)
+
+- Client ปิดการเชื่อมต่อ (ปิดหน้าเว็บ / frontend.py หมดเวลารอ) -> ยกเลิกงานที่ค้างอยู่ทันที
+  (Rewrite / Embedding / ค้นหา / รอคิว Generation / Stream จาก Typhoon) ไม่เสีย Token และคืน Slot ให้คนอื่น
+- Deadline ต่อ Request (STREAM_DEADLINE_SECONDS นับจากรับ Request): ตอบยังไม่จบก็ตัดคำตอบตรงนั้น
+  แล้วส่ง Event done พร้อม truncated=true (จบแบบมีคำตอบบางส่วน ดีกว่าให้ Connection หลุดเอง)
+- ประมาณ Token ที่ประหยัดได้จากความยาวคำตอบเฉลี่ยของคำตอบที่ตอบจบ (ไม่รู้ว่าถ้าตอบต่อจะยาวเท่าไหร่จริง)
+"""
+import os
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+STREAM_DEADLINE_SECONDS = float(os.getenv("STREAM_DEADLINE_SECONDS", "90"))   # 0 = ไม่จำกัด
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))  # เช็คว่า Client ยังอยู่ไหมทุกกี่วินาที
+DEFAULT_COMPLETION_TOKENS = 400  # ใช้ประมาณก่อนมีคำตอบที่ตอบจบให้เฉลี่ย
+
+
+class RequestCancelled(Exception):
+    """งานถูกหยุดกลางทาง reason = "disconnect" (Client ปิดการเชื่อมต่อ) / "deadline" (เกิน Deadline)"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def request_deadline(seconds: float = STREAM_DEADLINE_SECONDS):
+    """เวลา (loop.time()) ที่ Request ต้องจบ (None = ไม่จำกัด)"""
+    if seconds <= 0:
+        return None
+    return asyncio.get_running_loop().time() + seconds
+
+
+async def wait_for_disconnect(http_request, poll_seconds: float = DISCONNECT_POLL_SECONDS):
+    """รอจน Client ปิดการเชื่อมต่อ (Starlette ไม่มี Event ให้รอ ต้องเช็คเป็นระยะ)"""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(poll_seconds)
+
+
+def _consume_result(task):
+    # งานที่ยกเลิกทิ้งแล้วไม่มีใครรอผล -> กัน Warning "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+async def guarded(awaitable, http_request, deadline=None):
+    """
+    รอ awaitable จนเสร็จ แต่ถ้า Client ปิดการเชื่อมต่อ / ถึง deadline ก่อน -> ยกเลิกงานนั้นทันทีแล้วโยน RequestCancelled
+    (งานรันใน Task แยก ContextVar เช่น current_client ยังเห็นค่าเดิม)
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.create_task(wait_for_disconnect(http_request))
+    timeout = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+    try:
+        done, _ = await asyncio.wait({work, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            work.add_done_callback(_consume_result)
+    if work in done:
+        return work.result()
+    raise RequestCancelled("disconnect" if watcher in done else "deadline")
+
+
+class CompletionEstimate:
+    """ความยาวคำตอบเฉลี่ย (Token) ของคำตอบที่ตอบจบ ใช้ประมาณว่าหยุดกลางทางแล้วไม่ต้องจ่ายอีกกี่ Token"""
+
+    def __init__(self, default: int = DEFAULT_COMPLETION_TOKENS):
+        self.default = default
+        self.answers = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, completion_tokens: int):
+        with self._lock:
+            self.answers += 1
+            self.tokens += completion_tokens
+
+    def mean(self) -> float:
+        with self._lock:
+            return self.tokens / self.answers if self.answers else float(self.default)
+
+    def remaining(self, generated_tokens: int = 0) -> int:
+        """Token ของคำตอบที่ยังไม่ได้สร้าง (ประมาณ)"""
+        return max(0, round(self.mean() - generated_tokens))
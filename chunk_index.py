@@ -0,0 +1,233 @@
+"""
+Chunk Index (Multi-vector): แบ่งแต่ละมาตราเป็นช่วงย่อยตามขอบประโยคภาษาไทย แล้ว Embed ทีละช่วง
+ตอนค้นหาจะให้คะแนนทุก Chunk แล้วรวมกลับเป็นมาตรา (คะแนนมาตรา = คะแนน Chunk ที่ดีที่สุดของมาตรานั้น)
+มาตรายาวๆ จึงไม่ถูกเฉลี่ยความหมายจนจมหายเหมือนตอนใช้ Vector เดียวทั้งมาตรา
+
+ไฟล์ใน Snapshot (CHUNK_INDEX_DIR):
+- chunks.f32  : Matrix float32 ของทุก Chunk (Normalize แล้ว) เรียงต่อกันทีละมาตรา
+- chunks.json : ข้อมูลมาตรา (hash / ช่วงแถวใน Matrix) + ข้อความของแต่ละ Chunk
+
+สร้าง / อัปเดต (รอบถัดไป Embed ใหม่เฉพาะมาตราที่ข้อความเปลี่ยน ถ้าเปลี่ยนค่าการแบ่ง Chunk / Embedding Model จะสร้างใหม่ทั้งหมด):
+    python ingest.py --chunks
+แล้วตั้งค่า RETRIEVAL_BACKEND=chunks ใน .env
+"""
+import os
+import json
+import time
+import hashlib
+import functools
+
+import numpy as np
+from dotenv import load_dotenv
+from pythainlp.tokenize import sent_tokenize
+
+from embedding_service import EMBEDDING_MODEL, EMBEDDING_BACKEND, ONNX_FILE_NAME
+from local_index import write_snapshot, normalize_rows, top_k_rows
+from token_counter import count_tokens
+
+load_dotenv()
+CHUNK_INDEX_DIR = os.getenv("CHUNK_INDEX_DIR", "chunk_snapshot")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))                # ขนาด Chunk สูงสุด
+CHUNK_OVERLAP_SENTENCES = int(os.getenv("CHUNK_OVERLAP_SENTENCES", "1"))    # ประโยคที่ซ้อนกับ Chunk ก่อนหน้า
+SENTENCE_ENGINE = os.getenv("SENTENCE_ENGINE", "crfcut")                    # crfcut ต้องมี python-crfsuite
+MATRIX_FILE = "chunks.f32"
+META_FILE = "chunks.json"
+
+
+@functools.lru_cache(maxsize=1)
+def _sentence_engine():
+    if SENTENCE_ENGINE == "crfcut":
+        try:
+            import pycrfsuite  # noqa: F401
+        except ImportError:
+            # ไม่มี CRF Model -> แบ่งตามช่องว่าง/ขึ้นบรรทัดใหม่ (ภาษาไทยเว้นวรรคระหว่างประโยคอยู่แล้ว)
+            return "whitespace+newline"
+    return SENTENCE_ENGINE
+
+
+def split_sentences(text: str):
+    """แบ่งย่อหน้า (ขึ้นบรรทัดใหม่) ก่อน แล้วแบ่งประโยคด้วย PyThaiNLP"""
+    sentences = []
+    for paragraph in text.splitlines():
+        if paragraph.strip():
+            sentences.extend(s.strip() for s in sent_tokenize(paragraph, engine=_sentence_engine()) if s.strip())
+    return sentences
+
+
+def split_section(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_SENTENCES):
+    """รวมประโยคติดกันเป็น Chunk ไม่เกิน max_tokens (ต่อท้ายด้วย overlap ประโยคสุดท้ายของ Chunk ก่อนหน้า)"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current = current[-overlap:] if overlap else []
+            current_tokens = sum(count_tokens(s) for s in current)
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks or [text]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_settings() -> dict:
+    """ค่าที่กำหนดว่า Chunk / Vector ออกมาเป็นอย่างไร (ข้อความเดิมแต่ค่าพวกนี้เปลี่ยน ก็ใช้ของเดิมไม่ได้)"""
+    return {
+        "max_tokens": CHUNK_MAX_TOKENS,
+        "overlap_sentences": CHUNK_OVERLAP_SENTENCES,
+        "sentence_engine": _sentence_engine(),
+        "embedding_model": EMBEDDING_MODEL,
+        # fp32 / int8 / onnx (+ ไฟล์ ONNX ที่ Quantize แล้ว) ให้ Vector ต่างกันเล็กน้อย ต้องตรงกับฝั่ง Query
+        "embedding_backend": EMBEDDING_BACKEND,
+        "onnx_file": ONNX_FILE_NAME if EMBEDDING_BACKEND == "onnx" else "",
+    }
+
+
+def _load_previous(index_dir: str, settings: dict):
+    """อ่าน Snapshot เดิม คืน dict: id มาตรา -> (hash, chunk_texts, vectors) (สร้างด้วยค่าอื่น = ไม่มีอะไรใช้ซ้ำได้)"""
+    if not os.path.exists(os.path.join(index_dir, META_FILE)):
+        return {}
+    index = ChunkIndex(index_dir)
+    if index.settings != settings:
+        print(f"♻️ Snapshot เดิมสร้างด้วยค่าอื่น ({index.settings} -> {settings}) แบ่ง Chunk + Embed ใหม่ทั้งหมด")
+        return {}
+    previous = {}
+    for section in index.sections:
+        start, end = section["start"], section["end"]
+        previous[section["id"]] = (
+            section["hash"], index.chunk_texts[start:end], np.array(index.matrix[start:end]))
+    return previous
+
+
+def build_chunk_index(rows, embeddings, index_dir: str = CHUNK_INDEX_DIR, batch_size: int = 32,
+                      corpus_version: int = None) -> dict:
+    """
+    rows: id / section_number / text_original ของทุกมาตรา (ไม่ต้องมี embedding)
+    มาตราที่ hash ของข้อความเหมือนเดิมจะใช้ Chunk + Vector เดิม ไม่ต้อง Embed ใหม่
+    (เฉพาะเมื่อ Snapshot เดิมสร้างด้วย chunk_settings() ชุดเดียวกัน)
+    corpus_version: เลขเวอร์ชันจาก corpus_state ตอนเริ่มดึงข้อมูล (เหมือน local_index.build_snapshot)
+    """
+    settings = chunk_settings()
+    previous = _load_previous(index_dir, settings)
+    sections = []
+    chunk_texts = []
+    vectors = []   # Vector เดิม หรือ None (รอ Embed)
+    stats = {"sections": 0, "reused": 0, "rechunked": 0, "chunks": 0, "embedded": 0}
+
+    for row in rows:
+        text = row.get('text_original') or ''
+        if not text.strip():
+            continue
+        digest = text_hash(text)
+        old = previous.get(row['id'])
+        start = len(chunk_texts)
+        if old is not None and old[0] == digest:
+            chunk_texts.extend(old[1])
+            vectors.extend(old[2])
+            stats["reused"] += 1
+        else:
+            chunks = split_section(text, max_tokens=settings["max_tokens"], overlap=settings["overlap_sentences"])
+            chunk_texts.extend(chunks)
+            vectors.extend([None] * len(chunks))
+            stats["rechunked"] += 1
+        sections.append({
+            "id": row['id'],
+            "section_number": row['section_number'],
+            "text_original": text,
+            "hash": digest,
+            "start": start,
+            "end": len(chunk_texts),
+        })
+
+    pending = [i for i, vector in enumerate(vectors) if vector is None]
+    for batch_start in range(0, len(pending), batch_size):
+        batch = pending[batch_start:batch_start + batch_size]
+        for i, vector in zip(batch, embeddings.embed_documents([chunk_texts[i] for i in batch])):
+            vectors[i] = vector
+        stats["embedded"] += len(batch)
+        print(f"  ✅ Embed Chunk {stats['embedded']}/{len(pending)}")
+
+    if not vectors:
+        raise ValueError("ไม่มีข้อความให้สร้าง Chunk Index")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    meta = {
+        "built_at": time.time(),
+        "corpus_version": corpus_version,
+        "settings": settings,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "sections": sections,
+        "chunk_texts": chunk_texts,
+    }
+    write_snapshot(index_dir, matrix, meta, MATRIX_FILE, META_FILE)
+    stats["sections"] = len(sections)
+    stats["chunks"] = len(chunk_texts)
+    return stats
+
+
+class ChunkIndex:
+    """ค้นหาระดับ Chunk แล้วคืนผลระดับมาตรา (Interface เดียวกับ local_index.LocalVectorIndex)"""
+
+    def __init__(self, index_dir: str = CHUNK_INDEX_DIR):
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.sections = meta["sections"]
+        self.chunk_texts = meta["chunk_texts"]
+        self.built_at = meta["built_at"]
+        self.corpus_version = meta.get("corpus_version")
+        self.settings = meta.get("settings")  # Snapshot รุ่นเก่าไม่มี -> None (สร้างใหม่ทั้งหมดรอบหน้า)
+        self.ids = [section["id"] for section in self.sections]
+        self.section_numbers = [section["section_number"] for section in self.sections]
+        self.texts = [section["text_original"] for section in self.sections]
+        # Chunk ของแต่ละมาตราอยู่ติดกัน -> ใช้ reduceat หาคะแนนสูงสุดต่อมาตราได้ในครั้งเดียว
+        self.starts = np.array([section["start"] for section in self.sections], dtype=np.int64)
+        self.matrix = np.memmap(
+            os.path.join(index_dir, MATRIX_FILE),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["count"], meta["dim"]),
+        )
+
+    def __len__(self):
+        return len(self.sections)
+
+    def search(self, query_vector, match_threshold: float = 0.5, match_count: int = 5):
+        """คืนมาตราที่ Chunk ดีที่สุดมี Cosine Similarity >= match_threshold สูงสุด match_count อันดับ"""
+        return self.search_batch([query_vector], match_threshold, match_count)[0]
+
+    def search_batch(self, query_vectors, match_threshold: float = 0.5, match_count: int = 5):
+        """ค้นหลายคำถามพร้อมกัน: matmul ครั้งเดียว แล้ว reduceat ตามแกน Chunk ได้คะแนนต่อมาตราของทุกคำถาม"""
+        queries = normalize_rows(query_vectors)
+        chunk_scores = queries @ self.matrix.T
+        section_scores = np.maximum.reduceat(chunk_scores, self.starts, axis=1)
+        k = min(match_count, section_scores.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        top = top_k_rows(section_scores, k)
+
+        batch_results = []
+        for row_chunks, row_sections, row_top in zip(chunk_scores, section_scores, top):
+            results = []
+            for i in row_top:
+                score = float(row_sections[i])
+                if score < match_threshold:
+                    break
+                section = self.sections[int(i)]
+                best_chunk = section["start"] + int(np.argmax(row_chunks[section["start"]:section["end"]]))
+                results.append({
+                    "id": section["id"],
+                    "section_number": section["section_number"],
+                    "text_original": section["text_original"],
+                    "similarity": score,
+                    "matched_chunk": self.chunk_texts[best_chunk],
+                })
+            batch_results.append(results)
+        return batch_results
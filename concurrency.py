@@ -0,0 +1,29 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# โหลด .env ก่อนอ่านค่า Config (โมดูลนี้ถูก import ก่อน api.py จะเรียก load_dotenv)
+load_dotenv()
+
+# Worker Pool สำหรับงานที่กิน CPU (Embedding / ตัดคำ PyThaiNLP)
+# จำกัดจำนวน Thread ไว้ ไม่ให้ Request พร้อมกันเยอะๆ แย่ง CPU กันจนช้าทั้งระบบ
+# (torch ปล่อย GIL ระหว่างคำนวณ เลยใช้ Thread ได้ ไม่ต้องใช้ Process)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu-worker")
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """
+    ส่งงานหนักๆ (แบบ Sync) ไปรันใน Worker Pool แล้วรอผลแบบ Async
+    Event Loop ของ uvicorn จะได้ว่างไปรับ Request อื่นระหว่างรอ
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_cpu_pool():
+    """ปิด Worker Pool ตอน Server ดับ (รอให้งานที่ค้างอยู่ทำเสร็จก่อน)"""
+    cpu_pool.shutdown(wait=True)
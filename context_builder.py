@@ -0,0 +1,133 @@
+"""
+Context Builder: ประกอบ "ข้อมูลกฎหมาย" ที่จะใส่ใน Prompt ให้อยู่ในงบ Token ที่กำหนด
+(ใช้ร่วมกันทั้ง api.py และ brain.py)
+
+- นับ Token ด้วย tiktoken (token_counter) แล้วใส่มาตราเรียงตามความเกี่ยวข้องจนเต็มงบ CONTEXT_TOKEN_BUDGET
+- มาตราที่ยาวเกิน SECTION_TOKEN_LIMIT ตัดเหลือเฉพาะประโยคที่มีคำตรงกับคำถามมากที่สุด (คงลำดับเดิม)
+- ตัดมาตราที่เนื้อหาซ้ำ/เกือบซ้ำกับที่ใส่ไปแล้วทิ้ง (Jaccard ของ Character 3-gram >= DEDUP_SIMILARITY)
+- รายงานจำนวน Token ที่ประหยัดได้เทียบกับการใส่ทุกมาตราเต็มๆ แบบเดิม
+"""
+import os
+
+from dotenv import load_dotenv
+
+from chunk_index import split_sentences
+from lexical_search import tokenize
+from token_counter import count_tokens
+
+load_dotenv()
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))   # Token สูงสุดของข้อมูลกฎหมายทั้งหมด
+SECTION_TOKEN_LIMIT = int(os.getenv("SECTION_TOKEN_LIMIT", "800"))      # Token สูงสุดต่อมาตรา
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.9"))          # 1 = ตัดเฉพาะที่ซ้ำกันเป๊ะ
+TRIM_MARKER = " …"
+
+
+def format_passage(section_number, text: str) -> str:
+    return f"- มาตรา {section_number}: {text}\n\n"
+
+
+def sort_sources(sources):
+    """เรียงเลขมาตราแบบตัวเลข (มาตรา 9, 76, 118) ไม่ใช่แบบ String (1, 10, 2)"""
+    def key(source):
+        number = source.split()[-1]
+        return (0, int(number), source) if number.isdigit() else (1, 0, source)
+    return sorted(set(sources), key=key)
+
+
+def _shingles(text: str, size: int = 3):
+    text = "".join(text.split())
+    return {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+
+
+def _jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trim_to_query(text: str, query_terms, token_limit: int, focus: str = None) -> str:
+    """
+    เก็บเฉพาะประโยคที่มีคำจากคำถามมากที่สุดให้พอดี token_limit แล้วเรียงกลับตามลำดับในมาตรา
+    focus: Chunk ที่ Chunk Index ค้นเจอ (ถ้ามี) ประโยคในนั้นได้คะแนนพิเศษ
+    """
+    if count_tokens(text) <= token_limit:
+        return text
+
+    sentences = split_sentences(text)
+    scored = []
+    for position, sentence in enumerate(sentences):
+        score = len(query_terms.intersection(tokenize(sentence)))
+        # ประโยคแรกของมาตรามักเป็นหลักการ เลยให้คะแนนพิเศษเล็กน้อย
+        if position == 0:
+            score += 0.5
+        if focus and sentence in focus:
+            score += 1.0
+        scored.append((score, position, sentence))
+
+    kept = []
+    used = 0
+    for _, position, sentence in sorted(scored, key=lambda item: (-item[0], item[1])):
+        tokens = count_tokens(sentence) + 1
+        if used + tokens > token_limit:
+            continue
+        kept.append((position, sentence))
+        used += tokens
+
+    if not kept:
+        # ประโยคเดียวก็ยาวเกินงบ ตัดตามสัดส่วนตัวอักษรแทน
+        return text[:max(1, len(text) * token_limit // max(count_tokens(text), 1))] + TRIM_MARKER
+    return " ".join(sentence for _, sentence in sorted(kept)) + TRIM_MARKER
+
+
+def build_context(question: str, retrieved_docs, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  section_limit: int = SECTION_TOKEN_LIMIT, dedup_similarity: float = DEDUP_SIMILARITY) -> dict:
+    """
+    retrieved_docs เรียงตามความเกี่ยวข้องมาแล้ว (มาตราแรกสำคัญที่สุด)
+    คืน dict: context (ข้อความใส่ Prompt), sources (มาตราที่ใช้จริง), tokens, tokens_saved, trimmed, dropped
+    """
+    query_terms = set(tokenize(question))
+    passages = []
+    seen_shingles = []
+    sources = []
+    used = 0
+    full_tokens = 0
+    trimmed = 0
+    dropped = 0
+
+    for doc in retrieved_docs:
+        section_number = doc.get('section_number', '?')
+        text = doc.get('text_original') or ''
+        full_tokens += count_tokens(format_passage(section_number, text))
+
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, seen) >= dedup_similarity for seen in seen_shingles):
+            dropped += 1
+            continue
+
+        remaining = token_budget - used
+        overhead = count_tokens(format_passage(section_number, ""))
+        if remaining - overhead <= 0:
+            dropped += 1
+            continue
+
+        limit = min(section_limit, remaining - overhead)
+        short_text = trim_to_query(text, query_terms, limit, doc.get('matched_chunk'))
+        if short_text != text:
+            trimmed += 1
+        passage = format_passage(section_number, short_text)
+
+        passages.append(passage)
+        seen_shingles.append(shingles)
+        sources.append(f"มาตรา {section_number}")
+        used += count_tokens(passage)
+
+    context = "".join(passages)
+    tokens = count_tokens(context)
+    return {
+        "context": context,
+        "sources": sort_sources(sources),
+        "tokens": tokens,
+        "tokens_saved": max(0, full_tokens - tokens),
+        "trimmed": trimmed,
+        "dropped": dropped,
+    }
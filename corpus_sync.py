@@ -0,0 +1,110 @@
+"""
+Incremental Sync ของ act_sections + เลขเวอร์ชันของข้อมูลกฎหมาย (Corpus Version)
+
+- ทุกมาตราเก็บ content_hash (hash ของ text_original แบบเดียวกับ chunk_index.text_hash) คู่กับ embedding
+  ข้อความถูกแก้ -> hash ไม่ตรง -> Embed ใหม่เฉพาะมาตรานั้น (ไม่ต้องรอให้ embedding เป็น NULL)
+- Sync เสร็จแล้วถ้าเนื้อหาทั้งชุด (เลขมาตรา + ข้อความ) ต่างจากรอบก่อน -> เพิ่มเลขเวอร์ชันในตาราง corpus_state
+- api.py เช็คเลขนี้ทุก CORPUS_WATCH_SECONDS วินาที แล้วสลับ Index / Cache ชุดใหม่เข้าไปโดยไม่ต้อง Restart
+- Snapshot ในเครื่อง (local_index / chunk_index) จำเวอร์ชันที่ใช้สร้างไว้ใน meta (Server รอจน Snapshot ตามทัน)
+
+ต้องเพิ่มใน Supabase ก่อน (ครั้งเดียว):
+    alter table act_sections add column if not exists content_hash text;
+    create table if not exists corpus_state (
+        id int primary key, version bigint not null, fingerprint text, sections int, updated_at double precision);
+
+วิธีใช้:
+    python ingest.py --sync --refresh-index
+"""
+import os
+import time
+import inspect
+
+from dotenv import load_dotenv
+
+from answer_cache import corpus_fingerprint
+from chunk_index import text_hash
+from local_index import fetch_sections
+
+load_dotenv()
+CORPUS_WATCH_SECONDS = float(os.getenv("CORPUS_WATCH_SECONDS", "30"))  # Server เช็คเวอร์ชันทุกกี่วินาที (0 = ไม่เช็ค)
+STATE_TABLE = "corpus_state"
+STATE_ID = 1  # ตารางมีแถวเดียว
+
+
+def changed_sections(rows):
+    """มาตราที่ต้อง Embed ใหม่: ยังไม่เคย Sync (ไม่มี hash) หรือ hash ไม่ตรงกับข้อความปัจจุบัน (ข้ามมาตราว่าง)"""
+    return [
+        row for row in rows
+        if (row.get('text_original') or '').strip() and row.get('content_hash') != text_hash(row['text_original'])
+    ]
+
+
+def _state_query(client):
+    return client.table(STATE_TABLE) \
+        .select('version, fingerprint, sections, updated_at') \
+        .eq('id', STATE_ID) \
+        .limit(1)
+
+
+def read_state(client):
+    """เวอร์ชันล่าสุดในตาราง corpus_state (ยังไม่เคย Sync = None)"""
+    data = _state_query(client).execute().data
+    return data[0] if data else None
+
+
+async def aread_state(client):
+    """แบบ Async Client (api.py)"""
+    response = _state_query(client).execute()
+    if inspect.isawaitable(response):
+        response = await response
+    return response.data[0] if response.data else None
+
+
+def read_version(client):
+    """เลขเวอร์ชันปัจจุบัน (ไม่มีตาราง / ยังไม่เคย Sync = None) ใช้ตอนสร้าง Snapshot"""
+    try:
+        state = read_state(client)
+    except Exception as e:
+        print(f"⚠️ อ่าน {STATE_TABLE} ไม่ได้ (ยังไม่ได้สร้างตาราง?): {e}")
+        return None
+    return state["version"] if state else None
+
+
+def sync_corpus(supabase, embeddings, batch_size: int = 32) -> dict:
+    """
+    Embed ใหม่เฉพาะมาตราที่ข้อความเปลี่ยน แล้วเพิ่มเลขเวอร์ชันถ้าเนื้อหาทั้งชุดเปลี่ยน
+    เขียนกลับแค่ embedding + content_hash (ไม่เขียน text_original ทับ ถ้ามีคนแก้ข้อความระหว่าง Sync
+    hash ที่บันทึกจะไม่ตรงกับข้อความใหม่ รอบหน้าจะ Embed ใหม่เอง)
+    """
+    rows = fetch_sections(supabase, columns='id, section_number, text_original, content_hash', require_embedding=False)
+    changed = changed_sections(rows)
+    stats = {"sections": len(rows), "changed": len(changed), "embedded": 0, "version": None, "bumped": False}
+    print(f"📦 {len(rows)} มาตรา -> ข้อความเปลี่ยน / ยังไม่มี hash {len(changed)} มาตรา")
+
+    for batch_start in range(0, len(changed), batch_size):
+        batch = changed[batch_start:batch_start + batch_size]
+        vectors = embeddings.embed_documents([row['text_original'] for row in batch])
+        for row, vector in zip(batch, vectors):
+            supabase.table('act_sections') \
+                .update({'embedding': list(vector), 'content_hash': text_hash(row['text_original'])}) \
+                .eq('id', row['id']) \
+                .execute()
+        stats["embedded"] += len(batch)
+        print(f"  ✅ Embed มาตรา {stats['embedded']}/{len(changed)}")
+
+    # เวอร์ชันเปลี่ยนหลัง Embedding ถูกเขียนครบแล้วเท่านั้น (Server ที่เห็นเวอร์ชันใหม่จะได้ Vector ใหม่ด้วย)
+    state = read_state(supabase)
+    fingerprint = corpus_fingerprint(rows)
+    version = state["version"] if state else 0
+    if state is None or state.get("fingerprint") != fingerprint:
+        version += 1
+        supabase.table(STATE_TABLE).upsert({
+            'id': STATE_ID,
+            'version': version,
+            'fingerprint': fingerprint,
+            'sections': len(rows),
+            'updated_at': time.time(),
+        }, on_conflict='id').execute()
+        stats["bumped"] = True
+    stats["version"] = version
+    return stats
@@ -0,0 +1,185 @@
+import os
+import time
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from concurrency import run_cpu_bound
+from thai_text import cache_key
+
+# โหลด .env ก่อนอ่านค่า Config (โมดูลนี้ถูก import ก่อน api.py จะเรียก load_dotenv)
+load_dotenv()
+
+# ค่า Config ของ Cache (ปรับได้ผ่าน .env)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))     # จำนวนคำถามสูงสุดที่เก็บใน RAM
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "0"))        # อายุของ Cache (วินาที), 0 = ไม่หมดอายุ
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")              # ไฟล์ SQLite สำหรับเก็บลง Disk (ว่าง = ไม่ใช้)
+
+
+def normalize_query(text: str) -> str:
+    """
+    ทำคำถามให้อยู่ในรูปมาตรฐานก่อนใช้เป็น Key (ใช้ทางเดียวกับ BM25: thai_text.cache_key)
+    คำถามเดียวกันที่พิมพ์ต่างกันนิดหน่อย (สระ/วรรณยุกต์ / เว้นวรรค / ตัวพิมพ์) จะได้ Key เดียวกัน
+    """
+    return cache_key(text)
+
+
+class _DiskTier:
+    """ชั้นเก็บ Vector ลงไฟล์ SQLite (อยู่รอดหลัง Restart Server)"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, key: str):
+        row = self.conn.execute(
+            "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist(), row[1]
+
+    def put(self, key: str, vector, created_at: float):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+            (key, array("f", vector).tobytes(), created_at),
+        )
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM query_embeddings")
+        self.conn.commit()
+
+
+class CachedQueryEmbeddings:
+    """
+    ครอบ Embedding Model ไว้ แล้วจำ Vector ของคำถามที่เคยถามแล้ว
+    - ชั้นที่ 1: RAM (LRU จำกัดจำนวน)
+    - ชั้นที่ 2: Disk (SQLite, ไม่บังคับ)
+    ถ้าเจอใน Cache จะไม่ต้องรัน BGE-M3 เลย
+    """
+
+    def __init__(self, base, max_size: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL,
+                 disk_path: str = EMBED_CACHE_PATH):
+        self.base = base
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk = _DiskTier(disk_path) if disk_path else None
+        self._memory = OrderedDict()  # key -> (vector, created_at)
+        self._lock = threading.Lock()  # ถูกเรียกจากหลาย Worker Thread พร้อมกัน
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, vector, created_at: float):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)  # เตะตัวที่ไม่ได้ใช้นานสุดออก
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self.disk is not None:
+                disk_entry = self.disk.get(key)
+                if disk_entry is not None and not self._expired(disk_entry[1]):
+                    self._remember(key, *disk_entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return disk_entry[0]
+
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, vector):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, vector, created_at)
+            if self.disk is not None:
+                self.disk.put(key, vector, created_at)
+
+    def embed_query(self, text: str):
+        key = normalize_query(text)
+        vector = self._lookup(key)
+        if vector is None:
+            # คำนวณนอก Lock เพื่อให้ Thread อื่นที่ Hit ไม่ต้องรอ Model
+            # Embed ข้อความที่ผู้ใช้พิมพ์จริง (Key ที่ทำให้เป็นมาตรฐานแล้วใช้หาใน Cache เท่านั้น)
+            vector = self.base.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str):
+        """แบบ Async: ถ้า Model รองรับ aembed_query (Micro-batching / Sidecar) จะไม่กิน Thread ของ Worker Pool"""
+        key = normalize_query(text)
+        vector = self._lookup(key)
+        if vector is None:
+            if hasattr(self.base, "aembed_query"):
+                vector = await self.base.aembed_query(text)
+            else:
+                vector = await run_cpu_bound(self.base.embed_query, text)
+            self._store(key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """
+        คำถามทีละมากๆ (/chat_batch): ที่ไม่อยู่ใน Cache รวมเป็น Batch เดียวส่งเข้า Model ครั้งเดียว
+        (คำถามซ้ำกันใน Batch ก็ Embed ครั้งเดียว)
+        """
+        keys = [normalize_query(text) for text in texts]
+        originals = {}  # key -> ข้อความแรกที่ได้ Key นี้ (ส่งข้อความจริงเข้า Model ไม่ใช่ Key)
+        for key, text in zip(keys, texts):
+            originals.setdefault(key, text)
+        vectors = {}
+        for key in dict.fromkeys(keys):
+            vector = self._lookup(key)
+            if vector is not None:
+                vectors[key] = vector
+        missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            for key, vector in zip(missing, self.base.embed_documents([originals[key] for key in missing])):
+                vector = list(vector)
+                self._store(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    async def aembed_queries(self, texts):
+        return await run_cpu_bound(self.embed_queries, texts)
+
+    def embed_documents(self, texts):
+        """เอกสาร (ตอน Ingest) ไม่ผ่าน Cache ส่งต่อให้ Model ตรงๆ"""
+        return self.base.embed_documents(texts)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._memory),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
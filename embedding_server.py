@@ -0,0 +1,35 @@
+"""
+Embedding Sidecar: โหลด BGE-M3 ครั้งเดียว แล้วให้ทุก Process มาขอ Vector ผ่าน HTTP
+วิธีรัน: python -m uvicorn embedding_server:app --port 8001
+(อย่าตั้ง EMBEDDING_SERVICE_URL ให้ตัว Sidecar เอง ไม่งั้นมันจะเรียกตัวเองวนไป)
+"""
+import asyncio
+from typing import List
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from concurrency import run_cpu_bound
+from embedding_service import MicroBatchingEmbeddings, load_model
+
+app = FastAPI(title="Embedding Service")
+engine = MicroBatchingEmbeddings(load_model())
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    kind: str = "query"  # "query" = รวม Batch กับ Request อื่น, "document" = ส่งเข้า Model ทั้งก้อน
+
+
+@app.post("/embed")
+async def embed_endpoint(request: EmbedRequest):
+    if request.kind == "document":
+        vectors = await run_cpu_bound(engine.embed_documents, request.texts)
+    else:
+        vectors = await asyncio.gather(*(engine.aembed_query(text) for text in request.texts))
+    return {"vectors": [list(map(float, vector)) for vector in vectors]}
+
+
+@app.get("/stats")
+async def stats_endpoint():
+    return engine.stats()
@@ -0,0 +1,213 @@
+"""
+Embedding Engine กลาง (BGE-M3 ตัวเดียวต่อ Process)
+
+- MicroBatchingEmbeddings: รวม embed_query ที่เข้ามาพร้อมๆ กันภายในช่วงเวลาสั้นๆ (EMBED_MAX_WAIT_MS)
+  เป็น Batch เดียว แล้วรันผ่าน Model ครั้งเดียว แทนการรันทีละคำถาม (Batch Size 1)
+- EMBEDDING_BACKEND: เลือกวิธีรัน Model บน CPU
+    fp32 = HuggingFace ปกติ (ค่าเริ่มต้น), int8 = torch dynamic quantization, onnx = ONNX Runtime
+  ทุกแบบให้ Vector เข้ากันได้กับที่เก็บไว้ใน act_sections.embedding (ตรวจด้วย benchmarks/verify_embedding_backend.py)
+- RemoteEmbeddings: ถ้าตั้ง EMBEDDING_SERVICE_URL ไว้ ทุกสคริปต์ (api / brain / search_engine / ingest)
+  จะไปใช้ Model ตัวเดียวกันที่รันเป็น Sidecar แทนการโหลด Model หลาย GB ของใครของมัน
+
+วิธีรัน Sidecar (ดู embedding_server.py):
+    python -m uvicorn embedding_server:app --port 8001
+แล้วตั้ง EMBEDDING_SERVICE_URL=http://127.0.0.1:8001 ใน .env
+"""
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from app_logging import get_logger
+from metrics import registry
+
+load_dotenv()
+log = get_logger("embedding")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "fp32")         # fp32 / int8 / onnx
+ONNX_FILE_NAME = os.getenv("ONNX_FILE_NAME", "")                   # เช่น onnx/model_qint8_avx512_vnni.onnx (ว่าง = ค่าเริ่มต้น)
+EMBEDDING_BACKENDS = ("fp32", "int8", "onnx")
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "")
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))          # จำนวนคำถามสูงสุดต่อ Batch
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))     # รอรวม Batch นานสุดกี่ ms
+EMBED_TORCH_THREADS = int(os.getenv("EMBED_TORCH_THREADS", "0"))   # 0 = ให้ torch เลือกเอง
+
+EMBED_BATCH_SIZE = registry.histogram(
+    "embedding_batch_size", "Queries per model forward pass", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+
+class SentenceTransformerEmbeddings:
+    """ใช้ SentenceTransformer ตรงๆ (สำหรับ Backend int8 / onnx) Interface เดียวกับ HuggingFaceEmbeddings"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def embed_documents(self, texts):
+        return self.model.encode(list(texts), convert_to_numpy=True).tolist()
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+
+def load_model(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND):
+    """โหลด Embedding Model ตาม Backend ที่เลือก พร้อมตั้งจำนวน Thread ของ torch"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"ไม่รู้จัก EMBEDDING_BACKEND={backend} (ใช้ได้: {' / '.join(EMBEDDING_BACKENDS)})")
+    if EMBED_TORCH_THREADS > 0:
+        import torch
+        torch.set_num_threads(EMBED_TORCH_THREADS)
+
+    if backend == "fp32":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "int8":
+        # แปลง Linear Layer เป็น int8 (Dynamic Quantization) ลด RAM และเร็วขึ้นบน CPU
+        import torch
+        model = SentenceTransformer(model_name, device="cpu")
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return SentenceTransformerEmbeddings(model)
+
+    # onnx: ใช้ ONNX Runtime (ต้องติดตั้งเพิ่ม: pip install "optimum[onnxruntime]")
+    model_kwargs = {"file_name": ONNX_FILE_NAME} if ONNX_FILE_NAME else None
+    try:
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    except ImportError as e:
+        raise ImportError('Backend onnx ต้องติดตั้ง: pip install "optimum[onnxruntime]"') from e
+    return SentenceTransformerEmbeddings(model)
+
+
+class MicroBatchingEmbeddings:
+    """ครอบ Model แล้วรวม embed_query ที่มาพร้อมกันเป็น Batch (มี Thread เดียวเป็นคนรัน Model)"""
+
+    def __init__(self, base, max_batch_size: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.base = base
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def _submit(self, text: str) -> Future:
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str):
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str):
+        # รอผลแบบ Async ได้เลย ไม่ต้องกิน Thread ของ Worker Pool ไปนั่งรอ
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts):
+        """เอกสาร (ตอน Ingest) มาเป็น Batch อยู่แล้ว ส่งเข้า Model ตรงๆ"""
+        return self.base.embed_documents(texts)
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Thread นี้ต้องไม่ตายเด็ดขาด ไม่งั้นทุก embed_query หลังจากนี้จะรอไปตลอดกาล
+        while True:
+            try:
+                self._run_batch(self._collect_batch())
+            except Exception:
+                log.exception("❌ Embedding Batcher ทำ Batch นี้ไม่สำเร็จ ทำ Batch ถัดไปต่อ")
+
+    def _run_batch(self, batch):
+        # ผู้รอที่ถูกยกเลิกไปแล้ว (Client ปิดการเชื่อมต่อ / wrap_future ถูก cancel) ตัดทิ้งก่อนรัน Model
+        # set_running_or_notify_cancel: หลังจากนี้ Future ยกเลิกไม่ได้แล้ว set_result ได้แน่นอน
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # คำถามซ้ำกันใน Batch เดียวกัน รัน Model แค่ครั้งเดียว
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(unique_texts, self.base.embed_documents(unique_texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        EMBED_BATCH_SIZE.observe(len(unique_texts))
+        for text, future in batch:
+            future.set_result(vectors[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+
+class RemoteEmbeddings:
+    """Client ของ Embedding Sidecar (ใช้ Interface เดียวกับ HuggingFaceEmbeddings)"""
+
+    def __init__(self, url: str = EMBEDDING_SERVICE_URL, timeout: float = 60.0):
+        self.url = url.rstrip("/") + "/embed"
+        self.timeout = timeout
+        self._async_client = None
+
+    def embed_documents(self, texts):
+        import requests
+
+        response = requests.post(self.url, json={"texts": list(texts), "kind": "document"}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["vectors"]
+
+    def embed_query(self, text: str):
+        import requests
+
+        response = requests.post(self.url, json={"texts": [text], "kind": "query"}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["vectors"][0]
+
+    async def aembed_query(self, text: str):
+        from http_clients import create_async_client
+
+        if self._async_client is None:
+            self._async_client = create_async_client(timeout=self.timeout)
+        response = await self._async_client.post(self.url, json={"texts": [text], "kind": "query"})
+        response.raise_for_status()
+        return response.json()["vectors"][0]
+
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def get_embeddings():
+    """
+    Embedding Engine ตัวเดียวของ Process นี้ (สร้างครั้งแรกที่เรียก)
+    ถ้าตั้ง EMBEDDING_SERVICE_URL จะใช้ Sidecar แทนการโหลด Model เอง
+    """
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            if EMBEDDING_SERVICE_URL:
+                _shared_engine = RemoteEmbeddings(EMBEDDING_SERVICE_URL)
+            else:
+                _shared_engine = MicroBatchingEmbeddings(load_model())
+        return _shared_engine
+
@@ -2,6 +2,27 @@ import streamlit as st
 import requests
 import json
 import time
+
+API_URL = "http://127.0.0.1:8000"
+RENDER_INTERVAL = 0.05  # วินาที: วาดข้อความใหม่ไม่ถี่กว่านี้ (Streamlit วาดใหม่ทุกครั้งมีต้นทุน)
+
+
+def read_sse(response):
+    """อ่าน Server-Sent Events จาก requests Response คืน (ชื่อ event, data ที่ parse แล้ว)"""
+    event_type, data_lines = None, []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event_type or "message", json.loads("\n".join(data_lines))
+            event_type, data_lines = None, []
+        elif line.startswith("event:"):
+            event_type = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].lstrip())
+
+
 st.set_page_config(page_title="ทนายแรงงาน AI (Streaming Mode)", page_icon="⚖️")
 st.title("⚖️ ระบบทดสอบ Context Awareness + Streaming")
 st.caption("ทดสอบระบบตอบกลับแบบ Real-time (พิมพ์ทีละคำ)")
@@ -30,51 +51,70 @@ if prompt := st.chat_input("พิมพ์คำถาม..."):
         sources_list = []
 
         try:
-            # เตรียมข้อมูลส่ง (Payload)
+            # เตรียมข้อมูลส่ง (Payload): Server จำประวัติไว้ใน Session ส่งแค่ session_id + คำถามใหม่
+            if "session_id" not in st.session_state:
+                st.session_state.session_id = requests.post(f"{API_URL}/sessions", timeout=10).json()["session_id"]
             payload = {
                 "question": prompt,
-                "history": st.session_state.messages[:-1] 
+                "session_id": st.session_state.session_id,
             }
 
             # --- [จุดสำคัญที่แก้] ---
-            # 1. ยิงไปที่ /chat_stream (ไม่ใช่ /chat)
+            # 1. ยิงไปที่ /chat_stream?format=sse (Server-Sent Events)
             # 2. ใส่ stream=True เพื่อบอก requests ว่าขอรับข้อมูลเรื่อยๆ
             with requests.post(
-                "http://127.0.0.1:8000/chat_stream",
+                f"{API_URL}/chat_stream",
+                params={"format": "sse"},
                 json=payload,
                 stream=True, 
                 timeout=60
             ) as response:
 
                 if response.status_code == 200:
-                    for line in response.iter_lines():
-                        if line:
-                            json_line = line.decode('utf-8')
-                            data = json.loads(json_line)
-
-                            if data.get("type") == "sources":
-                                sources_list = data.get("data", [])
-                            
-                            elif data.get("type") == "content":
-                                chunk = data.get("data", "")
-                                full_response += chunk
+                    # Session เดิมหมดอายุ Server จะเปิดให้ใหม่ (ประวัติฝั่ง Server เริ่มใหม่)
+                    st.session_state.session_id = response.headers.get("X-Session-Id", st.session_state.session_id)
+                    usage = None
+                    last_render = 0.0
+                    for event_type, data in read_sse(response):
+                        if event_type == "sources":
+                            sources_list = data.get("data", [])
+
+                        elif event_type == "content":
+                            full_response += data.get("data", "")
+                            # Server รวม Token เป็นก้อนให้แล้ว ฝั่งนี้แค่ไม่วาดใหม่ถี่เกิน RENDER_INTERVAL
+                            now = time.monotonic()
+                            if now - last_render >= RENDER_INTERVAL:
                                 answer_placeholder.markdown(full_response + "▌")
-                                
-                                # --- [2] เพิ่มความหน่วงตรงนี้ ---
-                                # แนะนำ 0.02 - 0.05 วินาที (ถ้า 0.5 จะช้ามาก)
-                                time.sleep(0.02) 
-                    
-                    
-                    
+                                last_render = now
+
+                        elif event_type == "done":
+                            usage = data
+
+                        elif event_type == "error":
+                            st.error(data.get("message", "เกิดข้อผิดพลาด"))
+
                     # จบการทำงาน: แสดงข้อความตัวเต็ม (ลบ cursor ออก)
                     answer_placeholder.markdown(full_response)
                     
                     # แสดง Sources (ถ้ามี)
                     if sources_list:
                         st.info(f"📚 อ้างอิง: {', '.join(sources_list)}")
+
+                    if usage:
+                        tokens = usage.get("usage", {})
+                        note = "⚡ จาก Cache" if usage.get("cached") else (
+                            f"🧮 Prompt {tokens.get('prompt_tokens', 0)} / คำตอบ {tokens.get('completion_tokens', 0)} tokens")
+                        if usage.get("truncated"):
+                            note += " | ✂️ คำตอบถูกตัดเพราะใช้เวลานานเกินกำหนด"
+                        st.caption(note)
                     
                     # บันทึกคำตอบลงประวัติ
-                    st.session_state.messages.append({"role": "assistant", "content": full_response})
+                    if full_response:
+                        st.session_state.messages.append({"role": "assistant", "content": full_response})
+
+                elif response.status_code == 503:
+                    retry_after = response.headers.get("Retry-After", "สักครู่")
+                    st.warning(f"ระบบมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่ใน {retry_after} วินาที")
 
                 else:
                     st.error(f"Error: {response.status_code} - {response.text}")
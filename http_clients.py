@@ -0,0 +1,110 @@
+"""
+HTTP Client กลางสำหรับเรียก Service ภายนอก (Supabase PostgREST / Typhoon)
+
+- ใช้ httpx.AsyncClient ตัวเดียวร่วมกัน: Connection Pool + Keep-alive + HTTP/2 (ต้องมี h2)
+  ไม่ต้องเปิด TCP/TLS ใหม่ทุก Request (ตัวการของ Tail Latency ตอนโหลดสูง)
+- จำกัดจำนวน Connection (HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE) และ Timeout แยกแต่ละช่วง
+- Retry อัตโนมัติเมื่อเจอปัญหาชั่วคราว แบบ Exponential Backoff + Jitter และเคารพ Header Retry-After
+  ทุก Method: ต่อไม่ติด / รอ Pool นานเกิน / 429 / 503 (Server ยังไม่ได้ประมวลผล Request แน่นอน)
+  เฉพาะ Method ที่ส่งซ้ำได้ (GET / PUT / DELETE ...): เพิ่ม Connection หลุด / 502 / 504 ด้วย
+  POST (RPC / LLM) อาจถูกประมวลผลไปแล้ว ส่งซ้ำอาจทำงานซ้ำหรือเสีย Token ซ้ำ
+"""
+import os
+import random
+import asyncio
+
+import httpx
+from dotenv import load_dotenv
+
+from app_logging import get_logger
+
+load_dotenv()
+log = get_logger("http")
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))   # วินาทีที่เก็บ Connection ว่างไว้
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))         # LLM ตอบยาวๆ ใช้เวลานาน
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))          # รอ Connection ว่างใน Pool นานสุด
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.2"))                   # วินาที (คูณ 2 ทุกครั้งที่ Retry)
+HTTP_MAX_BACKOFF = 5.0
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"})
+# Retry ได้ทุก Method: Request ยังไม่ถึง Server / Server ปฏิเสธก่อนประมวลผล
+RETRY_STATUS = frozenset({429, 503})
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Retry เฉพาะ Method ที่ส่งซ้ำได้: Server อาจประมวลผลไปแล้ว
+IDEMPOTENT_RETRY_STATUS = RETRY_STATUS | {502, 504}
+IDEMPOTENT_RETRY_EXCEPTIONS = RETRY_EXCEPTIONS + (httpx.RemoteProtocolError,)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """ครอบ Transport จริงแล้ว Retry เฉพาะกรณีที่ Server ยังไม่ได้ประมวลผล Request (ปลอดภัยที่จะส่งซ้ำ)"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+        self.retried = 0
+
+    def _delay(self, attempt: int, response: httpx.Response = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), HTTP_MAX_BACKOFF)
+            except ValueError:
+                pass  # เป็นรูปแบบวันที่ ใช้ Backoff ปกติแทน
+        return min(self.backoff * (2 ** attempt), HTTP_MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        idempotent = request.method in IDEMPOTENT_METHODS
+        retry_exceptions = IDEMPOTENT_RETRY_EXCEPTIONS if idempotent else RETRY_EXCEPTIONS
+        retry_status = IDEMPOTENT_RETRY_STATUS if idempotent else RETRY_STATUS
+        attempt = 0
+        while True:
+            try:
+                response = await self.transport.handle_async_request(request)
+            except retry_exceptions as e:
+                if attempt >= self.retries:
+                    raise
+                delay = self._delay(attempt)
+                log.warning(f"🔁 {request.url.host} {type(e).__name__} -> ลองใหม่ใน {delay:.2f}s")
+            else:
+                if response.status_code not in retry_status or attempt >= self.retries:
+                    return response
+                delay = self._delay(attempt, response)
+                await response.aclose()
+                log.warning(f"🔁 {request.url.host} HTTP {response.status_code} -> ลองใหม่ใน {delay:.2f}s")
+            attempt += 1
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_async_client(retries: int = HTTP_RETRIES, http2: bool = HTTP2_ENABLED, **kwargs) -> httpx.AsyncClient:
+    """สร้าง AsyncClient ที่มี Pool / Timeout / Retry ตามค่าใน .env (kwargs ส่งต่อให้ httpx.AsyncClient)"""
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    # ถ้าส่ง Transport เอง httpx จะไม่สนใจ verify ที่ตัว Client เลยต้องย้ายมาใส่ที่ Transport
+    transport = httpx.AsyncHTTPTransport(
+        http2=http2 and _http2_available(), limits=limits, verify=kwargs.pop("verify", True))
+    kwargs.setdefault("timeout", httpx.Timeout(
+        connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT, write=HTTP_READ_TIMEOUT, pool=HTTP_POOL_TIMEOUT))
+    kwargs.setdefault("follow_redirects", True)
+    return httpx.AsyncClient(transport=RetryTransport(transport, retries=retries), **kwargs)
@@ -1,8 +1,13 @@
 import os
+import json
 import time
+import queue
+import argparse
+import threading
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_service import get_embeddings
+from chunk_index import text_hash
 
 # 1. โหลดค่ากุญแจจากไฟล์ .env
 load_dotenv()
@@ -17,8 +22,8 @@ if not url or not key:
 supabase: Client = create_client(url, key)
 
 print("⏳ กำลังโหลด Model (BAAI/bge-m3)... ครั้งแรกจะนานหน่อยนะครับ")
-# ใช้ Model ตัวเทพสำหรับภาษาไทย
-embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
+# ใช้ Model ตัวเทพสำหรับภาษาไทย (Engine กลาง / Sidecar ถ้าตั้ง EMBEDDING_SERVICE_URL)
+embeddings = get_embeddings()
 
 def process_batch():
     # 2. ดึงข้อมูลที่ 'ยังไม่มี' embedding (ทีละ 10 แถว)
@@ -55,10 +60,7 @@ def process_batch():
             vector = embeddings.embed_query(text)
             
             # อัปเดตกลับลง DB
-            supabase.table('act_sections') \
-                .update({'embedding': vector}) \
-                .eq('id', row_id) \
-                .execute()
+            write_embedding(row, vector)
             
             print(f"  ✅ บันทึกมาตรา {section_num} สำเร็จ")
             
@@ -67,11 +69,191 @@ def process_batch():
 
     return True
 
-if __name__ == "__main__":
-    print("🚀 เริ่มต้นกระบวนการ Embedding...")
+def write_embedding(row, vector):
+    """
+    เขียนกลับเฉพาะ embedding + content_hash (hash ของข้อความที่ใช้ Embed) ไม่เขียนข้อความทับ
+    ถ้ามีคนแก้ข้อความระหว่างดึงกับเขียน hash จะไม่ตรงกับข้อความใหม่ --sync รอบหน้าจะ Embed ใหม่เอง
+    """
+    supabase.table('act_sections') \
+        .update({'embedding': list(vector), 'content_hash': text_hash(row['text_original'])}) \
+        .eq('id', row['id']) \
+        .execute()
+
+# --- โหมด Pipeline (ดึง -> Embed -> เขียนกลับ ทำงานซ้อนกัน) ---
+
+CHECKPOINT_FILE = ".ingest_checkpoint.json"
+_DONE = object()  # สัญญาณบอก Stage ถัดไปว่าข้อมูลหมดแล้ว
+
+def load_checkpoint(path):
+    """อ่าน id ล่าสุดที่บันทึกเสร็จแล้ว (ถ้าไม่มีไฟล์ = เริ่มจากต้น)"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_id", 0)
+
+def save_checkpoint(path, last_id):
+    # เขียนไฟล์ชั่วคราวก่อนแล้วค่อย replace กันไฟล์พังถ้าโปรแกรมตายกลางทาง
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "updated_at": time.time()}, f)
+    os.replace(tmp_path, path)
+
+def fetch_stage(out_q, batch_size, start_id, stop_event):
+    """Stage 1: ดึงแถวที่ยังไม่มี embedding เรียงตาม id (Keyset Pagination ไม่ต้องสแกนซ้ำ)"""
+    cursor = start_id
+    try:
+        while not stop_event.is_set():
+            rows = supabase.table('act_sections') \
+                .select('id, text_original, section_number') \
+                .is_('embedding', 'null') \
+                .gt('id', cursor) \
+                .order('id') \
+                .limit(batch_size) \
+                .execute().data
+            if not rows:
+                break
+            cursor = rows[-1]['id']
+            out_q.put(rows)
+    except Exception as e:
+        print(f"❌ Error การดึงข้อมูล: {e}")
+        stop_event.set()
+    finally:
+        out_q.put(_DONE)
+
+def embed_stage(in_q, out_q, stop_event):
+    """Stage 2: แปลงข้อความทั้ง Batch เป็น Vector ในครั้งเดียว (embed_documents)"""
+    while True:
+        rows = in_q.get()
+        if rows is _DONE:
+            break
+        if stop_event.is_set():
+            continue  # ระบายคิวให้ Stage ดึงข้อมูลจบได้
+        try:
+            last_id = rows[-1]['id']
+            valid_rows = []
+            for row in rows:
+                if not row['text_original'] or row['text_original'].strip() == "":
+                    print(f"⚠️ มาตรา {row['section_number']} ว่างเปล่า -> ข้าม")
+                    continue
+                valid_rows.append(row)
+            vectors = embeddings.embed_documents([row['text_original'] for row in valid_rows]) if valid_rows else []
+            out_q.put((last_id, valid_rows, vectors))
+        except Exception as e:
+            print(f"❌ Error ตอน Embedding: {e}")
+            stop_event.set()
+    out_q.put(_DONE)
+
+def write_stage(in_q, checkpoint_path, stop_event, stats):
+    """Stage 3: เขียน Vector กลับทีละมาตรา (เฉพาะ embedding + content_hash) แล้วบันทึก Checkpoint ทีละ Batch"""
     while True:
-        has_more = process_batch()
-        if not has_more:
+        item = in_q.get()
+        if item is _DONE:
             break
-        # พักหายใจนิดนึง กัน Database สำลัก
-        time.sleep(0.5)
\ No newline at end of file
+        if stop_event.is_set():
+            continue  # ระบายคิวให้ Stage ก่อนหน้าจบได้ แต่ไม่เขียนอะไรเพิ่ม
+        last_id, rows, vectors = item
+        try:
+            # update ทีละแถวแทน upsert ทั้งแถว: ไม่เขียนข้อความที่ดึงมาตอนต้นทับฉบับแก้ไขที่เข้ามาระหว่างทาง
+            for row, vector in zip(rows, vectors):
+                write_embedding(row, vector)
+            save_checkpoint(checkpoint_path, last_id)
+            stats['rows'] += len(rows)
+            print(f"  ✅ บันทึก {len(rows)} มาตรา (ถึง id {last_id}) รวม {stats['rows']}")
+        except Exception as e:
+            print(f"  ❌ เขียนกลับไม่สำเร็จ (id ถึง {last_id}): {e}")
+            stop_event.set()
+
+def run_pipeline(batch_size, checkpoint_path, resume=True):
+    start_id = load_checkpoint(checkpoint_path) if resume else 0
+    if start_id:
+        print(f"↩️  ทำต่อจาก Checkpoint (id > {start_id})")
+
+    # คิวขนาดจำกัด = Backpressure (ถ้า Stage หลังช้า Stage หน้าจะรอ ไม่กิน RAM)
+    fetched_q = queue.Queue(maxsize=2)
+    embedded_q = queue.Queue(maxsize=2)
+    stop_event = threading.Event()
+    stats = {'rows': 0}
+
+    threads = [
+        threading.Thread(target=fetch_stage, args=(fetched_q, batch_size, start_id, stop_event)),
+        threading.Thread(target=embed_stage, args=(fetched_q, embedded_q, stop_event)),
+        threading.Thread(target=write_stage, args=(embedded_q, checkpoint_path, stop_event, stats)),
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    rate = stats['rows'] / elapsed if elapsed > 0 else 0.0
+    print(f"\n📊 บันทึกทั้งหมด {stats['rows']} แถว ใน {elapsed:.1f} วินาที ({rate:.1f} rows/sec)")
+    if stop_event.is_set():
+        print("⚠️ หยุดกลางทางเพราะเกิด Error -> รันใหม่อีกครั้งจะทำต่อจาก Checkpoint")
+    else:
+        # ทำครบแล้ว ลบ Checkpoint ทิ้ง (ถ้ามี) รอบหน้าจะได้เริ่มสแกนใหม่
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        print("🎉 ไชโย! ทำครบทุกมาตราแล้วครับ")
+
+# --- โหมด Chunk (แบ่งมาตราเป็นช่วงย่อยแล้วเก็บลง Chunk Index ในเครื่อง) ---
+
+def run_chunking(batch_size, index_dir):
+    from local_index import fetch_sections
+    from chunk_index import build_chunk_index
+    from corpus_sync import read_version
+
+    start = time.perf_counter()
+    version = read_version(supabase)  # อ่านก่อนดึงข้อมูล (เหมือน local_index.refresh)
+    rows = fetch_sections(supabase, columns='id, section_number, text_original', require_embedding=False)
+    print(f"📦 ดึงข้อมูล {len(rows)} มาตรา -> แบ่ง Chunk (เฉพาะมาตราที่ข้อความเปลี่ยน)")
+    stats = build_chunk_index(rows, embeddings, index_dir, batch_size, version)
+    print(f"\n📊 {stats['sections']} มาตรา / {stats['chunks']} Chunk "
+          f"(ใช้ของเดิม {stats['reused']} มาตรา, แบ่งใหม่ {stats['rechunked']} มาตรา, "
+          f"Embed {stats['embedded']} Chunk) ใน {time.perf_counter() - start:.1f} วินาที")
+
+# --- โหมด Sync (Embed ใหม่เฉพาะมาตราที่ข้อความเปลี่ยน + เพิ่มเลขเวอร์ชันให้ Server โหลดใหม่เอง) ---
+
+def run_sync(batch_size):
+    from corpus_sync import sync_corpus
+
+    start = time.perf_counter()
+    stats = sync_corpus(supabase, embeddings, batch_size)
+    print(f"\n📊 Embed ใหม่ {stats['embedded']}/{stats['sections']} มาตรา ใน {time.perf_counter() - start:.1f} วินาที")
+    if stats['bumped']:
+        print(f"🔖 ข้อมูลกฎหมายเปลี่ยน -> เวอร์ชัน {stats['version']} (Server จะโหลด Index ใหม่เอง)")
+    else:
+        print(f"🎉 ข้อมูลเป็นปัจจุบันแล้ว (เวอร์ชัน {stats['version']})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="สร้าง Embedding ให้ตาราง act_sections")
+    parser.add_argument("--pipeline", action="store_true", help="โหมด Batch + Pipeline (เร็วกว่า)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Embed ใหม่เฉพาะมาตราที่ข้อความเปลี่ยน (content_hash) แล้วเพิ่มเลขเวอร์ชัน")
+    parser.add_argument("--batch-size", type=int, default=32, help="จำนวนแถวต่อ Batch (โหมด --pipeline / --sync)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="ไฟล์ Checkpoint สำหรับทำต่อ")
+    parser.add_argument("--no-resume", action="store_true", help="ไม่สนใจ Checkpoint เดิม เริ่มใหม่ตั้งแต่ต้น")
+    parser.add_argument("--refresh-index", action="store_true", help="สร้าง Local Index ใหม่หลัง Embedding เสร็จ")
+    parser.add_argument("--chunks", action="store_true", help="แบ่งมาตราเป็น Chunk แล้วสร้าง Chunk Index (Incremental)")
+    parser.add_argument("--chunk-dir", default=None, help="โฟลเดอร์ Chunk Index (ค่าเริ่มต้น CHUNK_INDEX_DIR)")
+    args = parser.parse_args()
+
+    print("🚀 เริ่มต้นกระบวนการ Embedding...")
+    if args.chunks:
+        from chunk_index import CHUNK_INDEX_DIR
+        run_chunking(args.batch_size, args.chunk_dir or CHUNK_INDEX_DIR)
+    elif args.sync:
+        run_sync(args.batch_size)
+    elif args.pipeline:
+        run_pipeline(args.batch_size, args.checkpoint, resume=not args.no_resume)
+    else:
+        while True:
+            has_more = process_batch()
+            if not has_more:
+                break
+            # พักหายใจนิดนึง กัน Database สำลัก
+            time.sleep(0.5)
+
+    if args.refresh_index:
+        from local_index import refresh
+        refresh()
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Lexical Search (BM25) สำหรับกฎหมายแรงงาน + การรวมผลกับ Dense Search
+
+- ตัดคำ text_original ด้วย thai_text (newmm + Dictionary กฎหมายแรงงาน) แล้วสร้าง Inverted Index แบบ BM25
+  เก็บเป็น CSR Arrays ของ NumPy (offsets / doc_ids / weights) ไม่ใช้ dict ซ้อน dict ให้เปลือง RAM
+- คำถามที่ระบุเลขมาตราตรงๆ (เช่น "มาตรา 118") ไปดึงจาก Dictionary ได้เลย ไม่ต้อง Embed
+- รวมผล Dense + Lexical ด้วย Reciprocal Rank Fusion (RRF)
+"""
+import re
+import math
+import functools
+from collections import Counter
+
+import numpy as np
+from pythainlp.corpus import thai_stopwords
+
+import thai_text
+
+# ค่ามาตรฐานของ BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60  # ค่าคงที่ของ RRF (ยิ่งมากยิ่งลดน้ำหนักอันดับต้นๆ)
+
+# จับ "มาตรา 118", "มาตรา ๑๑๘", "ม.118", "มาตรา 75/1"
+SECTION_PATTERN = re.compile(r"(?:มาตรา|ม\.)\s*([0-9๐-๙]+(?:/[0-9๐-๙]+)?)")
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+
+
+@functools.lru_cache(maxsize=1)
+def _stopwords():
+    # โหลดตอนใช้ครั้งแรก (ไม่ให้การ Import โมดูลนี้ช้า)
+    return frozenset(thai_stopwords())
+
+
+def clean_tokens(tokens):
+    """ตัดช่องว่าง / เครื่องหมาย / Stopword ออก และทำเป็นตัวพิมพ์เล็ก"""
+    stopwords = _stopwords()
+    result = []
+    for token in tokens:
+        token = token.strip().lower()
+        if not token or token in stopwords:
+            continue
+        if not any(ch.isalnum() for ch in token):
+            continue
+        result.append(token)
+    return result
+
+
+def tokenize(text: str):
+    """ตัดคำสำหรับ Lexical Search (ใช้ทั้งตอนสร้าง Index และตอนค้น)"""
+    return clean_tokens(thai_text.tokenize(text))
+
+
+def tokenize_documents(texts):
+    """ตัดคำเอกสารทีละมากๆ (หลาย Process ถ้าเยอะพอ ไม่เก็บลง Cache ของคำถาม)"""
+    return [clean_tokens(tokens) for tokens in thai_text.tokenize_batch(texts)]
+
+
+def extract_section_numbers(text: str):
+    """ดึงเลขมาตราที่ผู้ใช้พิมพ์มา (แปลงเลขไทยเป็นเลขอารบิก)"""
+    return [match.translate(THAI_DIGITS) for match in SECTION_PATTERN.findall(text)]
+
+
+class BM25Index:
+    """Inverted Index แบบ BM25 ที่คำนวณคะแนนของแต่ละ Posting ไว้ล่วงหน้า"""
+
+    def __init__(self, rows, tokenized_docs=None):
+        """
+        rows: list ของ dict ที่มี id / section_number / text_original (รูปแบบเดียวกับ act_sections)
+        tokenized_docs: ผลตัดคำของแต่ละแถว (ถ้าไม่ส่งมาจะตัดคำให้เอง)
+        """
+        self.rows = rows
+        if tokenized_docs is None:
+            tokenized_docs = tokenize_documents(row.get('text_original') or "" for row in rows)
+
+        # Dictionary ตรงสำหรับค้นด้วยเลขมาตรา
+        self.by_section = {str(row['section_number']): row for row in rows}
+
+        doc_lengths = np.array([len(tokens) for tokens in tokenized_docs], dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+        # term -> list ของ (doc_index, tf)
+        postings = {}
+        for doc_index, tokens in enumerate(tokenized_docs):
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_index, tf))
+
+        n_docs = len(rows)
+        self.vocabulary = {}
+        offsets = [0]
+        doc_ids = []
+        weights = []
+        for term_id, (term, plist) in enumerate(sorted(postings.items())):
+            self.vocabulary[term] = term_id
+            idf = math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_index, tf in plist:
+                norm = 1 - BM25_B + BM25_B * doc_lengths[doc_index] / max(avg_length, 1e-9)
+                doc_ids.append(doc_index)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm))
+            offsets.append(len(doc_ids))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup_sections(self, question: str):
+        """ถ้าคำถามระบุเลขมาตราที่มีอยู่จริง คืนมาตรานั้นเลย (ไม่ต้อง Embed)"""
+        results = []
+        for number in dict.fromkeys(extract_section_numbers(question)):  # ตัดเลขซ้ำ คงลำดับเดิม
+            row = self.by_section.get(number)
+            if row is not None:
+                results.append({**row, "similarity": 1.0})
+        return results
+
+    def search(self, tokens, match_count: int = 10):
+        """คืนมาตราที่ได้คะแนน BM25 สูงสุด (tokens = ผลตัดคำของคำถาม)"""
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+        for term in set(clean_tokens(tokens)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+
+        hit_count = int(np.count_nonzero(scores))
+        k = min(match_count, hit_count)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.rows[int(i)], "bm25_score": float(scores[i])} for i in top]
+
+
+def reciprocal_rank_fusion(result_lists, match_count: int = 5, k: int = RRF_K):
+    """
+    รวมผลลัพธ์หลายชุด (เช่น Dense + BM25) ด้วย RRF: score = sum(1 / (k + rank))
+    มาตราที่ติดอันดับดีในหลายชุดจะขึ้นมาก่อน
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, row in enumerate(results, start=1):
+            key = str(row.get('section_number'))
+            entry = fused.setdefault(key, {**row, "rrf_score": 0.0})
+            entry.update({name: value for name, value in row.items() if name not in entry})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda row: row["rrf_score"], reverse=True)
+    return ranked[:match_count]
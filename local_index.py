@@ -0,0 +1,196 @@
+"""
+Local Vector Index: เก็บ Snapshot ของตาราง act_sections ไว้ในเครื่อง
+แล้วค้นหาด้วย Cosine Similarity (NumPy matmul) แทนการยิง RPC match_sections_v2
+
+ไฟล์ใน Snapshot:
+- embeddings.f32 : Matrix float32 ขนาด (จำนวนมาตรา x 1024) ที่ Normalize แล้ว (เปิดแบบ memmap)
+- meta.json      : id / section_number / text_original ของแต่ละแถว (ลำดับเดียวกับ Matrix)
+                   + ผลตัดคำสำหรับ BM25 (ตัดแบบขนานตอนสร้าง Server จะได้ไม่ต้องตัดใหม่ตอนเริ่ม)
+
+วิธีสร้าง/อัปเดต Snapshot (รันหลัง ingest.py ทุกครั้ง):
+    python local_index.py refresh
+"""
+import os
+import sys
+import json
+import time
+import shutil
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "index_snapshot")
+MATRIX_FILE = "embeddings.f32"
+META_FILE = "meta.json"
+PAGE_SIZE = 500  # PostgREST จำกัดจำนวนแถวต่อครั้ง เลยต้องดึงทีละหน้า
+
+
+def _parse_vector(value):
+    # pgvector ผ่าน PostgREST ส่งมาเป็น String "[0.1,0.2,...]"
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def fetch_sections(supabase, columns: str = 'id, section_number, text_original, embedding',
+                   require_embedding: bool = True):
+    """ดึงทุกมาตรา (เรียงตาม id) ค่าเริ่มต้นเอาเฉพาะแถวที่มี embedding แล้ว"""
+    rows = []
+    cursor = 0
+    while True:
+        query = supabase.table('act_sections').select(columns)
+        if require_embedding:
+            query = query.not_.is_('embedding', 'null')
+        page = query \
+            .gt('id', cursor) \
+            .order('id') \
+            .limit(PAGE_SIZE) \
+            .execute().data
+        if not page:
+            break
+        rows.extend(page)
+        cursor = page[-1]['id']
+    return rows
+
+
+def build_snapshot(rows, index_dir: str = LOCAL_INDEX_DIR, corpus_version: int = None):
+    """
+    เขียน Snapshot ใหม่ลงโฟลเดอร์ชั่วคราวก่อน แล้วค่อยสลับเข้าที่เดิม (Server ที่อ่านอยู่จะไม่เจอไฟล์ครึ่งๆ กลางๆ)
+    corpus_version: เลขเวอร์ชันจาก corpus_state ตอนเริ่มดึงข้อมูล (Server ใช้เช็คว่า Snapshot ตามทันหรือยัง)
+    """
+    matrix = np.asarray([_parse_vector(row['embedding']) for row in rows], dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("ไม่มีข้อมูล embedding ให้สร้าง Index")
+
+    # Normalize ไว้ล่วงหน้า ตอนค้นจะได้ใช้ dot product = cosine similarity ได้เลย
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+
+    meta = {
+        "built_at": time.time(),
+        "corpus_version": corpus_version,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "ids": [row['id'] for row in rows],
+        "section_numbers": [row['section_number'] for row in rows],
+        "texts": [row['text_original'] for row in rows],
+    }
+    meta.update(tokenize_snapshot(meta["texts"]))
+
+    write_snapshot(index_dir, matrix, meta)
+    return meta
+
+
+def tokenize_snapshot(texts) -> dict:
+    """ตัดคำทุกมาตราด้วย Dictionary ที่รวมคำนิยามของ Snapshot นี้ (เก็บเวอร์ชันไว้เช็คตอนโหลด)"""
+    import thai_text
+    from lexical_search import tokenize_documents
+
+    processor = thai_text.load_corpus_vocabulary(texts)
+    return {"dictionary_version": processor.version, "lexical_tokens": tokenize_documents(texts)}
+
+
+def normalize_rows(vectors):
+    """แปลง Vector คำถาม (1 ตัวหรือหลายตัว) เป็น Matrix float32 ที่ Normalize แล้ว"""
+    queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+
+def top_k_rows(scores, k: int):
+    """Top-k ของทุกแถวพร้อมกัน (argpartition ตามแกนแถว แล้วเรียงแค่ k ตัว) คืน index ขนาด (จำนวนคำถาม, k)"""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def write_snapshot(index_dir: str, matrix, meta: dict, matrix_file: str = MATRIX_FILE, meta_file: str = META_FILE):
+    """เขียนลงโฟลเดอร์ชั่วคราวแล้วสลับเข้าที่เดิม (ใช้ร่วมกับ chunk_index)"""
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.ascontiguousarray(matrix, dtype=np.float32).tofile(os.path.join(tmp_dir, matrix_file))
+    with open(os.path.join(tmp_dir, meta_file), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    old_dir = index_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(index_dir):
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class LocalVectorIndex:
+    """Index ใน Memory สำหรับค้นหามาตราที่ใกล้เคียงกับคำถาม"""
+
+    def __init__(self, index_dir: str = LOCAL_INDEX_DIR):
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.ids = meta["ids"]
+        self.section_numbers = meta["section_numbers"]
+        self.texts = meta["texts"]
+        self.built_at = meta["built_at"]
+        self.corpus_version = meta.get("corpus_version")  # Snapshot รุ่นเก่า / ไม่ได้ใช้ corpus_state = None
+        self.dictionary_version = meta.get("dictionary_version")
+        self.lexical_tokens = meta.get("lexical_tokens")  # Snapshot รุ่นเก่าไม่มี
+        self.matrix = np.memmap(
+            os.path.join(index_dir, MATRIX_FILE),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["count"], meta["dim"]),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, i: int, similarity: float) -> dict:
+        # รูปแบบเดียวกับผลลัพธ์ของ RPC match_sections_v2
+        return {
+            "id": self.ids[i],
+            "section_number": self.section_numbers[i],
+            "text_original": self.texts[i],
+            "similarity": similarity,
+        }
+
+    def search(self, query_vector, match_threshold: float = 0.5, match_count: int = 5):
+        """คืนมาตราที่ Cosine Similarity >= match_threshold สูงสุด match_count อันดับ"""
+        return self.search_batch([query_vector], match_threshold, match_count)[0]
+
+    def search_batch(self, query_vectors, match_threshold: float = 0.5, match_count: int = 5):
+        """ค้นหลายคำถามใน matmul ครั้งเดียว (จำนวนคำถาม x จำนวนมาตรา) คืน list ของผลแต่ละคำถาม"""
+        queries = normalize_rows(query_vectors)
+        scores = queries @ self.matrix.T
+        k = min(match_count, scores.shape[1])
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        # argpartition หา Top-k โดยไม่ต้องเรียงทั้งหมด แล้วค่อยเรียงแค่ k ตัว
+        top = top_k_rows(scores, k)
+        return [
+            [self._row(int(i), float(row_scores[i])) for i in row_top if row_scores[i] >= match_threshold]
+            for row_scores, row_top in zip(scores, top)
+        ]
+
+
+def refresh(index_dir: str = LOCAL_INDEX_DIR):
+    """ดึงข้อมูลล่าสุดจาก Supabase แล้วสร้าง Snapshot ใหม่"""
+    from supabase import create_client
+    from corpus_sync import read_version
+
+    supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
+
+    print("⏳ กำลังดึงข้อมูล act_sections จาก Supabase...")
+    start = time.perf_counter()
+    # อ่านเวอร์ชันก่อนดึงข้อมูล: ถ้ามี Sync แทรกระหว่างนี้ Snapshot จะแค่ดูเก่ากว่าความจริง (Refresh รอบหน้าก็ตามทัน)
+    version = read_version(supabase)
+    rows = fetch_sections(supabase)
+    meta = build_snapshot(rows, index_dir, version)
+    print(f"✅ สร้าง Local Index {meta['count']} มาตรา ({meta['dim']} มิติ, เวอร์ชัน {version}) "
+          f"ที่ '{index_dir}' ใน {time.perf_counter() - start:.1f} วินาที")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "refresh":
+        print("วิธีใช้: python local_index.py refresh")
+        sys.exit(1)
+    refresh()
@@ -0,0 +1,189 @@
+"""
+Metrics แบบ Prometheus (เขียนเองแบบเบาๆ ไม่ต้องติดตั้ง prometheus_client เพิ่ม)
+- Counter   : ค่าที่นับขึ้นอย่างเดียว (จำนวน Request, Token)
+- Gauge     : ค่าปัจจุบัน (ขนาด Cache)
+- Histogram : การกระจายของเวลา (ดู p50 / p99 ได้ใน Prometheus/Grafana)
+"""
+import threading
+
+# Bucket ของเวลา (วินาที) ครอบตั้งแต่ตัดคำ (ms) ไปจนถึง LLM ตอบยาวๆ (นาที)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    render = Counter.render
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, state["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, ("le", bound))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {state['count']}")
+                plain = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{plain} {state['sum']}")
+                lines.append(f"{self.name}_count{plain} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._add(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._add(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, label_names, buckets))
+
+    def add_collector(self, func):
+        """ฟังก์ชันที่จะถูกเรียกก่อน render ทุกครั้ง (ใช้อัปเดต Gauge จากสถิติของ Cache ฯลฯ)"""
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Metrics หลักของ API ---
+REQUESTS = registry.counter("chat_requests_total", "Chat requests by endpoint and outcome", ("endpoint", "status"))
+REQUEST_SECONDS = registry.histogram("chat_request_seconds", "End-to-end request latency", ("endpoint",))
+STAGE_SECONDS = registry.histogram("chat_stage_seconds", "Latency of each pipeline stage", ("endpoint", "stage"))
+LLM_TOKENS = registry.counter("llm_tokens_total", "Estimated LLM tokens (tiktoken)", ("endpoint", "kind"))
+CACHE_HITS = registry.gauge("cache_hits", "Cache hits since startup", ("cache",))
+CACHE_MISSES = registry.gauge("cache_misses", "Cache misses since startup", ("cache",))
+CACHE_SIZE = registry.gauge("cache_entries", "Entries currently held in cache", ("cache",))
+STARTUP_PHASE_SECONDS = registry.gauge("startup_phase_seconds", "Duration of each startup phase", ("phase",))
+
+SPECULATIVE_SAVED_SECONDS = registry.counter(
+    "speculative_saved_seconds_total", "Retrieval time hidden behind query rewriting", ("endpoint",))
+REWRITE_SKIPPED = registry.counter("rewrite_skipped_total", "Follow-ups answered without rewriting", ("endpoint",))
+ADMISSION_QUEUE_DEPTH = registry.gauge("admission_queue_depth", "Requests waiting for a stage slot", ("stage",))
+ADMISSION_IN_FLIGHT = registry.gauge("admission_in_flight", "Requests currently running in a stage", ("stage",))
+ADMISSION_WAIT_SECONDS = registry.histogram("admission_wait_seconds", "Time spent queued for a stage slot", ("stage",))
+ADMISSION_REJECTED = registry.counter("admission_rejected_total", "Requests rejected by admission control",
+                                      ("stage", "reason"))
+CONTEXT_TOKENS_SAVED = registry.counter(
+    "context_tokens_saved_total", "Prompt tokens removed by trimming and deduplication", ("endpoint",))
+CANCELLED_REQUESTS = registry.counter(
+    "chat_cancelled_total", "Requests stopped early (client disconnect or deadline)", ("endpoint", "reason", "stage"))
+CANCELLED_TOKENS_SAVED = registry.counter(
+    "llm_tokens_saved_total", "Estimated LLM tokens not spent because a request was stopped early", ("endpoint", "kind"))
+CORPUS_VERSION = registry.gauge("corpus_version", "Corpus version currently served (corpus_state.version)")
+CORPUS_RELOADS = registry.counter("corpus_reloads_total", "Live corpus reloads by outcome", ("result",))
+CORPUS_RELOAD_SECONDS = registry.histogram("corpus_reload_seconds", "Time to rebuild and swap corpus indexes",
+                                           buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+
+def observe_request(endpoint: str, timer, status: str = "ok"):
+    """บันทึกเวลาทุก Stage ของ Request หนึ่งลง Histogram (timer = timing.StageTimer)"""
+    REQUESTS.inc(endpoint=endpoint, status=status)
+    REQUEST_SECONDS.observe(timer.total_ms() / 1000, endpoint=endpoint)
+    for stage, ms in timer.stages.items():
+        # 2 ตัวนี้ไม่ใช่ "เวลาที่รอ" จริง เลยแยกไปนับเป็น Counter
+        if stage == "speculative_saved":
+            SPECULATIVE_SAVED_SECONDS.inc(ms / 1000, endpoint=endpoint)
+        elif stage == "rewrite_skipped":
+            REWRITE_SKIPPED.inc(endpoint=endpoint)
+        else:
+            STAGE_SECONDS.observe(ms / 1000, endpoint=endpoint, stage=stage)
@@ -0,0 +1,212 @@
+"""
+RAG Pipeline กลาง: สร้างครั้งเดียวตอนเริ่มระบบ ใช้ร่วมกันทั้ง api.py / batch_ask.py / brain.py / search_engine.py
+
+- Prompt สร้างไว้ล่วงหน้าครั้งเดียวตอน Import: ส่วนที่ไม่เปลี่ยน (บทบาททนาย + คำแนะนำการตอบ) อยู่ใน System Message
+  ต้น Prompt เสมอ ส่วนที่เปลี่ยนทุก Request (ข้อมูลกฎหมาย + คำถาม) อยู่ท้าย -> ทุก Request ขึ้นต้นเหมือนกันทุกตัวอักษร
+  Provider ที่มี Prompt / KV Cache (Prefix Caching ของ Typhoon, Ollama ที่เก็บ KV ของ Context เดิมไว้) ใช้ซ้ำได้
+- Chain (prompt | llm | parser) ของการตอบและการ Rewrite คำถามสร้างครั้งเดียวใน RagPipeline ไม่สร้างใหม่ทุก Request
+- Backend เปลี่ยนได้:
+    Retriever: SupabaseRetriever (RPC match_sections_v2) / LocalRetriever (Local Index / Chunk Index ในเครื่อง)
+    LLM: typhoon (ChatOpenAI ชี้ไป Typhoon API, ใช้ใน api.py) / ollama (ChatOllama ในเครื่อง, ใช้ใน brain.py)
+"""
+import os
+import asyncio
+import inspect
+
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from context_builder import build_context
+
+load_dotenv()
+# "supabase" (RPC), "local" (Snapshot ในเครื่อง) หรือ "chunks" (Chunk Index หลาย Vector ต่อมาตรา)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "supabase")
+RETRIEVAL_BACKENDS = ("supabase", "local", "chunks")
+TYPHOON_MODEL = os.getenv("TYPHOON_MODEL", "typhoon-v2.5-30b-a3b-instruct")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+LLM_BACKENDS = ("typhoon", "ollama")
+# RPC ค้นหาที่ยิงพร้อมกันสูงสุดต่อ 1 Batch (/chat_batch) ไม่ให้ Batch ใหญ่กิน Connection Pool จน Request อื่นต้องรอ
+BATCH_SEARCH_CONCURRENCY = int(os.getenv("BATCH_SEARCH_CONCURRENCY", "8"))
+REWRITE_HISTORY_MESSAGES = 4  # ดูย้อนหลังแค่ 2 คู่ล่าสุดพอ (ประหยัด Token)
+
+NO_DOCS_ANSWER = "ขออภัยครับ ไม่พบข้อมูลกฎหมายที่เกี่ยวข้องกับเรื่องนี้ในฐานข้อมูล"
+
+# ส่วนคงที่ของ Prompt (ห้ามใส่ค่าที่เปลี่ยนทุก Request เช่น วันที่ / id ไม่งั้น Prefix Cache จะไม่ Hit)
+ANSWER_SYSTEM_PROMPT = """คุณคือทนายความผู้เชี่ยวชาญกฎหมายแรงงานไทย (Thai Labour Law Expert)
+หน้าที่ของคุณคือให้คำปรึกษาแก่ลูกจ้างอย่างถูกต้อง สุภาพ และเข้าใจง่าย
+
+คำแนะนำในการตอบ:
+1. ตอบคำถามโดยอ้างอิงจาก "ข้อมูลกฎหมาย" ที่ให้ไปเท่านั้น
+2. ถ้าข้อมูลไม่เพียงพอ ให้บอกตรงๆ ว่าไม่ทราบ อย่าแต่งเรื่องเอง
+3. อ้างอิงเลขมาตราเสมอเมื่อกล่าวถึงข้อกฎหมาย (เช่น "ตามมาตรา 32...")
+4. สรุปใจความสำคัญให้เข้าใจง่ายสำหรับคนทั่วไป"""
+
+ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", ANSWER_SYSTEM_PROMPT),
+    ("human", "ข้อมูลกฎหมายที่อ้างอิง:\n{context}\n\nคำถาม: {question}\n\nคำตอบ:"),
+])
+
+REWRITE_SYSTEM_PROMPT = """จงเขียน "คำถามใหม่" ให้เป็นประโยคที่สมบูรณ์และเข้าใจได้ด้วยตัวเอง (Standalone Question)
+โดยรวมบริบทจากประวัติการสนทนาเข้าไปด้วย เพื่อให้สามารถนำไปค้นหาในฐานข้อมูลกฎหมายได้แม่นยำ
+(ตอบเฉพาะประโยคคำถามใหม่เท่านั้น ไม่ต้องเกริ่นนำ ไม่ต้องใส่เครื่องหมายคำพูด)"""
+
+REWRITE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", REWRITE_SYSTEM_PROMPT),
+    ("human", "จากบทสนทนาต่อไปนี้:\n{chat_history}\n\nและคำถามล่าสุด: \"{question}\"\n\nคำถามใหม่:"),
+])
+
+
+def create_llm(backend: str = "typhoon", async_client=None):
+    """สร้าง Chat Model ตาม Backend (typhoon ใช้ Connection Pool กลางของ api.py ได้)"""
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"ไม่รู้จัก LLM Backend '{backend}' (ใช้ได้: {' / '.join(LLM_BACKENDS)})")
+    if backend == "ollama":
+        # ถ้าเครื่องช้า ให้ลองเปลี่ยน OLLAMA_MODEL เป็น 'gemma2' หรือ 'llama3' ดูครับ
+        from langchain_ollama import ChatOllama
+        return ChatOllama(model=OLLAMA_MODEL, temperature=0.3)
+
+    # ใช้ ChatOpenAI แต่ชี้ไปที่ Server ของ Typhoon
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        base_url=os.getenv("TYPHOON_BASE_URL"), # https://api.opentyphoon.ai/v1
+        api_key=os.getenv("TYPHOON_API_KEY"),
+        model=TYPHOON_MODEL,                     # โมเดลตัวเก่งสุด
+        temperature=0.3,                         # ความคิดสร้างสรรค์ต่ำหน่อย เพื่อความแม่นยำทางกฎหมาย
+        max_tokens=4096,                         # เพิ่มพื้นที่ให้ AI ตอบยาวๆ ได้ ไม่ error
+        http_async_client=async_client,          # ใช้ Connection Pool กลาง
+        max_retries=0 if async_client is not None else 2,  # Transport กลาง Retry ให้แล้ว ไม่ต้องซ้อน
+    )
+
+
+class SupabaseRetriever:
+    """ค้นด้วย RPC match_sections_v2 (Client แบบ Sync ใช้ search, แบบ Async ใช้ asearch)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _query(self, query_vector, match_count: int, match_threshold: float):
+        return self.client.rpc(
+            "match_sections_v2",
+            {
+                "query_embedding": query_vector,
+                "match_threshold": match_threshold,  # ความเหมือนขั้นต่ำ (ปกติ 50%)
+                "match_count": match_count           # เอามา N อันดับแรก
+            }
+        ).execute()
+
+    def search(self, query_vector, match_count: int = 5, match_threshold: float = 0.5):
+        return self._query(query_vector, match_count, match_threshold).data
+
+    async def asearch(self, query_vector, match_count: int = 5, match_threshold: float = 0.5):
+        response = self._query(query_vector, match_count, match_threshold)
+        if inspect.isawaitable(response):
+            response = await response
+        return response.data
+
+    async def asearch_batch(self, query_vectors, match_count: int = 5, match_threshold: float = 0.5,
+                            concurrency: int = BATCH_SEARCH_CONCURRENCY):
+        """
+        ยิง RPC ของทุกคำถามพร้อมกันไม่เกิน concurrency ตัว (ใช้ Connection Pool เดียวกัน)
+        คำถามที่ค้นไม่สำเร็จได้ Exception แทนผลในตำแหน่งนั้น คำถามอื่นยังได้ผลตามปกติ
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def search_one(vector):
+            async with semaphore:
+                return await self.asearch(vector, match_count, match_threshold)
+
+        return await asyncio.gather(*(search_one(vector) for vector in query_vectors), return_exceptions=True)
+
+
+class LocalRetriever:
+    """ค้นใน Snapshot ในเครื่อง (LocalVectorIndex / ChunkIndex) ไม่ต้องยิง Network"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def search(self, query_vector, match_count: int = 5, match_threshold: float = 0.5):
+        return self.index.search(query_vector, match_threshold=match_threshold, match_count=match_count)
+
+    async def asearch(self, query_vector, match_count: int = 5, match_threshold: float = 0.5):
+        # Matrix เล็ก (ไม่กี่พันมาตรา) คูณเสร็จในระดับ ms รันใน Event Loop ได้เลย
+        return self.search(query_vector, match_count, match_threshold)
+
+    async def asearch_batch(self, query_vectors, match_count: int = 5, match_threshold: float = 0.5):
+        """ทุกคำถามในการคูณ Matrix ครั้งเดียว (งานใหญ่ -> ส่งไป Worker Pool)"""
+        from concurrency import run_cpu_bound
+        return await run_cpu_bound(self.index.search_batch, query_vectors, match_threshold, match_count)
+
+
+def create_retriever(backend: str = RETRIEVAL_BACKEND, supabase_client=None):
+    """สร้าง Retriever ตาม RETRIEVAL_BACKEND (local / chunks ต้องสร้าง Snapshot ไว้ก่อน)"""
+    if backend not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"ไม่รู้จัก RETRIEVAL_BACKEND '{backend}' (ใช้ได้: {' / '.join(RETRIEVAL_BACKENDS)})")
+    if backend == "local":
+        from local_index import LocalVectorIndex
+        return LocalRetriever(LocalVectorIndex())
+    if backend == "chunks":
+        from chunk_index import ChunkIndex
+        return LocalRetriever(ChunkIndex())
+    return SupabaseRetriever(supabase_client)
+
+
+def format_history(history) -> str:
+    """แปลง History List ให้เป็นข้อความ (เฉพาะ REWRITE_HISTORY_MESSAGES ข้อความล่าสุด)"""
+    history_text = ""
+    for msg in history[-REWRITE_HISTORY_MESSAGES:]:
+        role = "User" if msg['role'] == 'user' else "AI"
+        history_text += f"{role}: {msg['content']}\n"
+    return history_text
+
+
+class RagPipeline:
+    """
+    Retrieval -> Context -> Generation ที่ใช้ร่วมกันทุกที่ (สร้างครั้งเดียวต่อ Process)
+    embeddings ใช้เฉพาะ retrieve (CLI) ส่วน api.py ค้นเองแบบ Hybrid + Rerank + Cache แล้วเรียก retriever ตรงๆ
+    """
+
+    def __init__(self, llm, retriever, embeddings=None, match_threshold: float = 0.5, match_count: int = 5):
+        self.llm = llm
+        self.retriever = retriever
+        self.embeddings = embeddings
+        self.match_threshold = match_threshold
+        self.match_count = match_count
+        self.answer_chain = ANSWER_PROMPT | llm | StrOutputParser()
+        self.rewrite_chain = REWRITE_PROMPT | llm | StrOutputParser()
+
+    # --- Retrieval ---
+
+    def retrieve(self, question: str):
+        query_vector = self.embeddings.embed_query(question)
+        return self.retriever.search(query_vector, self.match_count, self.match_threshold)
+
+    # --- Context + Generation ---
+
+    @staticmethod
+    def build_context(question: str, retrieved_docs) -> dict:
+        return build_context(question, retrieved_docs)
+
+    @staticmethod
+    def prompt_text(context: str, question: str) -> str:
+        """Prompt ทั้งหมดเป็นข้อความ (ไว้นับ Token)"""
+        return ANSWER_PROMPT.format(context=context, question=question)
+
+    def generate(self, context: str, question: str) -> str:
+        return self.answer_chain.invoke({"context": context, "question": question})
+
+    async def agenerate(self, context: str, question: str) -> str:
+        return await self.answer_chain.ainvoke({"context": context, "question": question})
+
+    def astream(self, context: str, question: str):
+        return self.answer_chain.astream({"context": context, "question": question})
+
+    # --- Query Rewriting ---
+
+    async def arewrite(self, question: str, history) -> str:
+        """เขียนคำถามต่อเนื่องให้เข้าใจได้ด้วยตัวเองจากประวัติ (ไม่มีประวัติคืนคำถามเดิม)"""
+        if not history:
+            return question
+        new_question = await self.rewrite_chain.ainvoke({"chat_history": format_history(history), "question": question})
+        return new_question.strip()
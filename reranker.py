@@ -0,0 +1,192 @@
+"""
+Rerank ด้วย Cross-encoder (bge-reranker) หลังค้นหา (ไม่บังคับ: RERANK_ENABLED=true)
+
+- ค้นจาก Index แบบถูกๆ ให้ได้ผู้สมัครกว้างๆ ก่อน (RERANK_POOL มาตรา, threshold ต่ำลงเป็น RERANK_POOL_THRESHOLD)
+- Cross-encoder อ่านคำถามคู่กับข้อความมาตราจริงๆ ให้คะแนนทุกคู่ใน Forward Pass เดียว (Batch เดียว)
+  ข้อความมาตราตัดเหลือ RERANK_MAX_CHARS ตัวอักษร (ต้นมาตรามักเป็นหลักการ) คุมเวลาบน CPU
+- จำคะแนนของคู่ (คำถาม, มาตรา) ไว้แบบ LRU (RERANK_CACHE_SIZE) คำถามซ้ำ / มาตราเดิมไม่ต้องรันใหม่
+- ส่งต่อให้ LLM แค่ RERANK_TOP_K มาตราที่คะแนนไม่ต่ำกว่า RERANK_MIN_SCORE (ตัดมาตราที่ไม่เกี่ยว ประหยัด Token)
+- เกินงบเวลา RERANK_TIMEOUT_MS -> ใช้ลำดับเดิมจาก Index (คะแนนที่คำนวณเสร็จทีหลังยังเก็บลง Cache)
+- รันใน Thread ของตัวเอง (ไม่กิน Worker Pool ของ Embedding / ตัดคำ) ค้างได้ไม่เกิน RERANK_MAX_INFLIGHT งาน
+  งานที่เกินเวลาไปแล้วแต่ Model ยังรันอยู่ก็นับ เต็มเมื่อไหร่ Request ถัดไปข้าม Rerank ทันที
+  (ไม่ต่อคิวหลังงานที่ค้างจนเกินเวลาตามกันไปหมด)
+- รายงานว่า Rerank เปลี่ยนผลไปแค่ไหน (มาตราที่ถูกดันขึ้นมาจากนอก Top-k เดิม / อันดับ 1 เปลี่ยนไหม) ที่ /metrics
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from metrics import registry
+from thai_text import cache_key
+
+load_dotenv()
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-v2-m3")     # รองรับภาษาไทย
+RERANK_POOL = int(os.getenv("RERANK_POOL", "30"))                        # จำนวนผู้สมัครที่ดึงจาก Index
+RERANK_POOL_THRESHOLD = float(os.getenv("RERANK_POOL_THRESHOLD", "0.3"))  # match_threshold ตอนดึงผู้สมัคร
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "5"))                       # มาตราที่ส่งต่อให้ LLM
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.05"))          # คะแนน (0-1) ต่ำกว่านี้ไม่ส่งต่อ
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", "600"))             # ตัดข้อความมาตราก่อนเข้า Model
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "384"))           # Token สูงสุดต่อคู่ (คำถาม + มาตรา)
+RERANK_TIMEOUT_MS = float(os.getenv("RERANK_TIMEOUT_MS", "1500"))        # เกินนี้ใช้ลำดับเดิม
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "8192"))          # จำนวนคู่ที่จำคะแนนไว้
+RERANK_MAX_INFLIGHT = int(os.getenv("RERANK_MAX_INFLIGHT", "2"))         # งานที่รัน + รอคิวได้พร้อมกัน
+MAX_FORWARD_PAIRS = 256  # /chat_batch ส่งมาทีละหลายพันคู่ แบ่ง Batch ไม่ให้ Memory พุ่ง (คำถามเดียว = Pass เดียว)
+
+RERANK_PAIRS = registry.histogram(
+    "rerank_pairs", "Query-section pairs scored per model forward pass", buckets=(1, 5, 10, 20, 30, 60, 120))
+RERANK_DISPLACED = registry.histogram(
+    "rerank_displaced_sections", "Sections in the final top-k that were outside the index top-k",
+    buckets=(0, 1, 2, 3, 4, 5))
+RERANK_TOP1_CHANGED = registry.counter("rerank_top1_changed_total", "Reranks that changed the first section")
+RERANK_DROPPED = registry.counter("rerank_dropped_sections_total", "Sections dropped for scoring below RERANK_MIN_SCORE")
+RERANK_SECONDS = registry.histogram("rerank_seconds", "Cross-encoder rerank latency (including cache lookups)")
+RERANK_FALLBACK = registry.counter("rerank_fallback_total", "Reranks skipped in favour of index order", ("reason",))
+RERANK_INFLIGHT = registry.gauge("rerank_inflight", "Rerank jobs running or queued (including timed-out ones)")
+
+
+def section_key(doc: dict) -> str:
+    """Key ของมาตราใน Cache: เลขมาตรา + Hash ของข้อความ (แก้ข้อความแล้วคะแนนเก่าใช้ไม่ได้)"""
+    text = doc.get("text_original") or ""
+    return f"{doc.get('section_number')}:{hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]}"
+
+
+def section_numbers(docs):
+    return [str(doc.get("section_number")) for doc in docs]
+
+
+def rerank_report(original, reranked, top_k: int) -> dict:
+    """เทียบลำดับก่อน / หลัง Rerank (ใช้ทั้ง Metrics และ Benchmark)"""
+    before = section_numbers(original[:top_k])
+    after = section_numbers(reranked)
+    return {
+        "candidates": len(original),
+        "kept": len(after),
+        "displaced": len(set(after) - set(before)),
+        "top1_changed": bool(before and after and before[0] != after[0]),
+        "before": before,
+        "after": after,
+    }
+
+
+class RerankRunner:
+    """Thread เดียวสำหรับ Rerank (Model รันทีละ Batch อยู่แล้ว) รับงานค้างได้ไม่เกิน max_inflight"""
+
+    def __init__(self, max_inflight: int = RERANK_MAX_INFLIGHT):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def submit(self, func, *args):
+        """คืน concurrent Future หรือ None ถ้างานค้างเต็มแล้ว (ผู้เรียกใช้ลำดับจาก Index แทน)"""
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                return None
+            self.inflight += 1
+            RERANK_INFLIGHT.set(self.inflight)
+        future = self._executor.submit(func, *args)
+        # นับคืนเมื่องานจบจริง (ไม่ใช่ตอนผู้รอเลิกรอ) รวมงานที่ถูกยกเลิกก่อนได้รัน
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.inflight -= 1
+            RERANK_INFLIGHT.set(self.inflight)
+
+
+class CrossEncoderReranker:
+    """Cross-encoder ตัวเดียวต่อ Process พร้อม LRU Cache ของคะแนน (ใช้จากหลาย Thread ได้)"""
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = RERANK_MAX_LENGTH,
+                 max_chars: int = RERANK_MAX_CHARS, cache_size: int = RERANK_CACHE_SIZE):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.model_name = model_name
+        self.max_chars = max_chars
+        self.cache_size = cache_size
+        self._cache = OrderedDict()         # (คำถาม, มาตรา) -> คะแนน
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()  # รันทีละ Batch (หลาย Batch พร้อมกันแย่ง Core กันเอง ช้าลงทั้งคู่)
+        self.runner = RerankRunner()
+        self.hits = 0
+        self.misses = 0
+
+    def score_pairs(self, queries, doc_lists):
+        """
+        ให้คะแนนทุกคู่ของหลายคำถามในครั้งเดียว คืน list ของคะแนน (ตามลำดับ doc_lists)
+        คู่ที่ยังไม่อยู่ใน Cache รวมเป็น Forward Pass เดียว
+        """
+        keys = [[(cache_key(query), section_key(doc)) for doc in docs] for query, docs in zip(queries, doc_lists)]
+        scores = {}
+        missing = {}
+        with self._lock:
+            for query, docs, pair_keys in zip(queries, doc_lists, keys):
+                for doc, key in zip(docs, pair_keys):
+                    score = self._cache.get(key)
+                    if score is not None:
+                        self._cache.move_to_end(key)
+                        scores[key] = score
+                        self.hits += 1
+                    elif key not in missing:
+                        missing[key] = (query, (doc.get("text_original") or "")[:self.max_chars])
+                        self.misses += 1
+        if missing:
+            RERANK_PAIRS.observe(len(missing))
+            with self._model_lock:
+                predicted = self.model.predict(list(missing.values()), batch_size=min(len(missing), MAX_FORWARD_PAIRS),
+                                               show_progress_bar=False)
+            with self._lock:
+                for key, score in zip(missing, predicted):
+                    scores[key] = float(score)
+                    self._cache[key] = float(score)
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [[scores[key] for key in pair_keys] for pair_keys in keys]
+
+    def rerank_many(self, queries, doc_lists, top_k: int = RERANK_TOP_K, min_score: float = RERANK_MIN_SCORE):
+        """Rerank หลายคำถามพร้อมกัน (/chat_batch) คืน [(docs ที่เหลือ top_k, report)]"""
+        results = []
+        for docs, scores in zip(doc_lists, self.score_pairs(queries, doc_lists)):
+            ranked = sorted(zip(docs, scores), key=lambda item: item[1], reverse=True)
+            kept = [{**doc, "rerank_score": score} for doc, score in ranked if score >= min_score][:top_k]
+            report = rerank_report(docs, kept, top_k)
+            RERANK_DISPLACED.observe(report["displaced"])
+            if report["top1_changed"]:
+                RERANK_TOP1_CHANGED.inc()
+            RERANK_DROPPED.inc(sum(1 for _, score in ranked[:top_k] if score < min_score))
+            results.append((kept, report))
+        return results
+
+    def rerank(self, query: str, docs, top_k: int = RERANK_TOP_K, min_score: float = RERANK_MIN_SCORE):
+        return self.rerank_many([query], [docs], top_k, min_score)[0]
+
+    def submit_many(self, queries, doc_lists):
+        """rerank_many ใน Thread ของ Reranker คืน concurrent Future หรือ None ถ้างานค้างเต็ม"""
+        return self.runner.submit(self.rerank_many, queries, doc_lists)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def load_reranker():
+    """โหลด Model + รันครั้งแรกให้ torch จัดสรร Memory ไว้ก่อน (เรียกผ่าน run_cpu_bound)"""
+    reranker = CrossEncoderReranker()
+    reranker.model.predict([("อุ่นเครื่อง", "อุ่นเครื่อง")], show_progress_bar=False)
+    return reranker
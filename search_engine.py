@@ -1,7 +1,9 @@
 import os
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from langchain_huggingface import HuggingFaceEmbeddings
+from embedding_cache import CachedQueryEmbeddings
+from embedding_service import get_embeddings
+from rag_pipeline import create_retriever
 
 # 1. โหลดค่า Config
 load_dotenv()
@@ -16,7 +18,9 @@ if not url or not key:
 supabase: Client = create_client(url, key)
 
 print("⏳ กำลังโหลด Model ค้นหา (BAAI/bge-m3)...")
-embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
+embeddings = CachedQueryEmbeddings(get_embeddings())
+# Retriever ตาม RETRIEVAL_BACKEND เดียวกับ api.py (supabase / local / chunks)
+retriever = create_retriever(supabase_client=supabase)
 
 def search_law(query_text):
     print(f"\n🔍 กำลังค้นหา: '{query_text}'")
@@ -24,23 +28,19 @@ def search_law(query_text):
     # 2. แปลงคำถามของเราเป็น Vector
     query_vector = embeddings.embed_query(query_text)
     
-    # 3. ส่งไปถาม Supabase (เรียกใช้ Function match_act_sections ที่เราสร้างไว้)
-    params = {
-        "query_embedding": query_vector,
-        "match_threshold": 0.4, # ความเหมือนขั้นต่ำ (ปรับลดลงได้ถ้าหาไม่เจอ)
-        "match_count": 3        # เอามาแค่ 3 อันดับแรก
-    }
-    
+    # 3. ส่งไปค้น (RPC match_sections_v2 หรือ Snapshot ในเครื่อง)
     try:
-        response = supabase.rpc("match_sections_v2", params).execute()
+        results = retriever.search(query_vector,
+                                   match_count=3,         # เอามาแค่ 3 อันดับแรก
+                                   match_threshold=0.4)   # ความเหมือนขั้นต่ำ (ปรับลดลงได้ถ้าหาไม่เจอ)
         
         # 4. แสดงผลลัพธ์
-        if not response.data:
+        if not results:
             print("❌ ไม่พบกฎหมายที่เกี่ยวข้องเลย (ลองเปลี่ยนคำค้นหาดูครับ)")
             return
 
-        print(f"✅ เจอ {len(response.data)} มาตราที่เกี่ยวข้อง:\n")
-        for i, item in enumerate(response.data):
+        print(f"✅ เจอ {len(results)} มาตราที่เกี่ยวข้อง:\n")
+        for i, item in enumerate(results):
             similarity = item.get('similarity', 0)
             sec_num = item.get('section_number', '?')
             content = item.get('text_original', '')
@@ -0,0 +1,149 @@
+"""
+Session ของบทสนทนาฝั่ง Server: Client ส่งแค่ session_id + คำถามใหม่ ไม่ต้องส่งประวัติทั้งหมดทุกครั้ง
+
+- เก็บเฉพาะ SESSION_HISTORY_MESSAGES ข้อความล่าสุด (rewrite_question ใช้แค่ 4 ข้อความล่าสุดอยู่แล้ว)
+- เก็บมาตราที่ค้นเจอในรอบก่อน + Vector ของคำถามรอบก่อน คำถามต่อเนื่องที่ความหมายใกล้เดิมใช้ผลเดิมได้เลย
+- จำกัดจำนวน Session (SESSION_MAX) และหมดอายุเมื่อไม่ได้ใช้เกิน SESSION_TTL วินาที
+- SESSION_STORE=memory (ค่าเริ่มต้น, หายเมื่อ Restart) หรือ sqlite (ไฟล์ SESSION_DB_PATH ใช้ร่วมกันหลาย Worker ได้)
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")                   # memory / sqlite
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))                   # วินาทีที่ไม่ได้ใช้แล้วหมดอายุ
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))                    # จำนวน Session สูงสุด (เกินเตะตัวเก่าสุด)
+SESSION_HISTORY_MESSAGES = int(os.getenv("SESSION_HISTORY_MESSAGES", "4"))
+SESSION_STORES = ("memory", "sqlite")
+
+
+def new_session() -> dict:
+    return {"history": [], "last_query": None, "last_vector": None, "last_docs": None}
+
+
+def record_turn(session: dict, question: str, answer: str, search_query: str = None,
+                query_vector=None, retrieved_docs=None):
+    """เพิ่มคำถาม/คำตอบของรอบนี้ (ตัดให้เหลือ SESSION_HISTORY_MESSAGES) และจำผลค้นหาไว้ให้รอบถัดไป"""
+    history = session["history"] + [
+        {"role": "user", "content": question},
+        {"role": "assistant", "content": answer},
+    ]
+    session["history"] = history[-SESSION_HISTORY_MESSAGES:]
+    if retrieved_docs:
+        session["last_query"] = search_query
+        session["last_vector"] = list(query_vector) if query_vector is not None else None
+        session["last_docs"] = list(retrieved_docs)
+
+
+class MemorySessionStore:
+    """เก็บใน RAM แบบ LRU + TTL (ใช้ภายใน Process เดียว)"""
+
+    def __init__(self, max_size: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # session_id -> (session, updated_at)
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if self.ttl > 0 and time.time() - entry[1] > self.ttl:
+                del self._sessions[session_id]
+                self.expired += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    def save(self, session_id: str, session: dict):
+        with self._lock:
+            self._sessions[session_id] = (session, time.time())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """เก็บในไฟล์ SQLite (อยู่รอดหลัง Restart / ใช้ร่วมกันหลาย uvicorn Worker บนเครื่องเดียว)"""
+
+    def __init__(self, path: str = SESSION_DB_PATH, max_size: int = SESSION_MAX, ttl: float = SESSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    def get(self, session_id: str):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl > 0 and time.time() - row[1] > self.ttl:
+            self.delete(session_id)
+            self.expired += 1
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id: str, session: dict):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(session, ensure_ascii=False), now),
+            )
+            # ล้างตัวที่หมดอายุ + ตัวเก่าสุดที่เกินจำนวน ตอนเขียน (ไม่ต้องมี Thread แยก)
+            if self.ttl > 0:
+                self.conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,))
+            self.conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                "SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)", (self.max_size,)
+            )
+            self.conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self.conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            self.conn.commit()
+        return deleted > 0
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(kind: str = SESSION_STORE):
+    if kind not in SESSION_STORES:
+        raise ValueError(f"SESSION_STORE ต้องเป็น {' / '.join(SESSION_STORES)} (ได้ '{kind}')")
+    if kind == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
+
+
+def generate_session_id() -> str:
+    return uuid.uuid4().hex
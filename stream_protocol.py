@@ -0,0 +1,131 @@
+"""
+รูปแบบการส่ง Stream ของ /chat_stream
+
+- 2 รูปแบบ: NDJSON (ค่าเริ่มต้น หนึ่งบรรทัดต่อ Event) และ Server-Sent Events (?format=sse)
+- Serialize ด้วย orjson (เร็วกว่า json.dumps และไม่ต้อง Escape ภาษาไทยเป็น \\uXXXX)
+- รวม Token ที่ LLM ส่งมาทีละนิดเป็นก้อนเดียว ส่งทุก STREAM_FLUSH_MS หรือเมื่อครบ STREAM_FLUSH_CHARS ตัวอักษร
+  (Token แรกส่งทันที ไม่ให้ Time-to-first-token ช้าลง)
+- ถ้าไม่มีอะไรส่งนานเกิน STREAM_HEARTBEAT_SECONDS ส่ง Event "heartbeat" กัน Proxy / Client ตัด Connection
+- หยุดอ่านจาก LLM ทันทีเมื่อถึง Deadline หรือ Client ปิดการเชื่อมต่อ (ดู cancellation.py)
+
+Event ที่ส่ง: sources -> content (หลายครั้ง) -> done (usage / เวลาแต่ละขั้น, truncated=true ถ้าถูกตัดเพราะเกิน Deadline)
+หรือ error
+"""
+import os
+import json
+import asyncio
+
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+load_dotenv()
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "50"))
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "64"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+STREAM_FORMATS = ("ndjson", "sse")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+# ไม่ให้ Proxy (เช่น nginx) เก็บ Buffer ไว้ก่อนส่ง
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_END = object()
+_STOP = object()
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def encode_event(event: dict, stream_format: str = "ndjson") -> bytes:
+    """event ต้องมี key "type" (sources / content / heartbeat / done / error)"""
+    if stream_format == "sse":
+        return b"event: " + event["type"].encode("ascii") + b"\ndata: " + _dumps(event) + b"\n\n"
+    return _dumps(event) + b"\n"
+
+
+async def coalesce(source, flush_ms: float = STREAM_FLUSH_MS, flush_chars: int = STREAM_FLUSH_CHARS,
+                   heartbeat_seconds: float = STREAM_HEARTBEAT_SECONDS, deadline: float = None, stop=None):
+    """
+    รับ Async Iterator ของข้อความทีละชิ้น คืน ("content", ข้อความที่รวมแล้ว) หรือ ("heartbeat", None)
+    อ่าน source ใน Task แยก (ยกเลิก source ได้ทันทีเมื่อ Client ปิดการเชื่อมต่อ)
+    deadline: เวลา loop.time() ที่ต้องหยุด -> ส่งข้อความที่ค้างอยู่ แล้วคืน ("deadline", None) เป็นตัวสุดท้าย
+    stop: Awaitable ที่เสร็จเมื่อควรหยุด (เช่น Client ปิดการเชื่อมต่อ) -> คืน ("stopped", None) เป็นตัวสุดท้าย
+    ใช้คู่กับ contextlib.aclosing ถ้าจะ break ออกก่อน source จะได้ถูกยกเลิกทันที
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+            await queue.put(_END)
+        except Exception as e:
+            await queue.put(e)
+
+    async def watch_stop():
+        await stop
+        await queue.put(_STOP)
+
+    task = asyncio.create_task(pump())
+    stop_task = asyncio.create_task(watch_stop()) if stop is not None else None
+    buffer = []
+    size = 0
+    flush_at = None
+    first = True
+    last_sent = loop.time()
+    try:
+        while True:
+            now = loop.time()
+            wake_at = flush_at if buffer else last_sent + heartbeat_seconds
+            if deadline is not None and deadline <= wake_at:
+                if now >= deadline:
+                    if buffer:
+                        yield "content", "".join(buffer)
+                    yield "deadline", None
+                    return
+                wake_at = deadline
+            try:
+                item = await asyncio.wait_for(queue.get(), max(0.0, wake_at - now))
+            except asyncio.TimeoutError:
+                if wake_at == deadline:
+                    continue  # ไปส่งที่ค้าง + ("deadline", None) ด้านบน
+                if buffer:
+                    yield "content", "".join(buffer)
+                    buffer, size = [], 0
+                else:
+                    yield "heartbeat", None
+                last_sent = loop.time()
+                continue
+
+            if item is _END:
+                break
+            if item is _STOP:
+                yield "stopped", None
+                return
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                continue
+            if not buffer:
+                flush_at = loop.time() + flush_ms / 1000
+            buffer.append(item)
+            size += len(item)
+            if first or size >= flush_chars:
+                yield "content", "".join(buffer)
+                buffer, size = [], 0
+                first = False
+                last_sent = loop.time()
+
+        if buffer:
+            yield "content", "".join(buffer)
+    finally:
+        task.cancel()
+        if stop_task is not None:
+            stop_task.cancel()
@@ -0,0 +1,28 @@
+"""ของที่ใช้ร่วมกันทุก Test (รันได้ทั้ง `pytest` และ `python -m pytest` จาก Root ของ Repo)"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SlowModel:
+    """Model ปลอม: รอจนถูกปล่อย (release) ก่อนค่อยคืน Vector [ความยาวข้อความ, 1.0] ไว้ยกเลิกผู้รอระหว่างรัน Batch"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def embed_documents(self, texts):
+        self.started.set()
+        self.release.wait(5)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def slow_model():
+    model = SlowModel()
+    yield model
+    model.release.set()  # ไม่ให้ Batcher Thread ค้างรอหลัง Test จบ
@@ -0,0 +1,85 @@
+"""Admission Control: คิวจำกัดขนาด ปล่อยแบบ Round-robin ตาม Client และคืน Slot ทุกกรณี"""
+import asyncio
+
+import pytest
+
+from admission import AdmissionRejected, AdmittedEmbeddings, StageLimiter
+
+
+def test_round_robin_between_clients():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=10, queue_timeout=5)
+        order = []
+
+        async def job(client_id, name):
+            async with limiter.slot(client_id):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await limiter.acquire("holder")
+        # Client a ยิงมา 3 งานก่อน b จะมา 1 งาน -> b ต้องไม่รอให้ a หมดคิวก่อน
+        tasks = [asyncio.ensure_future(job("a", f"a{i}")) for i in range(3)]
+        tasks.append(asyncio.ensure_future(job("b", "b0")))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["clients_waiting"] == 2
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["a0", "b0", "a1", "a2"]
+    assert (stats["active"], stats["queued"]) == (0, 0)
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=1, queue_timeout=5)
+        await limiter.acquire("a")
+        waiter = asyncio.ensure_future(limiter.acquire("b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire("c")
+        limiter.release()
+        await waiter
+        limiter.release()
+        return rejected.value, limiter.stats()
+
+    rejected, stats = asyncio.run(scenario())
+    assert (rejected.stage, rejected.reason) == ("test", "queue_full")
+    assert (stats["active"], stats["queued"]) == (0, 0)
+
+
+def test_queue_timeout_and_cancel_leave_no_waiters():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrency=1, max_queue=5, queue_timeout=0.05)
+        await limiter.acquire("a")
+        with pytest.raises(AdmissionRejected, match="timeout"):
+            await limiter.acquire("b")
+
+        cancelled = asyncio.ensure_future(limiter.acquire("c"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        stats_while_held = limiter.stats()
+        limiter.release()
+        return stats_while_held, limiter.stats()
+
+    held, after = asyncio.run(scenario())
+    assert (held["active"], held["queued"], held["clients_waiting"]) == (1, 0, 0)
+    assert after["active"] == 0
+
+
+def test_admitted_embeddings_release_slot_on_error():
+    class FailingModel:
+        def embed_query(self, text):
+            raise RuntimeError("model error")
+
+    async def scenario():
+        limiter = StageLimiter("embedding", max_concurrency=1, max_queue=1, queue_timeout=1)
+        embeddings = AdmittedEmbeddings(FailingModel(), limiter)
+        with pytest.raises(RuntimeError):
+            await embeddings.aembed_query("ลาป่วย")
+        return limiter.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
@@ -0,0 +1,43 @@
+"""ชั้น Semantic ของ Answer Cache: ปิดเป็นค่าเริ่มต้น และคำถามที่คำตอบต่างกันต้องไม่ชนกัน"""
+import os
+import json
+
+import pytest
+
+from answer_cache import AnswerCache
+from benchmarks.bench_answer_cache import may_share_answer, pair_distances, summarize
+from benchmarks.bench_retrieval import QUESTIONS_FILE
+
+
+@pytest.mark.skipif("ANSWER_CACHE_MAX_DISTANCE" in os.environ, reason="ตั้งค่า ANSWER_CACHE_MAX_DISTANCE ไว้เอง")
+def test_semantic_tier_is_off_by_default():
+    cache = AnswerCache()
+    cache.put("ลาป่วยได้กี่วันต่อปี", "ลาป่วยได้เท่าที่ป่วยจริง", ["มาตรา 32"], [1.0, 0.0])
+    # Vector เกือบเหมือนกัน แต่คนละคำถาม (ลากิจ) -> ต้องไม่ได้คำตอบของลาป่วย
+    assert not cache.semantic_enabled
+    assert cache.get_semantic([0.99, 0.14]) is None
+
+
+def test_question_set_paraphrases_point_at_existing_questions():
+    with open(QUESTIONS_FILE, encoding="utf-8") as f:
+        questions = json.load(f)
+    texts = {item["question"] for item in questions}
+    paraphrases = [item for item in questions if "paraphrase_of" in item]
+    assert paraphrases and all(item["paraphrase_of"] in texts for item in paraphrases)
+
+
+def test_summarize_counts_collisions_and_paraphrase_hits():
+    questions = [
+        {"question": "ลาป่วยได้กี่วันต่อปี"},
+        {"question": "ลากิจได้กี่วันต่อปี"},
+        {"question": "ลาป่วยได้ปีละกี่วัน", "paraphrase_of": "ลาป่วยได้กี่วันต่อปี"},
+    ]
+    vectors = [[1.0, 0.0], [0.99, 0.14], [1.0, 0.01]]
+    assert may_share_answer(questions[0], questions[2]) and not may_share_answer(questions[0], questions[1])
+
+    pairs = pair_distances(questions, vectors)
+    strict = summarize(pairs, 0.001)
+    assert strict["collisions"] == [] and strict["paraphrase_hits"] == 1
+    loose = summarize(pairs, 0.05)
+    assert {(a["question"], b["question"]) for _, a, b, _ in loose["collisions"]} == {
+        ("ลาป่วยได้กี่วันต่อปี", "ลากิจได้กี่วันต่อปี"), ("ลากิจได้กี่วันต่อปี", "ลาป่วยได้ปีละกี่วัน")}
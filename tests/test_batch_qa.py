@@ -0,0 +1,68 @@
+"""ค้นหาบางข้อ / ทั้ง Batch ไม่สำเร็จ -> ได้บรรทัด error ของข้อนั้น ไม่ตัดผลลัพธ์กลางทาง"""
+import asyncio
+
+from batch_qa import answer_batch
+from rag_pipeline import SupabaseRetriever
+
+ITEMS = [{"id": 1, "question": "ลาป่วยได้กี่วัน"}, {"id": 2, "question": "ค่าชดเชย"}, {"id": 3, "question": "ลากิจ"}]
+
+
+async def generate(question, docs, query_vector):
+    return f"ตอบ {question}", [doc["section_number"] for doc in docs]
+
+
+def collect(retrieve_many):
+    async def run():
+        return [result async for result in answer_batch(ITEMS, retrieve_many, generate)]
+    return {result["id"]: result for result in asyncio.run(run())}
+
+
+def test_failed_question_gets_its_own_error_line():
+    async def retrieve_many(questions):
+        return [([{"section_number": "57"}], None), RuntimeError("RPC ล้ม"), ([{"section_number": "34"}], None)]
+
+    results = collect(retrieve_many)
+    assert results[1]["sources"] == ["57"] and results[3]["sources"] == ["34"]
+    assert results[2]["error"] == "RPC ล้ม" and "answer" not in results[2]
+
+
+def test_whole_batch_failure_answers_every_line_with_error():
+    async def retrieve_many(questions):
+        raise RuntimeError("Embedding ล้ม")
+
+    results = collect(retrieve_many)
+    assert sorted(results) == [1, 2, 3]
+    assert all(result["error"] == "Embedding ล้ม" for result in results.values())
+
+
+class FakeRpc:
+    def __init__(self, client, vector):
+        self.client = client
+        self.vector = vector
+
+    async def execute(self):
+        self.client.active += 1
+        self.client.peak = max(self.client.peak, self.client.active)
+        await asyncio.sleep(0.01)
+        self.client.active -= 1
+        if self.vector == [0.0]:
+            raise RuntimeError("RPC ล้ม")
+        return type("Response", (), {"data": [{"section_number": str(self.vector[0])}]})()
+
+
+class FakeClient:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    def rpc(self, name, params):
+        return FakeRpc(self, params["query_embedding"])
+
+
+def test_supabase_search_batch_is_bounded_and_isolates_errors():
+    client = FakeClient()
+    vectors = [[float(n)] for n in range(1, 21)] + [[0.0]]
+    results = asyncio.run(SupabaseRetriever(client).asearch_batch(vectors, concurrency=3))
+    assert client.peak == 3
+    assert results[0] == [{"section_number": "1.0"}]
+    assert isinstance(results[-1], RuntimeError)
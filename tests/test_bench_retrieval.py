@@ -0,0 +1,68 @@
+"""Benchmark การค้น: ชุดคำถามใช้ได้, คะแนน recall / MRR ถูก และรันครบ Pipeline บน Snapshot เล็กๆ ได้"""
+import json
+
+import pytest
+
+from benchmarks.bench_retrieval import (
+    Retriever, create_stub_chain, embed_questions, load_questions, run_backend, score_ranking)
+from lexical_search import BM25Index
+from local_index import LocalVectorIndex, build_snapshot
+
+ROWS = [
+    {"id": 1, "section_number": "32", "text_original": "ลูกจ้างมีสิทธิลาป่วยได้เท่าที่ป่วยจริง", "embedding": [1.0, 0.0]},
+    {"id": 2, "section_number": "118", "text_original": "นายจ้างต้องจ่ายค่าชดเชยเมื่อเลิกจ้าง", "embedding": [0.0, 1.0]},
+]
+QUESTIONS = [
+    {"question": "ลาป่วยได้กี่วัน", "gold": ["32"]},
+    {"question": "โดนเลิกจ้างได้ค่าชดเชยเท่าไร", "gold": ["118"]},
+    {"question": "มาตรา 118 ว่าอย่างไร", "gold": ["118"]},
+]
+VECTORS = [[0.9, 0.1], [0.2, 0.8], [0.4, 0.6]]
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_snapshot(ROWS, index_dir)
+    local = LocalVectorIndex(index_dir)
+    rows = [{"id": i, "section_number": s, "text_original": t}
+            for i, s, t in zip(local.ids, local.section_numbers, local.texts)]
+    return local, BM25Index(rows, local.lexical_tokens)
+
+
+def test_question_set_is_well_formed():
+    questions = load_questions()
+    assert questions
+    for item in questions:
+        assert item["question"].strip()
+        assert item["gold"] and all(isinstance(number, str) for number in item["gold"])
+
+
+def test_score_ranking():
+    recalls, reciprocal_rank = score_ranking(["10", "118", "119"], ["118", "119"], ks=(1, 3))
+    assert recalls == {1: 0.0, 3: 1.0}
+    assert reciprocal_rank == 0.5
+    assert score_ranking([], ["118"], ks=(1,)) == ({1: 0.0}, 0.0)
+
+
+def test_embed_questions_uses_vector_cache(tmp_path):
+    cache_path = tmp_path / "vectors.json"
+    cache_path.write_text(json.dumps({item["question"]: vector for item, vector in zip(QUESTIONS, VECTORS)}),
+                          encoding="utf-8")
+    vectors, latencies = embed_questions(QUESTIONS, str(cache_path))  # ครบในไฟล์ -> ไม่โหลด Model
+    assert vectors == VECTORS
+    assert latencies == [None, None, None]
+
+
+@pytest.mark.parametrize("backend", ["local", "bm25", "hybrid"])
+def test_run_backend_reports_recall_and_stages(indexes, backend):
+    local, bm25 = indexes
+    lexical = None if backend == "local" else bm25
+    retriever = Retriever(backend, local, lexical, match_threshold=0.3, match_count=1)
+    result = run_backend(retriever, QUESTIONS, VECTORS, [1.0] * len(QUESTIONS), create_stub_chain(0), ks=(1,))
+
+    assert result["backend"] == backend
+    assert result["recall"]["@1"] == 1.0
+    assert result["mrr"] == 1.0
+    assert {"retrieval", "context", "generation", "total"} <= set(result["stages_ms"])
+    assert [row["found"] for row in result["questions"]] == [["32"], ["118"], ["118"]]
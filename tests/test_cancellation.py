@@ -0,0 +1,68 @@
+"""Client ปิดการเชื่อมต่อระหว่าง Embed (/chat_stream) แล้ว Request ถัดไปต้องยังตอบได้"""
+import asyncio
+
+import pytest
+
+from admission import StageLimiter, AdmittedEmbeddings
+from cancellation import RequestCancelled, guarded
+from embedding_cache import CachedQueryEmbeddings
+from embedding_service import MicroBatchingEmbeddings
+
+
+class FakeRequest:
+    """แทน starlette Request: ตอบว่าปิดการเชื่อมต่อแล้วเมื่อ disconnected ถูก set"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def build_embeddings(model):
+    limiter = StageLimiter("embedding", 2, 8, 5.0)
+    engine = MicroBatchingEmbeddings(model, max_wait_ms=1)
+    return CachedQueryEmbeddings(AdmittedEmbeddings(engine, limiter), disk_path=""), limiter, engine
+
+
+def test_disconnect_during_embedding_keeps_server_answering(slow_model):
+    model = slow_model
+    embeddings, limiter, engine = build_embeddings(model)
+    request = FakeRequest()
+
+    async def scenario():
+        async def disconnect_when_model_runs():
+            while not model.started.is_set():
+                await asyncio.sleep(0.01)
+            request.disconnected = True
+
+        flipper = asyncio.create_task(disconnect_when_model_runs())
+        with pytest.raises(RequestCancelled) as cancelled:
+            await guarded(embeddings.aembed_query("ลาป่วยได้กี่วัน"), request, deadline=None)
+        await flipper
+        model.release.set()
+        # Request ถัดไป (Client ใหม่) ต้องได้ Vector ไม่ค้าง
+        vector = await asyncio.wait_for(embeddings.aembed_query("ค่าชดเชยเท่าไหร่"), 5)
+        return cancelled.value.reason, vector
+
+    reason, vector = asyncio.run(scenario())
+    assert reason == "disconnect"
+    assert vector[1] == 1.0
+    assert engine._worker.is_alive()
+    assert limiter.active == 0 and limiter.queued == 0
+
+
+def test_deadline_cancels_embedding(slow_model):
+    model = slow_model
+    embeddings, limiter, engine = build_embeddings(model)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        with pytest.raises(RequestCancelled) as cancelled:
+            await guarded(embeddings.aembed_query("ลากิจ"), FakeRequest(), deadline=loop.time() + 0.2)
+        model.release.set()
+        await asyncio.wait_for(embeddings.aembed_query("ลาพักร้อน"), 5)
+        return cancelled.value.reason
+
+    assert asyncio.run(scenario()) == "deadline"
+    assert engine._worker.is_alive()
@@ -0,0 +1,46 @@
+"""Chunk / Vector เดิมใช้ซ้ำได้เฉพาะเมื่อสร้างด้วยค่าการแบ่ง Chunk + Embedding Model ชุดเดียวกัน"""
+import chunk_index
+from chunk_index import build_chunk_index
+
+ROWS = [
+    {"id": 1, "section_number": "57", "text_original": "ลูกจ้างมีสิทธิลาป่วยได้เท่าที่ป่วยจริง"},
+    {"id": 2, "section_number": "34",
+     "text_original": "ลูกจ้างมีสิทธิลากิจเพื่อธุรกิจอันจำเป็นได้ ปีละไม่น้อยกว่าสามวันทำงาน\nตามข้อบังคับเกี่ยวกับการทำงาน"},
+]
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_unchanged_settings_reuse_previous_chunks(tmp_path):
+    build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    stats = build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    assert stats["reused"] == 2 and stats["embedded"] == 0
+
+
+def test_changed_embedding_settings_rebuild_everything(tmp_path, monkeypatch):
+    build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    monkeypatch.setattr(chunk_index, "EMBEDDING_MODEL", "BAAI/bge-small")
+    stats = build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    assert stats["reused"] == 0 and stats["rechunked"] == 2 and stats["embedded"] == stats["chunks"]
+
+    # fp32 -> int8: Model เดิมแต่ Vector ไม่ตรงกับของเดิมแล้ว
+    monkeypatch.setattr(chunk_index, "EMBEDDING_BACKEND", "int8")
+    stats = build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    assert stats["reused"] == 0 and stats["embedded"] == stats["chunks"]
+
+
+def test_changed_chunk_size_rechunks_with_new_size(tmp_path, monkeypatch):
+    before = build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    monkeypatch.setattr(chunk_index, "CHUNK_MAX_TOKENS", 1)
+    monkeypatch.setattr(chunk_index, "CHUNK_OVERLAP_SENTENCES", 0)
+    after = build_chunk_index(ROWS, CountingEmbeddings(), str(tmp_path))
+    assert after["reused"] == 0 and after["embedded"] == after["chunks"]
+    # ขนาดใหม่มีผลกับการแบ่งจริง (ไม่ใช่แค่ค่าใน meta): ทุกประโยคกลายเป็น Chunk ของตัวเอง
+    assert after["chunks"] > before["chunks"]
@@ -0,0 +1,37 @@
+"""งานหนัก (Embedding / ตัดคำ) รันใน Worker Pool: Event Loop ต้องว่างรับงานอื่นระหว่างรอ"""
+import time
+import asyncio
+import threading
+
+from concurrency import run_cpu_bound
+
+
+def blocking_work(seconds, label=None):
+    time.sleep(seconds)  # แทนงานที่ถือ Thread ไว้ (torch / PyThaiNLP)
+    return label, threading.current_thread().name
+
+
+def test_event_loop_keeps_running_while_work_is_in_pool():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await run_cpu_bound(blocking_work, 0.2, label="ลาป่วย")
+        task.cancel()
+        return result, ticks
+
+    (label, thread_name), ticks = asyncio.run(scenario())
+    assert label == "ลาป่วย"
+    assert thread_name.startswith("cpu-worker")
+    assert ticks >= 5  # ถ้างานรันบน Event Loop ตรงๆ ticker จะไม่ได้ทำงานเลย
+
+
+def test_kwargs_are_forwarded():
+    label, _ = asyncio.run(run_cpu_bound(blocking_work, 0, label="ค่าชดเชย"))
+    assert label == "ค่าชดเชย"
@@ -0,0 +1,46 @@
+"""Context Builder: ต้องอยู่ในงบ Token, ตัดมาตราซ้ำ และตัดมาตรายาวให้เหลือประโยคที่ตรงคำถาม"""
+from context_builder import build_context, sort_sources, trim_to_query
+from lexical_search import tokenize
+from token_counter import count_tokens
+
+LONG_SECTION = " ".join(
+    ["นายจ้างต้องจัดให้มีข้อบังคับเกี่ยวกับการทำงานเป็นภาษาไทย"] * 6
+    + ["ลูกจ้างมีสิทธิลาป่วยได้เท่าที่ป่วยจริง"]
+    + ["นายจ้างต้องเก็บรักษาทะเบียนลูกจ้างไว้ ณ สถานที่ทำงาน"] * 6
+)
+
+
+def test_sort_sources_orders_numerically_and_dedups():
+    assert sort_sources(["มาตรา 118", "มาตรา 9", "มาตรา 75/1", "มาตรา 9"]) == ["มาตรา 9", "มาตรา 118", "มาตรา 75/1"]
+
+
+def test_trim_to_query_keeps_matching_sentence():
+    question_terms = set(tokenize("ลาป่วยได้กี่วัน"))
+    trimmed = trim_to_query(LONG_SECTION, question_terms, token_limit=60)
+    assert "ลาป่วย" in trimmed
+    assert trimmed.endswith(" …")
+    assert count_tokens(trimmed) < count_tokens(LONG_SECTION)
+    # สั้นอยู่แล้วไม่ต้องตัด
+    assert trim_to_query("ลูกจ้างมีสิทธิลาป่วย", question_terms, token_limit=60) == "ลูกจ้างมีสิทธิลาป่วย"
+
+
+def test_build_context_drops_duplicates_and_reports_savings():
+    docs = [
+        {"section_number": "32", "text_original": LONG_SECTION},
+        {"section_number": "32/1", "text_original": LONG_SECTION},  # ซ้ำเป๊ะ -> ตัดทิ้ง
+        {"section_number": "57", "text_original": "นายจ้างต้องจ่ายค่าจ้างในวันลาป่วย"},
+    ]
+    result = build_context("ลาป่วยได้กี่วัน", docs, token_budget=3000, section_limit=80)
+    assert result["sources"] == ["มาตรา 32", "มาตรา 57"]
+    assert (result["dropped"], result["trimmed"]) == (1, 1)
+    assert result["tokens"] == count_tokens(result["context"])
+    assert result["tokens_saved"] > 0
+
+
+def test_build_context_stays_within_budget():
+    docs = [{"section_number": str(number), "text_original": LONG_SECTION.replace("ทำงาน", f"ทำงาน {number}")}
+            for number in range(1, 6)]
+    result = build_context("ลาป่วยได้กี่วัน", docs, token_budget=200, section_limit=150, dedup_similarity=1.1)
+    assert result["tokens"] <= 200
+    assert result["sources"][0] == "มาตรา 1"  # มาตราที่เกี่ยวข้องที่สุดได้ที่ก่อน
+    assert result["dropped"] > 0
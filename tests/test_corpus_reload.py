@@ -0,0 +1,28 @@
+"""เลขเวอร์ชันของข้อมูลกฎหมายเปลี่ยน -> ล้าง Answer Cache เสมอ (รวมกรณีค้นผ่าน Supabase + ปิด Hybrid)"""
+import asyncio
+
+import api
+from answer_cache import AnswerCache
+
+
+def test_answer_cache_version_includes_corpus_version():
+    assert api.answer_cache_version(None, None) is None
+    assert api.answer_cache_version(3, None) != api.answer_cache_version(4, None)
+    rows = [{"section_number": "57", "text_original": "ลูกจ้างมีสิทธิลาป่วยได้เท่าที่ป่วยจริง"}]
+    assert api.answer_cache_version(3, rows) != api.answer_cache_version(4, rows)
+
+
+def test_reload_clears_answer_cache_without_section_text(monkeypatch):
+    cache = AnswerCache()
+    monkeypatch.setattr(api, "answer_cache", cache)
+    monkeypatch.setattr(api, "local_index", None)
+    monkeypatch.setattr(api, "HYBRID_SEARCH", False)
+    monkeypatch.setattr(api, "corpus_state", {"version": None, "loaded_at": None, "reloads": 0, "pending": None})
+
+    cache.set_corpus_version(api.answer_cache_version(1, None))
+    api.set_corpus_version(1)
+    cache.put("ลาป่วยได้กี่วัน", "ลาป่วยได้เท่าที่ป่วยจริง", ["57"])
+
+    assert asyncio.run(api.reload_corpus(2)) is True
+    assert cache.stats()["size"] == 0
+    assert api.corpus_state["version"] == 2
@@ -0,0 +1,37 @@
+"""EMBEDDING_BACKEND: ตั้งค่าผิดต้องล้มทันทีตอนเริ่ม และ Backend int8 / onnx ต้องมี Interface เดียวกับ fp32"""
+import numpy as np
+import pytest
+
+import embedding_service
+from embedding_service import SentenceTransformerEmbeddings, load_model
+from benchmarks.verify_embedding_backend import sample_sections, top_k
+
+
+class FakeSentenceTransformer:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(texts)
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_unknown_backend_fails_before_loading_anything(monkeypatch):
+    monkeypatch.setattr(embedding_service, "EMBED_TORCH_THREADS", 4)  # ถ้าผ่านการเช็คไปได้จะ import torch
+    with pytest.raises(ValueError, match="fp16"):
+        load_model(backend="fp16")
+
+
+def test_sentence_transformer_wrapper_returns_plain_lists():
+    model = FakeSentenceTransformer()
+    embeddings = SentenceTransformerEmbeddings(model)
+    assert embeddings.embed_documents(("ลาป่วย", "ค่าชดเชย")) == [[6.0, 1.0], [8.0, 1.0]]
+    assert embeddings.embed_query("ลาป่วย") == [6.0, 1.0]
+    assert model.calls[-1] == ["ลาป่วย"]
+
+
+def test_verify_helpers():
+    matrix = np.array([[1.0, 0.0], [0.0, 1.0], [0.7071, 0.7071]], dtype=np.float32)
+    assert top_k(matrix, [[3.0, 0.1], [0.0, 2.0]], 2).tolist() == [[0, 2], [1, 2]]
+    assert sample_sections(range(10), 3) == [0, 4, 9]
+    assert sample_sections(range(3), 5) == [0, 1, 2]
@@ -0,0 +1,85 @@
+"""Key ที่ทำให้เป็นมาตรฐานแล้วใช้หาใน Cache เท่านั้น Model ต้องได้ข้อความที่ผู้ใช้พิมพ์จริง"""
+import asyncio
+
+from embedding_cache import CachedQueryEmbeddings
+
+
+class RecordingModel:
+    def __init__(self):
+        self.seen = []
+
+    def embed_query(self, text):
+        self.seen.append(text)
+        return [float(len(text))]
+
+    def embed_documents(self, texts):
+        self.seen.extend(texts)
+        return [[float(len(text))] for text in texts]
+
+
+class AsyncRecordingModel(RecordingModel):
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_embed_query_sends_original_text():
+    model = RecordingModel()
+    embeddings = CachedQueryEmbeddings(model, disk_path="")
+    first = embeddings.embed_query("ค่า OT  ได้เท่าไหร่ ")
+    # พิมพ์ต่างกันนิดหน่อย -> Key เดียวกัน ได้ Vector จาก Cache
+    assert embeddings.embed_query("ค่า ot ได้เท่าไหร่") == first
+    assert model.seen == ["ค่า OT  ได้เท่าไหร่ "]
+
+
+def test_aembed_query_sends_original_text():
+    model = AsyncRecordingModel()
+    embeddings = CachedQueryEmbeddings(model, disk_path="")
+    asyncio.run(embeddings.aembed_query("ค่า OT ได้เท่าไหร่"))
+    assert model.seen == ["ค่า OT ได้เท่าไหร่"]
+
+
+def test_embed_queries_sends_first_original_text_per_key():
+    model = RecordingModel()
+    embeddings = CachedQueryEmbeddings(model, disk_path="")
+    vectors = embeddings.embed_queries(["ค่า OT ได้เท่าไหร่", "ลาป่วย", "ค่า ot  ได้เท่าไหร่"])
+    assert model.seen == ["ค่า OT ได้เท่าไหร่", "ลาป่วย"]
+    assert vectors[0] == vectors[2]
+
+
+def test_lru_evicts_least_recently_used():
+    model = RecordingModel()
+    embeddings = CachedQueryEmbeddings(model, max_size=2, disk_path="")
+    embeddings.embed_query("ลาป่วย")
+    embeddings.embed_query("ลากิจ")
+    embeddings.embed_query("ลาป่วย")        # ใช้ล่าสุด -> ไม่โดนเตะ
+    embeddings.embed_query("ลาพักร้อน")     # เต็ม -> เตะ "ลากิจ"
+    embeddings.embed_query("ลาป่วย")
+    embeddings.embed_query("ลากิจ")
+    assert model.seen == ["ลาป่วย", "ลากิจ", "ลาพักร้อน", "ลากิจ"]
+    assert embeddings.stats()["size"] == 2
+
+
+def test_expired_entries_are_embedded_again(monkeypatch):
+    import embedding_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: now[0])
+    model = RecordingModel()
+    embeddings = CachedQueryEmbeddings(model, ttl=60, disk_path="")
+    embeddings.embed_query("ค่าชดเชย")
+    now[0] += 30
+    embeddings.embed_query("ค่าชดเชย")
+    now[0] += 31
+    embeddings.embed_query("ค่าชดเชย")
+    assert model.seen == ["ค่าชดเชย", "ค่าชดเชย"]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "query_embeddings.db")
+    first = CachedQueryEmbeddings(RecordingModel(), disk_path=path)
+    vector = first.embed_query("ค่าล่วงเวลา")
+
+    model = RecordingModel()
+    restarted = CachedQueryEmbeddings(model, disk_path=path)  # RAM ว่าง แต่ยังมีในไฟล์
+    assert restarted.embed_query("ค่าล่วงเวลา") == vector
+    assert model.seen == [] and restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,70 @@
+"""Regression: ยกเลิกผู้รอกลาง Batch แล้ว Batcher Thread ต้องยังทำงานต่อได้"""
+import time
+import asyncio
+import logging
+
+import embedding_service
+from embedding_service import MicroBatchingEmbeddings
+
+
+def test_cancelled_waiter_does_not_kill_batcher(slow_model):
+    model = slow_model
+    engine = MicroBatchingEmbeddings(model, max_wait_ms=1)
+
+    async def cancel_mid_batch():
+        task = asyncio.ensure_future(engine.aembed_query("ลาป่วย"))
+        while not model.started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()  # เหมือน Client ปิดการเชื่อมต่อระหว่าง Embed
+        await asyncio.sleep(0.05)
+        model.release.set()
+        return task
+
+    task = asyncio.run(cancel_mid_batch())
+    assert task.cancelled()
+    time.sleep(0.1)
+    assert engine._worker.is_alive()
+    # Batcher ตาย = รอตลอดกาล -> ใช้ timeout ให้ Test ล้มแทนที่จะค้าง
+    assert engine._submit("ค่าชดเชย").result(timeout=5) == [8.0, 1.0]
+
+
+def test_cancelled_before_batch_is_skipped(slow_model):
+    model = slow_model
+    model.release.set()
+    engine = MicroBatchingEmbeddings(model, max_wait_ms=1)
+    future = engine._submit("ยกเลิกแล้ว")
+    future.cancel()
+    assert engine._submit("ลากิจ").result(timeout=5) == [5.0, 1.0]
+    assert engine._worker.is_alive()
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_batcher_error_is_logged_with_traceback(slow_model):
+    class FlakyEngine(MicroBatchingEmbeddings):
+        failed = False
+
+        def _collect_batch(self):
+            if not self.failed:
+                self.failed = True
+                raise RuntimeError("คิวพัง")
+            return super()._collect_batch()
+
+    handler = _Records()
+    embedding_service.log.addHandler(handler)
+    try:
+        slow_model.release.set()
+        engine = FlakyEngine(slow_model, max_wait_ms=1)
+        assert engine._submit("ลากิจ").result(timeout=5) == [5.0, 1.0]
+    finally:
+        embedding_service.log.removeHandler(handler)
+    [record] = handler.records
+    assert record.levelno == logging.ERROR
+    assert record.exc_info[1].args == ("คิวพัง",)
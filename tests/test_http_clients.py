@@ -0,0 +1,59 @@
+"""POST (RPC / LLM) ต้องไม่ถูกส่งซ้ำเมื่อ Server อาจประมวลผลไปแล้ว"""
+import asyncio
+
+import httpx
+import pytest
+
+from http_clients import RetryTransport
+
+
+class ScriptedTransport(httpx.AsyncBaseTransport):
+    """ตอบตามลำดับที่กำหนด (Exception = โยนออกไป) แล้วนับจำนวนครั้งที่ถูกเรียก"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def handle_async_request(self, request):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+
+def send(method, *outcomes):
+    transport = ScriptedTransport(*outcomes)
+
+    async def run():
+        async with httpx.AsyncClient(transport=RetryTransport(transport, retries=2, backoff=0)) as client:
+            return await client.request(method, "http://supabase.local/rest/v1/rpc/match_sections_v2")
+    return transport, run
+
+
+@pytest.mark.parametrize("status", [502, 504])
+def test_post_is_not_retried_on_gateway_errors(status):
+    transport, run = send("POST", status, 200)
+    assert asyncio.run(run()).status_code == status
+    assert transport.calls == 1
+
+
+def test_post_is_not_retried_after_connection_drop():
+    transport, run = send("POST", httpx.RemoteProtocolError("Server disconnected"), 200)
+    with pytest.raises(httpx.RemoteProtocolError):
+        asyncio.run(run())
+    assert transport.calls == 1
+
+
+@pytest.mark.parametrize("outcome", [429, 503, httpx.ConnectError("refused"), httpx.PoolTimeout("pool")])
+def test_post_is_retried_before_server_processes_it(outcome):
+    transport, run = send("POST", outcome, 200)
+    assert asyncio.run(run()).status_code == 200
+    assert transport.calls == 2
+
+
+@pytest.mark.parametrize("outcome", [502, 504, httpx.RemoteProtocolError("Server disconnected")])
+def test_get_is_retried_on_transient_errors(outcome):
+    transport, run = send("GET", outcome, 200)
+    assert asyncio.run(run()).status_code == 200
+    assert transport.calls == 2
@@ -0,0 +1,95 @@
+"""ingest.py --pipeline: เขียนกลับเฉพาะ embedding + content_hash และบอกว่าทำครบเมื่อจบแบบไม่มี Error"""
+import os
+
+import pytest
+
+import embedding_service
+from chunk_index import text_hash
+
+ROWS = [
+    {"id": 1, "section_number": "57", "text_original": "ลูกจ้างมีสิทธิลาป่วยได้เท่าที่ป่วยจริง"},
+    {"id": 2, "section_number": "58", "text_original": "   "},
+    {"id": 3, "section_number": "34", "text_original": "ลูกจ้างมีสิทธิลากิจเพื่อธุรกิจอันจำเป็น"},
+]
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+        self.cursor = 0
+        self.payload = None
+
+    def select(self, *args):
+        return self
+
+    def is_(self, *args):
+        return self
+
+    def order(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def gt(self, column, value):
+        self.cursor = value
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def upsert(self, *args, **kwargs):
+        raise AssertionError("ต้องไม่ upsert ทั้งแถว")
+
+    def eq(self, column, value):
+        self.db.updates.append((value, self.payload))
+        return self
+
+    def execute(self):
+        rows = [] if self.payload is not None else [row for row in self.db.rows if row["id"] > self.cursor]
+        return type("Response", (), {"data": rows})()
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.updates = []
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", os.getenv("SUPABASE_URL") or "http://localhost:54321")
+    monkeypatch.setenv("SUPABASE_KEY", os.getenv("SUPABASE_KEY") or "test-key")
+    monkeypatch.setattr(embedding_service, "get_embeddings", lambda: FakeEmbeddings())
+    import ingest
+    monkeypatch.setattr(ingest, "supabase", FakeSupabase(ROWS))
+    monkeypatch.setattr(ingest, "embeddings", FakeEmbeddings())
+    return ingest
+
+
+def test_pipeline_writes_only_embedding_and_content_hash(ingest, tmp_path, capsys):
+    checkpoint = tmp_path / "checkpoint.json"
+    ingest.run_pipeline(batch_size=2, checkpoint_path=str(checkpoint), resume=False)
+
+    updates = dict(ingest.supabase.updates)
+    assert sorted(updates) == [1, 3]  # มาตราว่างข้ามไป
+    for row_id, payload in updates.items():
+        text = next(row["text_original"] for row in ROWS if row["id"] == row_id)
+        assert payload == {"embedding": [float(len(text))], "content_hash": text_hash(text)}
+    assert not checkpoint.exists()
+    assert "ไชโย" in capsys.readouterr().out
+
+
+def test_pipeline_reports_clean_finish_without_rows(ingest, tmp_path, capsys):
+    ingest.supabase.rows = []  # ทุกมาตรามี embedding แล้ว -> ไม่มี Checkpoint ให้ลบ
+    ingest.run_pipeline(batch_size=2, checkpoint_path=str(tmp_path / "checkpoint.json"), resume=False)
+    assert "ไชโย" in capsys.readouterr().out
@@ -0,0 +1,40 @@
+"""BM25 + การค้นด้วยเลขมาตรา + การรวมผลด้วย RRF"""
+from lexical_search import BM25Index, extract_section_numbers, reciprocal_rank_fusion
+
+ROWS = [
+    {"id": 1, "section_number": "57", "text_original": "ค่าจ้าง"},
+    {"id": 2, "section_number": "61", "text_original": "ค่าล่วงเวลา"},
+    {"id": 3, "section_number": "118", "text_original": "ค่าชดเชย"},
+]
+TOKENS = [["ค่าจ้าง", "ลูกจ้าง"], ["ค่าล่วงเวลา", "ลูกจ้าง", "วันทำงาน"], ["ค่าชดเชย", "เลิกจ้าง"]]
+
+
+def test_extract_section_numbers_handles_thai_digits_and_abbreviations():
+    assert extract_section_numbers("มาตรา ๑๑๘ กับ ม.75/1 และมาตรา118") == ["118", "75/1", "118"]
+    assert extract_section_numbers("ลาป่วยได้กี่วัน") == []
+
+
+def test_lookup_sections_returns_existing_sections_once():
+    index = BM25Index(ROWS, TOKENS)
+    results = index.lookup_sections("มาตรา 118 กับมาตรา ๑๑๘ และมาตรา 999")
+    assert [row["section_number"] for row in results] == ["118"]
+    assert results[0]["similarity"] == 1.0
+
+
+def test_search_ranks_rarer_terms_higher():
+    index = BM25Index(ROWS, TOKENS)
+    results = index.search(["ค่าล่วงเวลา", "ลูกจ้าง"])
+    # ค่าล่วงเวลามีแค่แถวเดียว (IDF สูง) ลูกจ้างมีสองแถว
+    assert [row["section_number"] for row in results] == ["61", "57"]
+    assert results[0]["bm25_score"] > results[1]["bm25_score"]
+    assert index.search(["ไม่มีคำนี้"]) == []
+    assert len(index.search(["ลูกจ้าง"], match_count=1)) == 1
+
+
+def test_reciprocal_rank_fusion_prefers_sections_found_by_both():
+    dense = [{"section_number": "57", "similarity": 0.9}, {"section_number": "61", "similarity": 0.8}]
+    lexical = [{"section_number": "61", "bm25_score": 3.0}, {"section_number": "118", "bm25_score": 1.0}]
+    fused = reciprocal_rank_fusion([dense, lexical], match_count=2)
+    assert [row["section_number"] for row in fused] == ["61", "57"]
+    # เก็บค่าจากทั้งสองชุดไว้ในแถวเดียว
+    assert fused[0]["similarity"] == 0.8 and fused[0]["bm25_score"] == 3.0
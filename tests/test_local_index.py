@@ -0,0 +1,58 @@
+"""Local Vector Index: Snapshot ที่สร้างแล้วต้องค้นได้ผลแบบเดียวกับ RPC match_sections_v2"""
+import os
+
+import numpy as np
+
+from local_index import LocalVectorIndex, build_snapshot, top_k_rows
+
+ROWS = [
+    {"id": 1, "section_number": "10", "text_original": "นายจ้างต้องจ่ายค่าจ้าง", "embedding": [1.0, 0.0, 0.0]},
+    {"id": 2, "section_number": "32", "text_original": "ลูกจ้างมีสิทธิลาป่วย", "embedding": "[0.0, 2.0, 0.0]"},
+    {"id": 3, "section_number": "118", "text_original": "ค่าชดเชยเมื่อเลิกจ้าง", "embedding": [0.6, 0.8, 0.0]},
+]
+
+
+def test_snapshot_round_trip(tmp_path):
+    index_dir = str(tmp_path / "index")
+    meta = build_snapshot(ROWS, index_dir, corpus_version=7)
+    assert (meta["count"], meta["dim"]) == (3, 3)
+    assert not os.path.exists(index_dir + ".tmp")
+
+    index = LocalVectorIndex(index_dir)
+    assert len(index) == 3
+    assert index.corpus_version == 7
+    assert index.section_numbers == ["10", "32", "118"]
+    # Vector ถูก Normalize ตอนสร้าง (รวมแถวที่มาเป็น String จาก PostgREST)
+    np.testing.assert_allclose(np.linalg.norm(index.matrix, axis=1), 1.0, rtol=1e-6)
+    assert len(index.lexical_tokens) == 3
+
+
+def test_search_orders_by_similarity_and_applies_threshold(tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_snapshot(ROWS, index_dir)
+    index = LocalVectorIndex(index_dir)
+
+    results = index.search([2.0, 0.0, 0.0], match_threshold=0.5, match_count=5)
+    assert [row["section_number"] for row in results] == ["10", "118"]
+    assert results[0]["similarity"] == 1.0
+    assert set(results[0]) == {"id", "section_number", "text_original", "similarity"}
+
+    assert [row["section_number"] for row in index.search([0.0, 1.0, 0.0], match_count=1)] == ["32"]
+
+
+def test_search_batch_matches_single_search(tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_snapshot(ROWS, index_dir)
+    index = LocalVectorIndex(index_dir)
+    queries = [[1.0, 0.1, 0.0], [0.1, 1.0, 0.0]]
+    batched = index.search_batch(queries, 0.0, 2)
+    for results, query in zip(batched, queries):
+        single = index.search(query, 0.0, 2)
+        assert [row["id"] for row in results] == [row["id"] for row in single]
+        np.testing.assert_allclose([row["similarity"] for row in results],
+                                   [row["similarity"] for row in single], rtol=1e-5)
+
+
+def test_top_k_rows_sorts_each_row():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.8, 0.2, 0.6, 0.4]], dtype=np.float32)
+    assert top_k_rows(scores, 2).tolist() == [[1, 3], [0, 2]]
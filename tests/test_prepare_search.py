@@ -0,0 +1,47 @@
+"""ค้นล่วงหน้า (Speculative Retrieval) ถูกยกเลิกเพราะ Answer Cache Hit แล้ว Embedding ต้องยังใช้ได้"""
+import asyncio
+
+import api
+from admission import StageLimiter, AdmittedEmbeddings
+from embedding_cache import CachedQueryEmbeddings
+from embedding_service import MicroBatchingEmbeddings
+from timing import StageTimer
+
+
+def test_answer_cache_hit_cancels_speculative_search_safely(monkeypatch, slow_model):
+    model = slow_model
+    engine = MicroBatchingEmbeddings(model, max_wait_ms=1)
+    embeddings = CachedQueryEmbeddings(AdmittedEmbeddings(engine, StageLimiter("embedding", 2, 8, 5.0)), disk_path="")
+    question = "แล้วลาป่วยล่ะ"
+
+    async def rewrite_question(question, history):
+        # รอให้ Model รับคำถามเดิมเข้า Batch ก่อน (ค้นล่วงหน้ากำลังรันอยู่ตอนเจอ Cache)
+        while not model.started.is_set():
+            await asyncio.sleep(0.01)
+        return "ลูกจ้างลาป่วยได้กี่วัน"
+
+    async def lookup_cached_answer(search_query):
+        return "ลาป่วยได้เท่าที่ป่วยจริง", None
+
+    async def retrieve_data(*args, **kwargs):
+        raise AssertionError("Cache Hit ต้องไม่ค้นหา")
+
+    monkeypatch.setattr(api, "embeddings", embeddings)
+    monkeypatch.setattr(api, "PIPELINED_REWRITE", True)
+    monkeypatch.setattr(api, "rewrite_question", rewrite_question)
+    monkeypatch.setattr(api, "lookup_cached_answer", lookup_cached_answer)
+    monkeypatch.setattr(api, "retrieve_data", retrieve_data)
+
+    async def scenario():
+        history = [{"role": "user", "content": "ลากิจได้กี่วัน"}, {"role": "assistant", "content": "3 วัน"}]
+        result = await api.prepare_search(question, history, [], StageTimer())
+        model.release.set()
+        vector = await asyncio.wait_for(embeddings.aembed_query("ค่าชดเชยเท่าไหร่"), 5)
+        return result, vector
+
+    (search_query, cached, docs, _), vector = asyncio.run(scenario())
+    assert cached == "ลาป่วยได้เท่าที่ป่วยจริง" and docs is None
+    assert vector[1] == 1.0
+    assert engine._worker.is_alive()
+    # Embedding ของคำถามเดิมทำจนจบแล้วเก็บลง Cache (ไม่เสียงานที่ Model ทำไปแล้ว)
+    assert embeddings.stats()["size"] == 2
@@ -0,0 +1,65 @@
+"""RAG Pipeline กลาง: Prompt ขึ้นต้นเหมือนกันทุก Request และเปลี่ยน Backend ได้โดยไม่แก้ผู้เรียก"""
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from rag_pipeline import (
+    ANSWER_PROMPT, ANSWER_SYSTEM_PROMPT, LocalRetriever, RagPipeline,
+    create_llm, create_retriever, format_history)
+
+
+class FakeIndex:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, query_vector, match_threshold=0.5, match_count=5):
+        self.calls.append((query_vector, match_threshold, match_count))
+        return [{"section_number": "32", "similarity": 0.9}]
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+def test_prompt_prefix_is_identical_across_requests():
+    first = ANSWER_PROMPT.format_messages(context="- มาตรา 32: ลาป่วย", question="ลาป่วยได้กี่วัน")
+    second = ANSWER_PROMPT.format_messages(context="- มาตรา 118: ค่าชดเชย", question="ค่าชดเชยเท่าไร")
+    # ส่วนที่ไม่เปลี่ยนต้องอยู่ต้น Prompt (Provider ใช้ Prefix / KV Cache ซ้ำได้)
+    assert first[0].content == second[0].content == ANSWER_SYSTEM_PROMPT
+    assert "ลาป่วยได้กี่วัน" in first[-1].content
+    assert RagPipeline.prompt_text("- มาตรา 32: ลาป่วย", "ลาป่วยได้กี่วัน").startswith("System: " + ANSWER_SYSTEM_PROMPT[:20])
+
+
+def test_unknown_backends_are_rejected():
+    with pytest.raises(ValueError):
+        create_llm("openai")
+    with pytest.raises(ValueError):
+        create_retriever("elasticsearch")
+
+
+def test_local_retriever_and_retrieve():
+    index = FakeIndex()
+    pipeline = RagPipeline(FakeListChatModel(responses=["-"]), LocalRetriever(index), FakeEmbeddings(),
+                           match_threshold=0.4, match_count=3)
+    assert pipeline.retrieve("ลาป่วย") == [{"section_number": "32", "similarity": 0.9}]
+    assert asyncio.run(pipeline.retriever.asearch([1.0], 2, 0.6)) == index.search([1.0])
+    assert index.calls[:2] == [([6.0], 0.4, 3), ([1.0], 0.6, 2)]
+
+
+def test_generate_and_rewrite_reuse_prebuilt_chains():
+    llm = FakeListChatModel(responses=["ตามมาตรา 32 ลาป่วยได้เท่าที่ป่วยจริง", "  ลาป่วยเกินสามวันต้องมีใบรับรองแพทย์ไหม  "])
+    pipeline = RagPipeline(llm, LocalRetriever(FakeIndex()))
+    chain = pipeline.answer_chain
+    assert pipeline.generate("- มาตรา 32: ลาป่วย", "ลาป่วยได้กี่วัน").startswith("ตามมาตรา 32")
+    assert pipeline.answer_chain is chain
+
+    history = [{"role": "user", "content": "ลาป่วยได้กี่วัน"}, {"role": "assistant", "content": "ตามมาตรา 32"}]
+    assert asyncio.run(pipeline.arewrite("ต้องมีใบแพทย์ไหม", history)) == "ลาป่วยเกินสามวันต้องมีใบรับรองแพทย์ไหม"
+    assert asyncio.run(pipeline.arewrite("ลาป่วยได้กี่วัน", [])) == "ลาป่วยได้กี่วัน"
+
+
+def test_format_history_keeps_latest_messages():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": str(i)} for i in range(6)]
+    assert format_history(history) == "User: 2\nAI: 3\nUser: 4\nAI: 5\n"
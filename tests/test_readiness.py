@@ -0,0 +1,47 @@
+"""Liveness / Readiness: ระหว่างโหลด Model ต้องตอบ 503 + Retry-After ไม่ใช่ค้างหรือ 500"""
+import pytest
+from starlette.testclient import TestClient
+
+import api
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(api.startup_state, "ready", False)
+    monkeypatch.setitem(api.startup_state, "error", None)
+    monkeypatch.setitem(api.startup_state, "phases", {"load_embeddings": 1200.0})
+    return TestClient(api.app)  # ไม่ใช้ with: ไม่รัน lifespan (ไม่โหลด Model)
+
+
+def test_health_is_alive_while_starting(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+def test_ready_reports_starting_then_ready(client, monkeypatch):
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert response.json()["status"] == "starting"
+    assert response.json()["startup_phases_ms"] == {"load_embeddings": 1200.0}
+
+    monkeypatch.setitem(api.startup_state, "ready", True)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_ready_reports_failed_startup(client, monkeypatch):
+    monkeypatch.setitem(api.startup_state, "error", "RuntimeError: โหลด Model ไม่ได้")
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed"
+    assert response.json()["error"] == "RuntimeError: โหลด Model ไม่ได้"
+
+
+@pytest.mark.parametrize("endpoint", ["/chat", "/chat_stream"])
+def test_chat_endpoints_return_503_until_ready(client, endpoint):
+    response = client.post(endpoint, json={"question": "ลาป่วยได้กี่วัน"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
@@ -0,0 +1,61 @@
+"""Rerank ที่เกินเวลาแล้วยังรันค้างอยู่ต้องไม่ทำให้ Request ถัดไปต้องต่อคิวจนเกินเวลาตามกัน"""
+import time
+import asyncio
+import threading
+
+import api
+from reranker import RerankRunner
+
+DOCS = [{"section_number": "32", "text_original": "ลาป่วย"}, {"section_number": "34", "text_original": "ลากิจ"}]
+
+
+def test_runner_rejects_work_beyond_cap_until_jobs_finish():
+    runner = RerankRunner(max_inflight=2)
+    release = threading.Event()
+    first = runner.submit(release.wait, 5)
+    second = runner.submit(release.wait, 5)  # รอคิวหลังงานแรก
+    assert first is not None and second is not None
+    assert runner.submit(release.wait, 5) is None
+    release.set()
+    first.result(timeout=5)
+    second.result(timeout=5)
+    assert runner.inflight == 0
+    assert runner.submit(lambda: "ok").result(timeout=5) == "ok"
+
+
+class SlowReranker:
+    """Cross-encoder ปลอม: กลับลำดับผู้สมัคร แต่รอจนถูกปล่อยก่อน (จำลอง Model ช้าบน CPU)"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.runner = RerankRunner(max_inflight=1)
+
+    def rerank_many(self, queries, doc_lists):
+        self.release.wait(5)
+        return [(list(reversed(docs)), {"candidates": len(docs), "kept": len(docs), "before": [], "after": []})
+                for docs in doc_lists]
+
+    def submit_many(self, queries, doc_lists):
+        return self.runner.submit(self.rerank_many, queries, doc_lists)
+
+
+def test_timed_out_rerank_makes_next_request_skip_instead_of_wait(monkeypatch):
+    slow = SlowReranker()
+    monkeypatch.setattr(api, "reranker", slow)
+    monkeypatch.setattr(api, "RERANK_TIMEOUT_MS", 50)
+
+    async def scenario():
+        timed_out = await api.rerank_candidates(["ลาป่วยได้กี่วัน"], [DOCS])
+        started = time.perf_counter()
+        skipped = await api.rerank_candidates(["ลากิจได้กี่วัน"], [DOCS])
+        skipped_ms = (time.perf_counter() - started) * 1000
+        slow.release.set()
+        while slow.runner.inflight:
+            await asyncio.sleep(0.01)
+        reranked = await api.rerank_candidates(["ลากิจได้กี่วัน"], [DOCS])
+        return timed_out, skipped, skipped_ms, reranked
+
+    timed_out, skipped, skipped_ms, reranked = asyncio.run(scenario())
+    assert timed_out == [DOCS] and skipped == [DOCS]
+    assert skipped_ms < 50  # ข้ามทันที ไม่รอจนหมดงบเวลา
+    assert reranked == [list(reversed(DOCS))]
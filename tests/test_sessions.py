@@ -0,0 +1,31 @@
+"""Session ฝั่ง Server ต้องจำทุกรอบ รวมรอบที่หาข้อมูลกฎหมายไม่เจอ (คำถามต่อเนื่องจะได้ Rewrite ถูก)"""
+import pytest
+from starlette.testclient import TestClient
+
+import api
+from rag_pipeline import NO_DOCS_ANSWER
+from session_store import MemorySessionStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def prepare_search(question, history, query_tokens, timer, previous=None):
+        return question, None, [], None  # ไม่เจอมาตราไหนเลย
+
+    monkeypatch.setitem(api.startup_state, "ready", True)
+    monkeypatch.setattr(api, "session_store", MemorySessionStore())
+    monkeypatch.setattr(api, "prepare_search", prepare_search)
+    return TestClient(api.app)  # ไม่ใช้ with: ไม่รัน lifespan (ไม่โหลด Model)
+
+
+@pytest.mark.parametrize("endpoint", ["/chat", "/chat_stream"])
+def test_no_docs_turn_is_recorded_in_session(client, endpoint):
+    session_id = client.post("/sessions").json()["session_id"]
+    response = client.post(endpoint, json={"question": "ลาบวชได้กี่วัน", "session_id": session_id})
+    assert response.status_code == 200
+
+    history = client.get(f"/sessions/{session_id}").json()["history"]
+    assert history == [
+        {"role": "user", "content": "ลาบวชได้กี่วัน"},
+        {"role": "assistant", "content": NO_DOCS_ANSWER},
+    ]
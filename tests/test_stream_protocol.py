@@ -0,0 +1,68 @@
+"""รูปแบบ Stream: Encode ถูกทั้ง NDJSON / SSE และรวม Token เป็นก้อนโดยไม่ทำให้ Token แรกช้า"""
+import json
+import asyncio
+
+import pytest
+
+from stream_protocol import coalesce, encode_event
+
+
+async def tokens(*chunks, delay: float = 0.0):
+    for chunk in chunks:
+        if delay:
+            await asyncio.sleep(delay)
+        yield chunk
+
+
+async def collect(source, **kwargs):
+    return [item async for item in coalesce(source, **kwargs)]
+
+
+def test_encode_event_ndjson_and_sse():
+    event = {"type": "content", "content": "ลาป่วย"}
+    line = encode_event(event)
+    assert line.endswith(b"\n") and json.loads(line) == event
+    assert "ลาป่วย".encode("utf-8") in line  # ไม่ Escape เป็น \uXXXX
+
+    sse = encode_event(event, "sse")
+    assert sse.startswith(b"event: content\ndata: ") and sse.endswith(b"\n\n")
+    assert json.loads(sse.split(b"data: ", 1)[1]) == event
+
+
+def test_first_token_is_sent_alone_then_chunks_are_merged():
+    items = asyncio.run(collect(tokens("ลา", "ป่วย", "ได้", "ไม่", "เกิน"), flush_ms=1000, flush_chars=6))
+    assert items == [("content", "ลา"), ("content", "ป่วยได้"), ("content", "ไม่เกิน")]
+
+
+def test_flushes_after_flush_ms_and_sends_heartbeat_when_idle():
+    items = asyncio.run(collect(tokens("ก", "ข", "", delay=0.05), flush_ms=10, flush_chars=100,
+                                heartbeat_seconds=0.03))
+    assert ("heartbeat", None) in items
+    assert "".join(text for kind, text in items if kind == "content") == "กข"
+
+
+def test_deadline_flushes_pending_text_and_stops():
+    async def scenario():
+        deadline = asyncio.get_running_loop().time() + 0.05
+        return await collect(tokens("ก", "ข", "ค", delay=0.03), flush_ms=1000, flush_chars=100, deadline=deadline)
+
+    items = asyncio.run(scenario())
+    assert items[0] == ("content", "ก")
+    assert items[-1] == ("deadline", None)
+    assert "ค" not in "".join(text for kind, text in items if kind == "content")
+
+
+def test_stop_and_source_errors():
+    async def stopped():
+        stop = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(0.02, stop.set_result, None)
+        return await collect(tokens("ก", "ข", delay=0.5), stop=stop)
+
+    assert asyncio.run(stopped()) == [("stopped", None)]
+
+    async def failing():
+        yield "ก"
+        raise RuntimeError("LLM error")
+
+    with pytest.raises(RuntimeError, match="LLM error"):
+        asyncio.run(collect(failing()))
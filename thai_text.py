@@ -0,0 +1,196 @@
+"""
+ตัดคำ / จัดรูปข้อความภาษาไทย (ทางเดียวที่ใช้ทั้งระบบ: Key ของ Cache, BM25, Context Builder)
+
+- Dictionary ของ newmm = คำมาตรฐานของ PyThaiNLP + ศัพท์กฎหมายแรงงาน (LABOUR_LAW_TERMS)
+  + คำนิยามที่ประกาศไว้ใน act_sections (เช่น “ค่าทำงานในวันหยุด” หมายความว่า ...)
+  สร้าง Trie ครั้งเดียว คำอย่าง "ค่าชดเชย" / "ค่าล่วงเวลาในวันหยุด" จะถูกตัดเป็นคำเดียวเสมอ
+- จำผลตัดคำไว้แบบ LRU จำกัดขนาด (TOKENIZE_CACHE_SIZE) คำถามที่ถามซ้ำไม่ต้องตัดใหม่
+  (ตัดคำตอน preprocess แล้ว Key ของ Cache / BM25 ใช้ผลเดิมต่อได้)
+- tokenize_batch: ตัดคำข้อความจำนวนมากแบบขนานหลาย Process (newmm เป็น Python ล้วน ติด GIL)
+  ใช้ตอนสร้าง Snapshot / ingest
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from pythainlp.util import normalize, dict_trie
+from pythainlp.corpus import thai_words
+from pythainlp.tokenize import word_tokenize
+
+load_dotenv()
+TOKENIZE_CACHE_SIZE = int(os.getenv("TOKENIZE_CACHE_SIZE", "4096"))   # จำนวนข้อความที่จำผลตัดคำไว้
+TOKENIZE_WORKERS = int(os.getenv("TOKENIZE_WORKERS", "0"))             # Process ตอนตัดคำทีละมากๆ (0 = ทุก Core)
+PARALLEL_MIN_TEXTS = 256  # ข้อความน้อยกว่านี้ตัดใน Process เดียว (ค่าเปิด Process + สร้าง Trie ไม่คุ้ม)
+
+# ศัพท์กฎหมายแรงงานที่ต้องเป็นคำเดียวกันเสมอ (ไม่ให้ newmm ตัดแยกตามความยาวคำใน Dictionary มาตรฐาน)
+LABOUR_LAW_TERMS = (
+    "นายจ้าง", "ลูกจ้าง", "ผู้รับเหมาชั้นต้น", "ผู้รับเหมาช่วง", "สัญญาจ้าง", "สัญญาจ้างทดลองงาน",
+    "ค่าจ้าง", "อัตราค่าจ้างขั้นต่ำ", "ค่าจ้างขั้นต่ำ", "ค่าล่วงเวลา", "ค่าล่วงเวลาในวันหยุด",
+    "ค่าทำงานในวันหยุด", "ค่าชดเชย", "ค่าชดเชยพิเศษ", "ค่าชดเชยแทนการบอกกล่าวล่วงหน้า",
+    "การบอกกล่าวล่วงหน้า", "เลิกจ้าง", "วันทำงาน", "เวลาทำงาน", "เวลาทำงานปกติ", "เวลาพัก",
+    "วันหยุด", "วันหยุดประจำสัปดาห์", "วันหยุดตามประเพณี", "วันหยุดพักผ่อนประจำปี",
+    "วันลา", "ลาป่วย", "ลากิจ", "ลาคลอด", "ลาทำหมัน", "ลาเพื่อรับราชการทหาร", "ลาเพื่อฝึกอบรม",
+    "ข้อบังคับเกี่ยวกับการทำงาน", "สภาพการจ้าง", "พนักงานตรวจแรงงาน", "พนักงานเจ้าหน้าที่",
+    "คณะกรรมการค่าจ้าง", "คณะกรรมการสวัสดิการแรงงาน", "กองทุนสงเคราะห์ลูกจ้าง",
+    "เงินสะสม", "เงินสมทบ", "หลักประกัน", "งานอันตราย", "ลูกจ้างซึ่งเป็นหญิง", "ลูกจ้างซึ่งเป็นเด็ก",
+    "ลูกจ้างมีครรภ์", "ศาลแรงงาน", "อธิบดี", "ทำงานล่วงเวลา", "ทำงานในวันหยุด",
+)
+
+# คำนิยามในกฎหมาย: “คำ” หมายความว่า ...
+DEFINED_TERM_PATTERN = re.compile(r"[“\"]([ก-๙][ก-๙ ]{1,38}[ก-๙])[”\"]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """จัดระเบียบสระ/วรรณยุกต์ + ตัดช่องว่างซ้ำ + ตัวพิมพ์เล็ก"""
+    clean_text = normalize(text or "")
+    return WHITESPACE.sub(" ", clean_text).strip().lower()
+
+
+def extract_defined_terms(texts):
+    """ดึงคำที่กฎหมายให้นิยามไว้ในเครื่องหมายคำพูด (ไม่เอาคำที่มีช่องว่าง เพราะ newmm ไม่ข้ามช่องว่าง)"""
+    terms = set()
+    for text in texts:
+        for term in DEFINED_TERM_PATTERN.findall(text or ""):
+            if " " not in term:
+                terms.add(normalize(term))
+    return terms
+
+
+class ThaiTextProcessor:
+    """ตัดคำด้วย newmm + Dictionary ของเราเอง พร้อม LRU Cache ของผลตัดคำ (ใช้จากหลาย Thread ได้)"""
+
+    def __init__(self, extra_words=(), cache_size: int = TOKENIZE_CACHE_SIZE):
+        self.extra_words = sorted(set(LABOUR_LAW_TERMS) | set(extra_words))
+        self.trie = dict_trie(set(thai_words()) | set(self.extra_words))
+        # เวอร์ชันของ Dictionary (ผลตัดคำที่เก็บไว้ใน Snapshot ใช้ต่อได้เมื่อเวอร์ชันตรงกัน)
+        self.version = hashlib.sha1("\n".join(self.extra_words).encode("utf-8")).hexdigest()[:16]
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cut(self, clean_text: str):
+        return word_tokenize(clean_text, custom_dict=self.trie, engine="newmm", keep_whitespace=False)
+
+    def tokenize(self, text: str, use_cache: bool = True):
+        """ตัดคำ (คืน list ใหม่ทุกครั้ง แก้ไขได้ไม่กระทบ Cache)"""
+        clean_text = normalize_text(text)
+        if not use_cache or self.cache_size <= 0:
+            return self._cut(clean_text)
+        with self._lock:
+            tokens = self._cache.get(clean_text)
+            if tokens is not None:
+                self._cache.move_to_end(clean_text)
+                self.hits += 1
+                return list(tokens)
+            self.misses += 1
+        # ตัดคำนอก Lock (Thread อื่นจะได้ใช้ Cache ระหว่างนี้)
+        tokens = tuple(self._cut(clean_text))
+        with self._lock:
+            self._cache[clean_text] = tokens
+            self._cache.move_to_end(clean_text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(tokens)
+
+    def preprocess(self, text: str) -> str:
+        """ตัดคำแล้วคั่นด้วยช่องว่าง (เช่น "ลากิจได้กี่วัน" -> "ลากิจ ได้ กี่ วัน")"""
+        return " ".join(self.tokenize(text))
+
+    def tokenize_batch(self, texts, workers: int = TOKENIZE_WORKERS):
+        """ตัดคำทีละมากๆ (ไม่เก็บลง Cache) ข้อความเยอะพอจะแบ่งไปหลาย Process"""
+        texts = list(texts)
+        workers = workers or _available_cpus()
+        if workers <= 1 or len(texts) < PARALLEL_MIN_TEXTS:
+            return [self._cut(normalize_text(text)) for text in texts]
+        chunksize = max(1, len(texts) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self.extra_words,)) as pool:
+            return list(pool.map(_worker_tokenize, texts, chunksize=chunksize))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "custom_words": len(self.extra_words),
+            "dictionary_version": self.version,
+        }
+
+
+def _available_cpus() -> int:
+    # Container มักจำกัด CPU ไว้น้อยกว่าที่ os.cpu_count() เห็น
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# --- Processor กลางของทั้ง Process ---
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor() -> ThaiTextProcessor:
+    """สร้างครั้งแรกตอนใช้ (สร้าง Trie ใช้เวลาราว 1 วินาที)"""
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = ThaiTextProcessor()
+    return _processor
+
+
+def load_corpus_vocabulary(texts) -> ThaiTextProcessor:
+    """สร้าง Dictionary ใหม่ให้มีคำนิยามจาก act_sections ด้วย (เรียกก่อนสร้าง BM25 Index)"""
+    global _processor
+    terms = extract_defined_terms(texts)
+    current = _processor
+    if current is not None and set(current.extra_words) == set(LABOUR_LAW_TERMS) | terms:
+        return current
+    processor = ThaiTextProcessor(terms)
+    with _processor_lock:
+        _processor = processor
+    return processor
+
+
+def tokenize(text: str):
+    return get_processor().tokenize(text)
+
+
+def preprocess(text: str) -> str:
+    return get_processor().preprocess(text)
+
+
+def tokenize_batch(texts, workers: int = TOKENIZE_WORKERS):
+    return get_processor().tokenize_batch(texts, workers)
+
+
+def cache_key(text: str) -> str:
+    """
+    Key ของ Cache (Query Embedding / Answer): ผลตัดคำคั่นด้วยช่องว่าง
+    คำถามเดียวกันที่พิมพ์เว้นวรรคต่างกัน (เช่น "ค่าชดเชย เลิกจ้าง" / "ค่าชดเชยเลิกจ้าง") ได้ Key เดียวกัน
+    """
+    return preprocess(text)
+
+
+# --- Worker Process ของ tokenize_batch ---
+
+_worker_processor = None
+
+
+def _init_worker(extra_words):
+    global _worker_processor
+    _worker_processor = ThaiTextProcessor(extra_words, cache_size=0)
+
+
+def _worker_tokenize(text: str):
+    return _worker_processor._cut(normalize_text(text))
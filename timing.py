@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    จับเวลาแต่ละขั้นของ Request (หน่วย ms)
+    ใช้แบบ: with timer.stage("retrieval"): ...
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def record(self, name: str, ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def server_timing_header(self) -> str:
+        """รูปแบบ Header มาตรฐาน Server-Timing (เปิดดูได้ใน DevTools ของ Browser)"""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        return " | ".join(f"{name} {ms:.0f}ms" for name, ms in self.stages.items())
@@ -0,0 +1,30 @@
+"""นับจำนวน Token ของข้อความ (ใช้ tiktoken ถ้าโหลดได้ ไม่งั้นประมาณจากจำนวนตัวอักษร)"""
+import functools
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ENCODING_NAME = "cl100k_base"
+CHARS_PER_TOKEN = 2.5  # ค่าประมาณสำหรับภาษาไทยเมื่อไม่มี tiktoken
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        # เครื่องที่ออกเน็ตไม่ได้จะโหลดไฟล์ Encoding ไม่ได้ -> ใช้ค่าประมาณแทน
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, int(len(text) / CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))